@@ -0,0 +1,16 @@
+""" Benchmarks for hippiehug, run from the hippiehug-package directory with:
+
+    python -m benchmarks.run [options]
+
+Its results are compared with the baseline committed in baseline.json with:
+
+    python -m benchmarks.compare benchmarks/baseline.json benchmarks.json
+
+The other modules are focused benchmarks, run the same way:
+
+    python -m benchmarks.balanced [keys]    Plain and balanced trees.
+    python -m benchmarks.stores [keys]      Writes and lookups per store.
+    python -m benchmarks.hash [keys]        Each hash function.
+    python -m benchmarks.arena [keys]       Memory per key of an ArenaStore.
+    python -m benchmarks.chain [blocks] [items]   Appending large blocks to a Chain.
+"""
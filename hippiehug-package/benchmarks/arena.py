@@ -0,0 +1,44 @@
+from __future__ import print_function
+
+import gc
+import sys
+import time
+import tracemalloc
+from os import urandom
+
+from hippiehug import Tree
+from hippiehug.Arena import ArenaStore
+
+
+def run(name, store, keys):
+    """ Builds a balanced tree over the keys in a store, and prints the memory
+    it uses per key, and the rate of lookups. """
+    gc.collect()
+    tracemalloc.start()
+    start = time.time()
+    t = Tree.bulk_build(keys, store=store, balanced=True)
+    build_interval = time.time() - start
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    lookup = keys[:10000]
+    start = time.time()
+    assert t.multi_is_in(lookup) == [True] * len(lookup)
+    lookup_interval = time.time() - start
+
+    print("%-8s memory: %6.1f bytes/key  build: %8.0f keys/sec  lookup: %8.0f keys/sec" % (
+        name, size / float(len(keys)), len(keys) / build_interval,
+        len(lookup) / lookup_interval))
+
+
+def main(n):
+    print("For %s keys:" % n)
+    keys = [urandom(32) for _ in range(n)]
+    run("dict", {}, keys)
+    run("arena", ArenaStore(2 * n), keys)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    main(n)
@@ -0,0 +1,55 @@
+from __future__ import print_function
+
+import sys
+import time
+from os import urandom
+from random import sample
+
+from hippiehug import Tree
+
+
+def depth(t, keys):
+    """ Returns the average and maximum length of the evidence paths. """
+    lengths = [len(t.evidence(k)[1]) for k in keys]
+    return sum(lengths) / float(len(lengths)), max(lengths)
+
+
+def run(name, keys, balanced):
+    t = Tree(balanced=balanced)
+
+    start = time.time()
+    try:
+        for k in keys:
+            t.add(k)
+    except RecursionError:
+        print("%-24s failed: recursion limit reached" % name)
+        return
+    interval = time.time() - start
+
+    avg, worst = depth(t, sample(keys, min(len(keys), 1000)))
+
+    start = time.time()
+    lookup = sample(keys, min(len(keys), 10000))
+    for k in lookup:
+        assert k in t
+    lookup_interval = time.time() - start
+
+    print("%-24s add: %.4f ms  lookup: %.4f ms  depth: %.1f avg, %d max" % (
+        name, interval * 1000 / len(keys), lookup_interval * 1000 / len(lookup),
+        avg, worst))
+
+
+def main(n):
+    print("For %s keys:" % n)
+    sorted_keys = [b"%016d" % i for i in range(n)]
+    random_keys = [urandom(16) for _ in range(n)]
+
+    run("plain, random", random_keys, False)
+    run("plain, sorted", sorted_keys, False)
+    run("balanced, random", random_keys, True)
+    run("balanced, sorted", sorted_keys, True)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    main(n)
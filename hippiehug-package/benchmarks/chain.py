@@ -0,0 +1,49 @@
+from __future__ import print_function
+
+import shutil
+import sys
+import time
+from os import urandom
+from tempfile import mkdtemp
+
+from hippiehug import Chain, FileStore
+
+
+def run(name, store, blocks, size):
+    """ Appends blocks of *size* random items to a chain, then reads an item
+    of each block, and prints the rate of each. """
+    c = Chain(store)
+    items = [[urandom(32) for _ in range(size)] for _ in range(blocks)]
+
+    start = time.time()
+    for block in items:
+        c.multi_add(block)
+    append_interval = time.time() - start
+
+    start = time.time()
+    for i in range(blocks):
+        assert c.get(i, size - 1) == items[i][-1]
+    get_interval = time.time() - start
+
+    print("%-6s append: %8.1f blocks/sec  %10.0f items/sec  get: %8.1f blocks/sec" % (
+        name, blocks / append_interval, blocks * size / append_interval,
+        blocks / get_interval))
+
+
+def main(blocks, size):
+    print("For %s blocks of %s items:" % (blocks, size))
+    run("dict", {}, blocks, size)
+
+    path = mkdtemp()
+    store = FileStore(path)
+    try:
+        run("file", store, blocks, size)
+    finally:
+        store.close()
+        shutil.rmtree(path)
+
+
+if __name__ == "__main__":
+    blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    main(blocks, size)
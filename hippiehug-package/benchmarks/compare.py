@@ -0,0 +1,110 @@
+""" Compares the results of a benchmark run with a baseline, and reports the
+regressions, from the hippiehug-package directory with:
+
+    python -m benchmarks.compare benchmarks/baseline.json benchmarks.json
+
+Each file is either a report written by ``benchmarks.run --json``, or a history
+written by ``benchmarks.run --history``, of which the last report is used.
+Results are matched by benchmark, store and size, and one is a regression if
+any of its metrics is worse than in the baseline by more than the threshold.
+The exit status is 1 if there is any regression.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import sys
+
+METRICS = [("ops_per_sec", 1), ("p50_ms", -1), ("p99_ms", -1),
+           ("peak_alloc_kb", -1), ("store_requests", -1), ("hashes", -1), ("gets", -1),
+           ("sets", -1), ("depth", -1)]
+"The metrics compared, with 1 if higher is better and -1 if lower is better."
+
+
+def load(path):
+    """ Returns the report in a file, or the last report of a history. """
+    with open(path) as f:
+        text = f.read()
+
+    try:
+        return json.loads(text)
+    except ValueError:
+        lines = [l for l in text.splitlines() if l.strip() != ""]
+        if lines == []:
+            raise Exception("No results in %s." % path)
+        return json.loads(lines[-1])
+
+
+def index(report):
+    return dict(((r["benchmark"], r["store"], r["size"]), r) for r in report["results"])
+
+
+def compare(baseline, current, metrics=None):
+    """ Compares two reports, and returns a list of (benchmark, store, size,
+    metric, baseline value, current value, change) for each metric of the
+    results in both, where change is the relative worsening of the metric.
+
+    Example:
+        >>> base = {"results": [{"benchmark": "add", "store": "dict", "size": 10,
+        ...                      "ops_per_sec": 100.0}]}
+        >>> new = {"results": [{"benchmark": "add", "store": "dict", "size": 10,
+        ...                     "ops_per_sec": 80.0}]}
+        >>> compare(base, new)
+        [('add', 'dict', 10, 'ops_per_sec', 100.0, 80.0, 0.2)]
+
+    """
+    if metrics is None:
+        metrics = [name for name, _ in METRICS]
+
+    old = index(baseline)
+    rows = []
+    for key, result in sorted(index(current).items()):
+        if key not in old:
+            continue
+
+        for name, sign in METRICS:
+            a, b = old[key].get(name), result.get(name)
+            if name not in metrics or a is None or b is None or a == 0:
+                continue
+            change = sign * (a - b) / float(a)
+            rows.append(key + (name, a, b, change))
+
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline", help="the report or history to compare to")
+    parser.add_argument("current", help="the report or history to check")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="relative worsening flagged as a regression (default: %(default)s)")
+    parser.add_argument("--metrics", default=",".join(name for name, _ in METRICS),
+                        help="comma separated metrics to compare (default: all)")
+    parser.add_argument("--all", action="store_true", help="print all results, not only regressions")
+    args = parser.parse_args(argv)
+
+    baseline, current = load(args.baseline), load(args.current)
+    for option in ("balanced", "batch"):
+        if baseline.get(option) != current.get(option):
+            print("warning: %s is %s in the baseline and %s now" % (
+                option, baseline.get(option), current.get(option)))
+
+    rows = compare(baseline, current, args.metrics.split(","))
+    regressions = [r for r in rows if r[-1] > args.threshold]
+
+    for row in rows:
+        if args.all or row in regressions:
+            benchmark, store, size, metric, a, b, change = row
+            print("%-8s %8d  %-16s %-12s %12.3f -> %12.3f  %+7.1f%% worse%s" % (
+                store, size, benchmark, metric, a, b, 100 * change,
+                "  REGRESSION" if row in regressions else ""))
+
+    print("%d regressions in %d comparisons, threshold %.0f%%" % (
+        len(regressions), len(rows), 100 * args.threshold))
+    return regressions
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main() else 0)
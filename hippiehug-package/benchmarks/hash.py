@@ -0,0 +1,40 @@
+from __future__ import print_function
+
+import sys
+import time
+from os import urandom
+from random import sample
+
+from hippiehug import Tree, verify_proof
+from hippiehug.Utils import HASHES
+
+
+def run(alg, keys):
+    """ Prints the rate of building a balanced tree over the keys, and of
+    checking single key proofs, with the hash function named *alg*. """
+    start = time.time()
+    t = Tree.bulk_build(keys, balanced=True, alg=alg)
+    build_interval = time.time() - start
+
+    lookup = sample(keys, min(len(keys), 2000))
+    proofs = [t.multi_proof([k]) for k in lookup]
+
+    start = time.time()
+    for k, (root, proof) in zip(lookup, proofs):
+        assert verify_proof(root, proof, [k], [k], alg=alg) == [True]
+    verify_interval = time.time() - start
+
+    print("%-10s build: %8.0f keys/sec  verify: %8.0f proofs/sec" % (
+        alg, len(keys) / build_interval, len(lookup) / verify_interval))
+
+
+def main(n):
+    print("For %s keys:" % n)
+    keys = [urandom(32) for _ in range(n)]
+    for alg in sorted(HASHES):
+        run(alg, keys)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    main(n)
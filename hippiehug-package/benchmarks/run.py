@@ -0,0 +1,331 @@
+""" Runs the benchmarks of the Tree and Chain operations, over several stores
+and sizes, and prints the rate of each, or writes them as JSON.
+
+Each result records the rate of operations, the median and 99th percentile of
+the time of each call, the peak memory allocated by the benchmark, and the
+counters of an *Instrument*: the hashes computed, the nodes read and written,
+the requests made to the store, including those its cache served, the cache
+hits and misses, and the largest depth reached. The counters and the memory
+are each taken in a run of their own, so that neither slows down the timed
+one. A report can be written to a file with --json, or appended as one line to
+a history file with --history, and compared to a baseline with
+``python -m benchmarks.compare``.
+
+The Redis store uses a local Redis server if one answers, and flushes the
+database given by --redis-db, or else fakeredis if it is installed.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import tempfile
+import time
+from os import urandom
+from random import Random
+
+# Tracing memory allocations needs Python 3.4 or later
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+import hippiehug
+from hippiehug import Tree, Chain, DocChain, RedisStore, FileStore, SQLiteStore, \
+    ArenaStore, Instrument, verify_proof
+
+BENCHMARKS = []
+CHAIN_BENCHMARKS = set()
+
+TREE_ONLY_STORES = set(["arena"])
+"The stores that only hold the nodes of trees."
+
+
+def benchmark(fn):
+    """ Registers a benchmark. It is called with a store, the keys, the batch
+    size and whether trees are balanced, and returns a function and the list of
+    its arguments: the function is timed over all its arguments, which handle
+    all the keys. """
+    BENCHMARKS.append((fn.__name__[6:], fn))
+    return fn
+
+
+def chain_benchmark(fn):
+    """ Registers a benchmark of chains. """
+    CHAIN_BENCHMARKS.add(fn.__name__[6:])
+    return benchmark(fn)
+
+
+def batches(keys, batch):
+    return [keys[i:i + batch] for i in range(0, len(keys), batch)]
+
+
+@benchmark
+def bench_add(store, keys, batch, balanced):
+    t = Tree(store, balanced=balanced)
+    return t.add, keys
+
+
+@benchmark
+def bench_multi_add(store, keys, batch, balanced):
+    t = Tree(store, balanced=balanced)
+    return t.multi_add, batches(keys, batch)
+
+
+@benchmark
+def bench_is_in(store, keys, batch, balanced):
+    t = Tree.bulk_build(keys, store=store, balanced=balanced)
+    return t.is_in, keys
+
+
+@benchmark
+def bench_multi_is_in(store, keys, batch, balanced):
+    t = Tree.bulk_build(keys, store=store, balanced=balanced)
+    return t.multi_is_in, batches(keys, batch)
+
+
+@benchmark
+def bench_evidence(store, keys, batch, balanced):
+    t = Tree.bulk_build(keys, store=store, balanced=balanced)
+    return t.evidence, keys
+
+
+@benchmark
+def bench_verify(store, keys, batch, balanced):
+    t = Tree.bulk_build(keys, store=store, balanced=balanced)
+    proofs = [(k,) + t.multi_proof([k]) for k in keys]
+
+    def verify(args):
+        k, root, proof = args
+        assert verify_proof(root, proof, [k], [k]) == [True]
+    return verify, proofs
+
+
+@chain_benchmark
+def bench_chain_append(store, keys, batch, balanced):
+    c = Chain(store)
+    return c.multi_add, [[k] for k in keys]
+
+
+@chain_benchmark
+def bench_chain_get(store, keys, batch, balanced):
+    c = Chain(store)
+    for k in keys:
+        c.multi_add([k])
+    rnd = Random(len(keys))
+    return (lambda i: c.get(i, 0)), [rnd.randrange(len(keys)) for _ in keys]
+
+
+@chain_benchmark
+def bench_docchain_append(store, keys, batch, balanced):
+    c = DocChain(store)
+    return c.multi_add, [[k] for k in keys]
+
+
+@chain_benchmark
+def bench_docchain_get(store, keys, batch, balanced):
+    c = DocChain(store)
+    for k in keys:
+        c.multi_add([k])
+    rnd = Random(len(keys))
+    return (lambda i: c.get(i, 0)), [rnd.randrange(len(keys)) for _ in keys]
+
+
+def redis_client(db):
+    """ Returns a client of a local Redis server, or of fakeredis, or None. """
+    try:
+        import redis
+        r = redis.StrictRedis(db=db)
+        r.ping()
+        return r
+    except Exception:
+        pass
+
+    try:
+        import fakeredis
+        return fakeredis.FakeStrictRedis()
+    except ImportError:
+        return None
+
+
+def make_store(name, args):
+    """ Returns a new empty store and a function to dispose of it, or None if
+    the store is not available. """
+    if name == "dict":
+        return {}, lambda: None
+
+    if name == "arena":
+        return ArenaStore(), lambda: None
+
+    if name == "file":
+        path = tempfile.mkdtemp()
+        store = FileStore(path)
+        def cleanup():
+            store.close()
+            shutil.rmtree(path)
+        return store, cleanup
+
+    if name == "sqlite":
+        path = tempfile.mkdtemp()
+        store = SQLiteStore(os.path.join(path, "nodes.db"))
+        def cleanup():
+            store.close()
+            shutil.rmtree(path)
+        return store, cleanup
+
+    if name == "redis":
+        r = redis_client(args.redis_db)
+        if r is None:
+            return None
+        r.flushdb()
+        return RedisStore(r), r.flushdb
+
+    raise Exception("Unknown store: %s" % name)
+
+
+def percentile(values, p):
+    """ Returns the *p* percentile of a sorted list of values, by nearest rank. """
+    if values == []:
+        return None
+    return values[max(0, int(math.ceil(p / 100.0 * len(values))) - 1)]
+
+
+def run(fn, store, keys, args):
+    """ Runs one benchmark, and returns its timings. """
+    step, work = fn(store, keys, args.batch, args.balanced)
+
+    clock = getattr(time, "perf_counter", time.time)
+    latencies = []
+    for a in work:
+        start = clock()
+        step(a)
+        latencies.append(clock() - start)
+    interval = sum(latencies)
+    latencies.sort()
+
+    return {"calls": len(work), "items": len(keys), "seconds": interval,
+            "ops_per_sec": len(keys) / interval if interval > 0 else None,
+            "p50_ms": 1000 * percentile(latencies, 50),
+            "p99_ms": 1000 * percentile(latencies, 99)}
+
+
+def count(fn, store, keys, args):
+    """ Runs one benchmark again under an *Instrument*, and returns its
+    counters. The timings are taken by *run* without it, since counting slows
+    down hashing and store accesses. """
+    inst = Instrument()
+    step, work = fn(inst.wrap(store), keys, args.batch, args.balanced)
+    with inst:
+        for a in work:
+            step(a)
+
+    counters = inst.snapshot()
+    counters["store_requests"] = counters.pop("requests")
+    return counters
+
+
+def memory(fn, store, keys, args):
+    """ Runs one benchmark again while tracing memory allocations, and returns
+    the peak memory allocated in KB, from the set up of the benchmark to its
+    end, or None if allocations cannot be traced. The memory of the process
+    as a whole never goes down, so it would only show the largest benchmark
+    run so far. """
+    if tracemalloc is None:
+        return {"peak_alloc_kb": None}
+
+    tracemalloc.start()
+    try:
+        step, work = fn(store, keys, args.batch, args.balanced)
+        for a in work:
+            step(a)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {"peak_alloc_kb": peak // 1024}
+
+
+def main(argv=None):
+    names = [name for name, _ in BENCHMARKS]
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="1000,10000",
+                        help="comma separated numbers of keys (default: %(default)s)")
+    parser.add_argument("--stores", default="dict,arena,file,sqlite,redis",
+                        help="comma separated stores (default: %(default)s)")
+    parser.add_argument("--benchmarks", default=",".join(names),
+                        help="comma separated benchmarks (default: all)")
+    parser.add_argument("--batch", type=int, default=1000,
+                        help="keys per multi_add and multi_is_in (default: %(default)s)")
+    parser.add_argument("--balanced", action="store_true", help="use balanced trees")
+    parser.add_argument("--redis-db", type=int, default=15,
+                        help="Redis database to use and flush (default: %(default)s)")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--history", help="append the results as a line of this file")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    selected = args.benchmarks.split(",")
+    for name in selected:
+        if name not in names:
+            parser.error("unknown benchmark: %s" % name)
+
+    results = []
+    for store_name in args.stores.split(","):
+        for n in sizes:
+            keys = [urandom(32) for _ in range(n)]
+            for name, fn in BENCHMARKS:
+                if name not in selected:
+                    continue
+                if name in CHAIN_BENCHMARKS and store_name in TREE_ONLY_STORES:
+                    continue
+
+                made = make_store(store_name, args)
+                if made is None:
+                    print("%-8s skipped: not available" % store_name)
+                    break
+
+                store, cleanup = made
+                try:
+                    result = run(fn, store, keys, args)
+                finally:
+                    cleanup()
+
+                store, cleanup = make_store(store_name, args)
+                try:
+                    result.update(count(fn, store, keys, args))
+                finally:
+                    cleanup()
+
+                store, cleanup = make_store(store_name, args)
+                try:
+                    result.update(memory(fn, store, keys, args))
+                finally:
+                    cleanup()
+
+                result.update({"benchmark": name, "store": store_name, "size": n})
+                results.append(result)
+                print("%-8s %8d  %-16s %10.0f ops/sec  p50 %8.3f ms  p99 %8.3f ms  %8d store requests  %8d hashes" % (
+                    store_name, n, name, result["ops_per_sec"] or 0,
+                    result["p50_ms"] or 0, result["p99_ms"] or 0, result["store_requests"], result["hashes"]))
+
+    report = {"version": hippiehug.__version__, "python": platform.python_version(),
+              "platform": platform.platform(), "time": time.time(),
+              "balanced": args.balanced, "batch": args.batch, "results": results}
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.history:
+        with open(args.history, "a") as f:
+            f.write(json.dumps(report, sort_keys=True) + "\n")
+
+    return results
+
+
+if __name__ == "__main__":
+    main()
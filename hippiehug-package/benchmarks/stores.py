@@ -0,0 +1,67 @@
+from __future__ import print_function
+
+import os
+import sys
+import time
+from os import urandom
+from tempfile import mkdtemp
+
+from hippiehug import Tree, RedisStore, FileStore
+from hippiehug.SQLiteStore import SQLiteStore
+
+
+def run(name, store, n, batch):
+    """ Adds *n* random keys in batches, then looks them all up, and prints
+    the rate of node writes, counting all the time or only that spent in the
+    store, and the rate of lookups. """
+    t = Tree(store, balanced=True)
+    keys = [urandom(32) for _ in range(n)]
+
+    written = [0, 0.0]
+    put_many = store.put_many
+    def counting_put_many(items):
+        items = list(items)
+        start = time.time()
+        put_many(items)
+        written[0] += len(items)
+        written[1] += time.time() - start
+    store.put_many = counting_put_many
+
+    start = time.time()
+    for i in range(0, n, batch):
+        t.multi_add(keys[i:i + batch])
+    add_interval = time.time() - start
+
+    if hasattr(store, "cache"):
+        store.cache.clear()
+
+    start = time.time()
+    for i in range(0, n, batch):
+        assert t.multi_is_in(keys[i:i + batch]) == [True] * len(keys[i:i + batch])
+    lookup_interval = time.time() - start
+
+    print("%-10s writes: %8.0f nodes/sec (%8.0f in store)  lookups: %8.0f keys/sec" % (
+        name, written[0] / add_interval, written[0] / written[1], n / lookup_interval))
+
+
+def main(n, batch):
+    print("For %s keys, in batches of %s:" % (n, batch))
+    run("sqlite", SQLiteStore(os.path.join(mkdtemp(), "nodes.db")), n, batch)
+    run("file", FileStore(mkdtemp()), n, batch)
+
+    try:
+        import redis
+        r = redis.StrictRedis()
+        r.ping()
+    except Exception:
+        print("%-10s skipped: no Redis server" % "redis")
+        return
+
+    r.flushdb()
+    run("redis", RedisStore(r), n, batch)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    batch = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    main(n, batch)
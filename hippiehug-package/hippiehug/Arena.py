@@ -0,0 +1,214 @@
+""" A compact in-memory store for the nodes of trees.
+
+Nodes are packed one after the other into a single bytearray, instead of being
+kept as Python objects, each holding several bytes objects. A node is a record
+made of a header and its byte fields:
+
+    record := kind_and_hash_id(1) len(key)(2) len(item)(2) key item     (Leaf)
+            | kind_and_hash_id(1) len(pivot)(2) pivot left right        (Branch)
+
+The hash of a node is not kept in its record, since materializing a Leaf or
+Branch from its record computes it again. Records are found with an open
+addressing hash table held in an array of 64 bit integers: each used slot holds
+the offset of a record, and a tag of 24 bits of the hash of its node, so that
+only records with a matching tag are materialized while probing.
+"""
+
+from array import array
+from struct import Struct
+
+from .Nodes import Leaf, Branch
+from .Utils import HASH_IDS
+
+KEY_HEAD = Struct("<QI")
+LEAF_HEAD = Struct("<BHH")
+BRANCH_HEAD = Struct("<BH")
+LEAF, BRANCH = 0, 1
+HASH_NAMES = dict((i, name) for name, i in HASH_IDS.items())
+
+# Python 2 has no typecode for 64 bit integers, but its longs have 64 bits on
+# 64 bit Unix platforms
+try:
+    SLOT_TYPE = array("Q").typecode
+except ValueError:
+    SLOT_TYPE = "L"
+
+OFFSET_BITS = 40
+OFFSET_MASK = (1 << OFFSET_BITS) - 1
+EMPTY, DELETED = 0, OFFSET_MASK
+
+
+def _position(key):
+    return KEY_HEAD.unpack_from(key)[0]
+
+
+def _tag(key):
+    return KEY_HEAD.unpack_from(key)[1] & 0xffffff
+
+
+class ArenaStore():
+    def __init__(self, capacity=1024):
+        """ Initialize an empty store, with room in its index for *capacity*
+        nodes before it grows.
+
+        Example:
+            >>> from hippiehug import Tree
+            >>> t = Tree(ArenaStore())
+            >>> t.multi_add([b"Hello", b"World"])
+            >>> b"World" in t
+            True
+
+        """
+        self.data = bytearray()
+        "The records of all nodes."
+
+        size = 1
+        while 3 * size <= 4 * capacity:
+            size *= 2
+
+        self.slots = array(SLOT_TYPE, [EMPTY]) * size
+        "The index, holding the tag and the offset plus one of each record."
+
+        self.count = 0
+        self.deleted = 0
+        self.dead = 0
+
+    def _find(self, key):
+        """ Returns the slot of the index holding *key* and its node, or the
+        empty slot where it would go and None. """
+        slots = self.slots
+        mask = len(slots) - 1
+        tag = _tag(key)
+        i = _position(key) & mask
+        while True:
+            v = slots[i]
+            if v == EMPTY:
+                return i, None
+
+            offset = v & OFFSET_MASK
+            if v >> OFFSET_BITS == tag and offset != DELETED:
+                node = self._view(offset - 1)
+                if node.hid == key:
+                    return i, node
+            i = (i + 1) & mask
+
+    def _grow(self):
+        """ Rebuilds the index without the slots of deleted nodes once three
+        quarters of its slots are used, with twice as many slots if more than
+        a third are used by nodes. """
+        if 4 * (self.count + self.deleted) < 3 * len(self.slots):
+            return
+
+        size = len(self.slots)
+        if 3 * self.count >= size:
+            size *= 2
+
+        old_slots = self.slots
+        self.slots = array(SLOT_TYPE, [EMPTY]) * size
+        self.deleted = 0
+
+        mask = size - 1
+        for v in old_slots:
+            offset = v & OFFSET_MASK
+            if v != EMPTY and offset != DELETED:
+                i = _position(self._view(offset - 1).hid) & mask
+                while self.slots[i] != EMPTY:
+                    i = (i + 1) & mask
+                self.slots[i] = v
+
+    def _size(self, offset):
+        """ Returns the size of the record at an *offset*. """
+        if self.data[offset] >> 4 == LEAF:
+            _, len1, len2 = LEAF_HEAD.unpack_from(self.data, offset)
+            return LEAF_HEAD.size + len1 + len2
+        _, len1 = BRANCH_HEAD.unpack_from(self.data, offset)
+        return BRANCH_HEAD.size + len1 + 64
+
+    def _record(self, node):
+        alg = HASH_IDS[node.alg]
+        if isinstance(node, Leaf):
+            return LEAF_HEAD.pack(LEAF << 4 | alg, len(node.key), len(node.item)) + \
+                node.key + node.item
+        if isinstance(node, Branch):
+            return BRANCH_HEAD.pack(BRANCH << 4 | alg, len(node.pivot)) + \
+                node.pivot + node.left_branch + node.right_branch
+
+        raise TypeError("Unknown Type: %r" % (node,))
+
+    def _view(self, offset):
+        """ Materializes the node with the record at an *offset*. """
+        data = self.data
+        alg = HASH_NAMES[data[offset] & 15]
+
+        if data[offset] >> 4 == LEAF:
+            _, len1, len2 = LEAF_HEAD.unpack_from(data, offset)
+            pos = offset + LEAF_HEAD.size
+            key = bytes(data[pos:pos + len1])
+            item = bytes(data[pos + len1:pos + len1 + len2])
+            return Leaf(item, key, alg)
+
+        _, len1 = BRANCH_HEAD.unpack_from(data, offset)
+        pos = offset + BRANCH_HEAD.size
+        pivot = bytes(data[pos:pos + len1])
+        pos += len1
+        return Branch(pivot, bytes(data[pos:pos + 32]), bytes(data[pos + 32:pos + 64]), alg)
+
+    def __getitem__(self, key):
+        _, node = self._find(key)
+        if node is None:
+            raise KeyError(key)
+        return node
+
+    def __setitem__(self, key, value):
+        if key != value.hid:
+            raise Exception("Value has the wrong hash.")
+
+        i, node = self._find(key)
+        if node is not None:
+            return
+
+        if len(self.data) + 1 >= DELETED:
+            raise Exception("Arena is full.")
+
+        self.slots[i] = _tag(key) << OFFSET_BITS | (len(self.data) + 1)
+        self.data += self._record(value)
+        self.count += 1
+        self._grow()
+
+    def __contains__(self, key):
+        return self._find(key)[1] is not None
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter([self._view((v & OFFSET_MASK) - 1).hid for v in self.slots
+                     if v != EMPTY and v & OFFSET_MASK != DELETED])
+
+    def __delitem__(self, key):
+        i, node = self._find(key)
+        if node is None:
+            raise KeyError(key)
+
+        self.dead += self._size((self.slots[i] & OFFSET_MASK) - 1)
+        self.slots[i] = DELETED
+        self.count -= 1
+        self.deleted += 1
+
+    def nbytes(self):
+        """ Returns the number of bytes used by the records and the index. """
+        return len(self.data) + self.slots.itemsize * len(self.slots)
+
+    def compact(self):
+        """ Copies the records of the nodes not deleted to a new arena, to
+        reclaim the space of deleted ones. """
+        data = bytearray()
+        for i, v in enumerate(self.slots):
+            offset = v & OFFSET_MASK
+            if v != EMPTY and offset != DELETED:
+                size = self._size(offset - 1)
+                self.slots[i] = (v >> OFFSET_BITS) << OFFSET_BITS | (len(data) + 1)
+                data += self.data[offset - 1:offset - 1 + size]
+
+        self.data = data
+        self.dead = 0
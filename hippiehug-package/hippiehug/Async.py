@@ -0,0 +1,262 @@
+""" Asynchronous versions of the Tree and Chain operations.
+
+An asynchronous store offers coroutines in place of the store protocol:
+
+    ``await store.get(key)``
+        Returns the node for a key, and raises a KeyError if it is missing.
+
+    ``await store.get_many(keys)``
+        Optional: returns the list of nodes for a list of keys, in order.
+
+    ``await store.put_many(items)``
+        Writes a list of (key, node) pairs.
+
+Reads of independent sub-trees are issued together: a whole level of a tree is
+read with one ``get_many``, or with concurrent ``get`` calls gathered when the
+store has no ``get_many``. Any synchronous store can be used through an
+*AsyncStoreAdapter*, which runs its calls in a thread pool.
+"""
+
+import asyncio
+
+from .Nodes import Leaf, _check_hash, _partition
+from .Chain import check_hash
+from .Tree import Tree
+from .Store import get_many as sync_get_many, put_many as sync_put_many
+from .Utils import hash_function
+
+
+async def get_many(store, keys):
+    """ Returns the nodes for a list of *keys* from an asynchronous store,
+    with a single request if it supports batched reads, or concurrent ones. """
+    if keys == []:
+        return []
+    if hasattr(store, "get_many"):
+        return await store.get_many(keys)
+    return list(await asyncio.gather(*[store.get(k) for k in keys]))
+
+
+class AsyncStoreAdapter():
+    def __init__(self, store, executor=None):
+        """ Initialize an asynchronous store over a synchronous *store*, such
+        as a dictionary or a *RedisStore*, running its calls on an *executor*,
+        by default the thread pool of the event loop. """
+        self.store = store
+        self.executor = executor
+
+    def _run(self, fn, *args):
+        loop = asyncio.get_event_loop()
+        return loop.run_in_executor(self.executor, fn, *args)
+
+    async def get(self, key):
+        return await self._run(self.store.__getitem__, key)
+
+    async def get_many(self, keys):
+        return await self._run(sync_get_many, self.store, keys)
+
+    async def put_many(self, items):
+        return await self._run(sync_put_many, self.store, list(items))
+
+
+class _Bridge():
+    """ A synchronous view of an asynchronous store, for the algorithms of
+    *Tree* run in a worker thread. Nodes read ahead are served from memory, and
+    any other access blocks the thread until the event loop completes it. """
+
+    def __init__(self, store, loop, nodes):
+        self.store = store
+        self.loop = loop
+        self.nodes = nodes
+
+    def _wait(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def __getitem__(self, key):
+        if key not in self.nodes:
+            self.nodes[key] = self._wait(self.store.get(key))
+        return self.nodes[key]
+
+    def __contains__(self, key):
+        try:
+            self[key]
+            return True
+        except KeyError:
+            return False
+
+    def get_many(self, keys):
+        missing = [k for k in keys if k not in self.nodes]
+        if missing != []:
+            self.nodes.update(zip(missing, self._wait(get_many(self.store, missing))))
+        return [self.nodes[k] for k in keys]
+
+    def __setitem__(self, key, value):
+        self.put_many([(key, value)])
+
+    def put_many(self, items):
+        items = list(items)
+        self._wait(self.store.put_many(items))
+        self.nodes.update(items)
+
+
+class AsyncTree():
+    def __init__(self, store, root_hash=None, balanced=False, alg="sha256"):
+        """ Initialize a Tree over an asynchronous *store*, with the same
+        parameters as a *Tree*.
+
+        Example:
+            >>> import asyncio
+            >>> async def main():
+            ...     t = AsyncTree(AsyncStoreAdapter({}))
+            ...     await t.multi_add([b"Hello", b"World"])
+            ...     return await t.multi_is_in([b"Hello", b"!"])
+            >>> asyncio.new_event_loop().run_until_complete(main())
+            [True, False]
+
+        """
+        self.store = store
+        self.root_hash = root_hash
+        self.balanced = balanced
+        self.alg = alg
+        self._hash = hash_function(alg)
+
+    def root(self):
+        """Return the root of the Tree."""
+        return self.root_hash
+
+    async def _descend(self, items, keys, evidence, both):
+        """ Walks down the paths to keys level by level, reading each level in
+        one batch, and returns the nodes read and whether each (item, key)
+        pair is in a leaf. With *both*, all children of the branches on the
+        paths are read too. """
+        root = (await get_many(self.store, [self.root_hash]))[0]
+        _check_hash(self.root_hash, root)
+        if root.alg != self.alg:
+            raise Exception("Tree uses %s, but its root uses %s." % (self.alg, root.alg))
+
+        nodes = {self.root_hash: root}
+        solution = {}
+        work_list = [(root, items, keys)]
+        while work_list != []:
+            fetch = []
+            for (node, work_items, work_keys) in work_list:
+                if evidence is not None:
+                    evidence.append(node)
+
+                if isinstance(node, Leaf):
+                    for i, k in zip(work_items, work_keys):
+                        solution[(i, k)] = Leaf(i, k, node.alg).hid == node.hid
+                    continue
+
+                left_list, left_keys, right_list, right_keys = _partition(
+                    node.pivot, work_items, work_keys)
+                if left_list != [] or both:
+                    fetch.append((node.left_branch, left_list, left_keys))
+                if right_list != [] or both:
+                    fetch.append((node.right_branch, right_list, right_keys))
+
+            children = await get_many(self.store, [f[0] for f in fetch])
+
+            work_list = []
+            for (child_id, child_items, child_keys), child in zip(fetch, children):
+                _check_hash(child_id, child)
+                nodes[child_id] = child
+                if child_items != []:
+                    work_list.append((child, child_items, child_keys))
+
+        return nodes, solution
+
+    async def multi_add(self, items, keys=None):
+        """Add many elements to the Merkle tree, as *Tree.multi_add*.
+
+        The paths to the new keys are read ahead level by level, then the new
+        nodes are computed in a worker thread, and written in one batch."""
+
+        if items == []:
+            return
+
+        if keys is None:
+            keys = items
+        item_keys = [self._hash(i) for i in items]
+
+        nodes = {}
+        if self.root_hash is not None:
+            nodes, _ = await self._descend(item_keys, keys, None, self.balanced)
+
+        loop = asyncio.get_event_loop()
+        t = Tree(_Bridge(self.store, loop, nodes), self.root_hash, self.balanced, self.alg)
+        await loop.run_in_executor(None, t.multi_add, items, keys)
+        self.root_hash = t.root()
+
+    async def multi_is_in(self, items, keys=None, evidence=False):
+        """Check whether the items are in the Tree, as *Tree.multi_is_in*."""
+
+        if keys is None:
+            keys = items
+        item_keys = [self._hash(i) for i in items]
+
+        if self.root_hash is None:
+            if not evidence:
+                return [ False ] * len(items)
+            else:
+                return [ False ] * len(items), None, []
+
+        evid = [] if evidence else None
+        _, solution = await self._descend(item_keys, keys, evid, False)
+
+        result = [solution[(i, k)] for i, k in zip(item_keys, keys)]
+        if not evidence:
+            return result
+        else:
+            return result, self.root_hash, evid
+
+    async def is_in(self, item, key=None):
+        """Check whether an item is in the Tree."""
+        return (await self.multi_is_in([item], None if key is None else [key]))[0]
+
+    async def evidence(self, key):
+        """Gather evidence about the inclusion / exclusion of the *key*, as
+        *Tree.evidence*."""
+        if self.root_hash is None:
+            return []
+
+        evidence = []
+        hid = self.root_hash
+        while True:
+            node = await self.store.get(hid)
+            _check_hash(hid, node)
+            evidence.append(node)
+
+            if isinstance(node, Leaf):
+                return self.root_hash, evidence
+            hid = node.left_branch if key <= node.pivot else node.right_branch
+
+
+class AsyncChain():
+    def __init__(self, store, root_hash=None):
+        """ Initialize a chain over an asynchronous *store*, with the same
+        parameters as a *Chain*. """
+        self.store = store
+        self.head = root_hash
+
+    def root(self):
+        """Return the head of the chain."""
+        return self.head
+
+    async def get(self, block_index, item_index, evidence=None):
+        """Return the record at a specific block and item index, and
+        potentially a bundle of evidence, as *Chain.get*."""
+        if self.head is None:
+            return None
+
+        block_hash = self.head
+        while True:
+            block = await self.store.get(block_hash)
+            check_hash(block_hash, block)
+
+            if block.index == block_index or not (0 <= block_index <= block.index):
+                return block.get_item({}, block_index, item_index, evidence)
+
+            if evidence != None:
+                block._prove(evidence)
+
+            _, block_hash = [(f, b) for (f, b) in block.fingers if f >= block_index][-1]
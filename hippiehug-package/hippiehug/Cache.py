@@ -0,0 +1,110 @@
+from collections import OrderedDict
+
+
+class NodeCache:
+    def __init__(self, max_entries=10000, max_bytes=None):
+        """ Initialize a bounded cache of nodes, shared by the remote stores.
+
+        Entries are evicted in least recently used order once there are more
+        than *max_entries* of them, or once their total size is more than
+        *max_bytes*. Either bound may be None to disable it. Pinned entries are
+        never evicted, and do not count towards the bounds.
+
+        Example:
+            >>> c = NodeCache(max_entries=2)
+            >>> c.put(b"A", "Node A")
+            >>> c.put(b"B", "Node B")
+            >>> c.get(b"A")
+            'Node A'
+            >>> c.put(b"C", "Node C")
+            >>> b"B" in c
+            False
+            >>> c.stats()["evictions"]
+            1
+
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.entries = OrderedDict()
+        self.pinned = {}
+        self.size = 0
+
+        self.hits = 0
+        "The number of lookups served from the cache."
+
+        self.misses = 0
+        "The number of lookups not found in the cache."
+
+        self.evictions = 0
+        "The number of entries evicted to stay within bounds."
+
+    def get(self, key):
+        """ Returns the cached value for *key*, or None. """
+        if key in self.pinned:
+            self.hits += 1
+            return self.pinned[key]
+
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        # Re-insert to mark as the most recently used
+        self.entries[key] = entry
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, value, size=1):
+        """ Caches *value* under *key*, with a size in bytes, evicting the
+        least recently used entries if the cache gets too large. """
+        if key in self.pinned:
+            return
+
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= old[1]
+
+        self.entries[key] = (value, size)
+        self.size += size
+
+        while self.entries and \
+                ((self.max_entries is not None and len(self.entries) > self.max_entries) or
+                 (self.max_bytes is not None and self.size > self.max_bytes)):
+            _, (_, old_size) = self.entries.popitem(last=False)
+            self.size -= old_size
+            self.evictions += 1
+
+    def discard(self, key):
+        """ Removes *key* from the cache, if it is there. """
+        self.pinned.pop(key, None)
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def pin(self, key, value):
+        """ Caches *value* under *key*, and never evicts it until unpinned. """
+        self.discard(key)
+        self.pinned[key] = value
+
+    def unpin_all(self):
+        """ Unpins all pinned entries, and drops them from the cache. """
+        self.pinned = {}
+
+    def clear(self):
+        """ Drops all entries, including pinned ones. """
+        self.entries = OrderedDict()
+        self.pinned = {}
+        self.size = 0
+
+    def stats(self):
+        """ Returns the counters and the current occupancy of the cache. """
+        return {"hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "entries": len(self.entries),
+                "bytes": self.size, "pinned": len(self.pinned)}
+
+    def __contains__(self, key):
+        return key in self.pinned or key in self.entries
+
+    def __len__(self):
+        return len(self.entries) + len(self.pinned)
@@ -1,8 +1,10 @@
+import six
 from copy import copy, deepcopy
 from binascii import hexlify
 from msgpack import packb
 
-from hippiehug.Utils import binary_hash
+from hippiehug.Utils import binary_hash, hash_function
+from hippiehug.Store import get_many, put_many
 
 
 def get_fingers(seq):
@@ -21,19 +23,115 @@ def sort_dicts(unsorted):
     if isinstance(unsorted, list):
         # do not sort lists. they do have a defined order already.
         # we need to sort their elements though.
+        if all(isinstance(e, ATOMIC) for e in unsorted):
+            return unsorted
         return [sort_dicts(e) for e in unsorted]
     else:
         return unsorted
 
 
+ATOMIC = (bytes, six.text_type, six.integer_types, float, bool, type(None))
+"The immutable types of items and fields, that blocks share rather than copy."
+
+
+def _immutable(value):
+    return isinstance(value, ATOMIC) or \
+        (isinstance(value, tuple) and all(isinstance(e, ATOMIC) for e in value))
+
+
+def _share(values):
+    """ Returns a copy of a list, sharing its immutable elements. """
+    return [v if isinstance(v, ATOMIC) or _immutable(v) else deepcopy(v) for v in values]
+
+
+def _item_hash(item, alg):
+    return binary_hash(b"I" + packb(sort_dicts(item)), alg)
+
+
+def _split(n):
+    """ Returns the number of items in the left sub-tree over n > 1 items: the
+    largest power of two smaller than n. """
+    k = 1
+    while 2 * k < n:
+        k *= 2
+    return k
+
+
+class _ItemTree():
+    """ The positional Merkle tree over the items of a block. Each sub-tree over
+    more than one item is split after the largest power of two of its items
+    smaller than their number, and the hashes of sub-trees are computed once. """
+
+    def __init__(self, items, alg):
+        self.alg = alg
+        self._hash = hash_function(alg)
+        self.leaves = [_item_hash(i, alg) for i in items]
+        self.nodes = {}
+
+    def root(self, lo=0, hi=None):
+        """ Returns the hash of the sub-tree over the items in [lo, hi). """
+        if hi is None:
+            hi = len(self.leaves)
+        if hi - lo == 0:
+            return self._hash(b"E")
+        if hi - lo == 1:
+            return self.leaves[lo]
+
+        if (lo, hi) not in self.nodes:
+            k = lo + _split(hi - lo)
+            self.nodes[(lo, hi)] = self._hash(b"N" + self.root(lo, k) + self.root(k, hi))
+        return self.nodes[(lo, hi)]
+
+    def path(self, item_index):
+        """ Returns the hashes of the siblings on the path to an item, from the
+        item up to the root. """
+        path = []
+        lo, hi = 0, len(self.leaves)
+        while hi - lo > 1:
+            k = lo + _split(hi - lo)
+            if item_index < k:
+                path.append(self.root(k, hi))
+                hi = k
+            else:
+                path.append(self.root(lo, k))
+                lo = k
+        return path[::-1]
+
+
+def verify_item(item_root, count, item_index, item, path, alg="sha256"):
+    """ Checks that *item* is at *item_index* in a list of *count* items with
+    the Merkle root *item_root*, given the path to it. """
+    sides = []
+    lo, hi = 0, count
+    while hi - lo > 1:
+        k = lo + _split(hi - lo)
+        sides.append(item_index >= k)
+        lo, hi = (k, hi) if item_index >= k else (lo, k)
+
+    if not (0 <= item_index < count) or len(path) != len(sides):
+        return False
+
+    fn = hash_function(alg)
+    value = _item_hash(item, alg)
+    for right, sibling in zip(reversed(sides), path):
+        if right:
+            value = fn(b"N" + sibling + value)
+        else:
+            value = fn(b"N" + value + sibling)
+    return value == item_root
+
+
 class Document:
-    __slots__ = ["item", "hid"]
+    __slots__ = ["item", "hid", "alg"]
 
-    def __init__(self, item):
+    def __init__(self, item, alg="sha256"):
         self.item = item
         """ The item stored in the Leaf. """
 
-        self.hid = binary_hash(packb(("D", self.item)))
+        self.alg = alg
+        """ The name of the hash function of the Document. """
+
+        self.hid = binary_hash(packb(("D", self.item)), alg)
 
     def identity(self):
         """ Returns the hash ID of the Leaf. """
@@ -44,22 +142,147 @@ class Document:
 
 
 class Block:
-    def __init__(self, items, index=0, fingers=None, aux=None):
-        """Initialize a block."""
-        self.items = deepcopy(items)
+    FIELDS = ("items", "index", "fingers", "aux", "alg", "merkle")
+
+    def __init__(self, items, index=0, fingers=None, aux=None, alg="sha256", merkle=False):
+        """Initialize a block, hashed with the hash function named *alg*.
+
+        The block copies its items, fingers and aux, sharing the items that
+        are immutable, such as bytes. Its fields may be changed until it is
+        sealed, which a chain does when it adds the block. A sealed block
+        cannot be changed, and encodes and hashes its fields only once: its
+        items and aux are then read as copies, which share their immutable
+        parts, so that changing them in place does not change the block.
+
+        With *merkle*, the hash of the block covers the root of a Merkle tree
+        over its items, rather than the items themselves, so that the
+        evidence for an item only holds the *BlockHeader* of the block and
+        the path to the item."""
+        self.items = _share(items)
         self.index = index
-        self.fingers = deepcopy(fingers) if fingers else []
+        self.fingers = _share(fingers) if fingers else []
         self.aux = deepcopy(aux)
+        self.alg = alg
+        self.merkle = merkle
+        self.sealed = False
+
+        self._hid = None
+        self._encoding = None
+        self._item_tree = None
+
+    def __setattr__(self, name, value):
+        if name in Block.FIELDS and getattr(self, "sealed", False):
+            raise Exception("Block is sealed.")
+        object.__setattr__(self, name, value)
+
+    @property
+    def items(self):
+        if self.sealed:
+            return list(self._items) if self._immutable else _share(self._items)
+        return self._items
+
+    @items.setter
+    def items(self, items):
+        self._items = items
+
+    @property
+    def aux(self):
+        if self.sealed and not _immutable(self._aux):
+            return deepcopy(self._aux)
+        return self._aux
+
+    @aux.setter
+    def aux(self, aux):
+        self._aux = aux
+
+    def seal(self):
+        """Freeze the fields of the block, and hash it once and for all."""
+        self._freeze()
+        self.sealed = True
+        self._hid = self.hash()
+
+    def _freeze(self):
+        """Copy the fields of the block that could still be changed in place,
+        since they may be referred to from outside of it."""
+        self.fingers = tuple(self.fingers)
+        self.aux = deepcopy(self._aux)
+        if all(isinstance(i, ATOMIC) for i in self._items):
+            self._items = tuple(self._items)
+            self._immutable = True
+        else:
+            self._items = tuple(_share(self._items))
+            self._immutable = all(_immutable(i) for i in self._items)
 
     def hash(self):
         """Return the head of the block."""
+        if self._hid is not None:
+            return self._hid
+        if self.merkle:
+            return binary_hash(packb(("M", self.index, self.fingers, len(self._items),
+                                      self._tree().root(), self._aux)), self.alg)
         return binary_hash(packb(
-                ("S", self.index, self.fingers, sort_dicts(self.items), self.aux)))
+                ("S", self.index, self.fingers, sort_dicts(list(self._items)), self._aux)), self.alg)
 
     @property
     def hid(self):
         return self.hash()
 
+    def _tree(self):
+        """Return the Merkle tree over the items, kept once the block is sealed."""
+        if self._item_tree is not None:
+            return self._item_tree
+
+        tree = _ItemTree(self._items, self.alg)
+        if self.sealed:
+            self._item_tree = tree
+        return tree
+
+    def encoding(self):
+        """Return the msgpack encoding of the fields of the block, as kept by
+        the stores in *Codec*, computed only once if the block is sealed."""
+        if self._encoding is not None:
+            return self._encoding
+
+        alg = () if self.alg == "sha256" else (self.alg,)
+        data = packb((self.index, self.fingers, self._items, self._aux) + alg)
+        if self.sealed:
+            self._encoding = data
+        return data
+
+    def header(self):
+        """Return the *BlockHeader* of a block with *merkle*, without items."""
+        return BlockHeader(self.index, self.fingers, len(self._items),
+                           self._tree().root(), self._aux, self.alg)
+
+    def _count(self):
+        return len(self._items)
+
+    def _item(self, item_index):
+        item = self._items[item_index]
+        return item if _immutable(item) else deepcopy(item)
+
+    def _item_path(self, item_index):
+        return self._tree().path(item_index)
+
+    def _indexed_items(self):
+        """Return the (item index, item) of the items of the block."""
+        return list(enumerate(self.items))
+
+    def _prove(self, evidence, item_index=None):
+        """Add the block to a bundle of evidence, or its header with the path to
+        the item at *item_index* if the block has a Merkle root over items."""
+        if not self.merkle:
+            evidence[self.hid] = self
+            return
+
+        header = evidence.get(self.hid)
+        if not isinstance(header, BlockHeader):
+            header = self.header()
+            evidence[self.hid] = header
+
+        if item_index is not None and item_index not in header.proofs:
+            header.proofs[item_index] = (self._item(item_index), self._item_path(item_index))
+
     def next_block(self, store, items, pre_commit_fn=None):
         """Build a subsequent block, sealing a list of transactions.
 
@@ -74,14 +297,20 @@ class Block:
         finger_index = get_fingers(new_index)
         new_fingers += [f for f in self.fingers if f[0] in finger_index]
 
-        new_b = Block(items, new_index, new_fingers)
+        new_b = Block(items, new_index, new_fingers, alg=self.alg, merkle=self.merkle)
 
         if pre_commit_fn is not None:
             pre_commit_fn(new_b)
 
+        new_b.seal()
         store[new_b.hid] = new_b
         return new_b
 
+    def finger(self, block_index):
+        """Return the hash of the next block on the way from this block back to
+        an earlier block at *block_index*."""
+        return [block_hash for (f, block_hash) in self.fingers if f >= block_index][-1]
+
     def get_item(self, store, block_index, item_index, evidence=None):
         """Return an item from the chain at a specific block and item index.
 
@@ -96,15 +325,17 @@ class Block:
             raise Exception("Block is beyond this chain head: must be 0 <= %s <= %s." % (block_index, self.index))
 
         if evidence != None:
-            evidence[self.hid] = self
+            self._prove(evidence)
 
         if block_index == self.index:
-            if not (0 <= item_index < len(self.items)):
-               raise Exception("Item is beyond this Block: must be 0 <= %s <= %s." % (item_index, len(self.items)))
+            if not (0 <= item_index < self._count()):
+               raise Exception("Item is beyond this Block: must be 0 <= %s <= %s." % (item_index, self._count()))
 
-            return self.items[item_index]
+            if evidence != None:
+                self._prove(evidence, item_index)
+            return self._item(item_index)
 
-        _, target_h = [(f,block_hash) for (f, block_hash) in self.fingers if f >= block_index][-1]
+        target_h = self.finger(block_index)
 
         # Get the target block and check its integrity
         target_block = store[target_h]
@@ -116,11 +347,98 @@ class Block:
         return self.hid == other.hid
 
 
+class BlockHeader(Block):
+    def __init__(self, index, fingers, count, item_root, aux=None, alg="sha256", proofs=None):
+        """Initialize the header of a block with a Merkle root over its items,
+        with the same hash as the block. It holds the number of items and their
+        root instead of the items, and *proofs*, a dictionary mapping the index
+        of the items it proves to the item and the path to it."""
+        self.index = index
+        self.fingers = _share(fingers) if fingers else []
+        self.aux = deepcopy(aux)
+        self.alg = alg
+        self.merkle = True
+        self.count = count
+        self.item_root = item_root
+        self.proofs = dict(proofs) if proofs else {}
+
+        self._hid = None
+        self._encoding = None
+        self.seal()
+
+    @property
+    def items(self):
+        """The items proven by the header, in order, each checked against the
+        root of the block."""
+        return [item for _, item in self._indexed_items()]
+
+    def _indexed_items(self):
+        return [(i, self._item(i)) for i in sorted(self.proofs)]
+
+    def _freeze(self):
+        self.fingers = tuple(self.fingers)
+        self.aux = deepcopy(self._aux)
+
+    def hash(self):
+        """Return the head of the block."""
+        if self._hid is not None:
+            return self._hid
+        return binary_hash(packb(("M", self.index, self.fingers, self.count,
+                                  self.item_root, self._aux)), self.alg)
+
+    def encoding(self):
+        """Return the msgpack encoding of the fields of the header."""
+        alg = () if self.alg == "sha256" else (self.alg,)
+        proofs = [(i, item, path) for i, (item, path) in sorted(self.proofs.items())]
+        return packb((self.index, self.fingers, self.count, self.item_root,
+                      self._aux, proofs) + alg)
+
+    def header(self):
+        return BlockHeader(self.index, self.fingers, self.count, self.item_root,
+                           self.aux, self.alg)
+
+    def _count(self):
+        return self.count
+
+    def _item(self, item_index):
+        if item_index not in self.proofs:
+            raise Exception("Item %s is not proven by this header." % item_index)
+
+        item, path = self.proofs[item_index]
+        if not verify_item(self.item_root, self.count, item_index, item, path, self.alg):
+            raise Exception("Item does not match the root of the block.")
+        return item
+
+    def _item_path(self, item_index):
+        return self.proofs[item_index][1]
+
+
 class Chain:
-    def __init__(self, store=None, root_hash=None):
-        """Initialize a chain backed by a store."""
+    def __init__(self, store=None, root_hash=None, alg="sha256", index=None, merkle=False):
+        """Initialize a chain backed by a store, with blocks hashed with the
+        hash function named *alg*.
+
+        :param merkle: Start a new chain with blocks that commit to their
+                items through a Merkle root, so that the evidence for an item
+                holds block headers and the path to the item, rather than
+                whole blocks. A chain keeps the kind of blocks of its head.
+
+        :param index: An optional mapping from block indexes to block hashes,
+                such as a *BlockIndex*, with the hash of the head it was
+                written for as its *head*, kept up to date by *multi_add*. It
+                lets *get* read any block directly when not verifying it
+                against the head, and can be rebuilt from the head with
+                *rebuild_index*. It is only used while its head is the head
+                of the chain.
+        """
         self.store = store if store is not None else {}
         self.head = root_hash
+        self.alg = alg
+        self.index = index
+        self.merkle = merkle
+
+        self._head_index = None
+        "The hash and the index of the last head block read or added."
 
     def root(self):
         """Return the head of the chain."""
@@ -128,31 +446,276 @@ class Chain:
 
     def multi_add(self, items, pre_commit_fn=None):
         """Add a batch of elements and seal a new block."""
+        index = self._current_index()
         if self.head is None:
             # Make a new one
-            b0 = Block(items)
+            b0 = Block(items, alg=self.alg, merkle=self.merkle)
             if pre_commit_fn is not None:
                 pre_commit_fn(b0)
+            b0.seal()
             self.store[b0.hid] = b0
             self.head = b0.hid
         else:
-            last_block = self.store[self.head]
-            b1 = last_block.next_block(self.store, items,
+            last_block = self._head()
+            b0 = last_block.next_block(self.store, items,
                     pre_commit_fn=pre_commit_fn)
-            self.head = b1.hid
+            self.head = b0.hid
 
-    def get(self, block_index, item_index, evidence=None):
+        # An index left behind by the chain, or by another one sharing it, is
+        # not written to until it is rebuilt
+        self._head_index = (b0.hid, b0.index)
+        if index is not None:
+            index[b0.index] = b0.hid
+            index.head = b0.hid
+
+    def _head(self):
+        """Return the head block, checking its integrity and that it uses the
+        hash function of the chain."""
+        last_block = self.store[self.head]
+        check_hash(self.head, last_block)
+        if last_block.alg != self.alg:
+            raise Exception("Chain uses %s, but its head uses %s." % (self.alg, last_block.alg))
+        self._head_index = (self.head, last_block.index)
+        return last_block
+
+    def _current_index(self):
+        """Return the index if it was written for the head of the chain, or
+        None."""
+        if self.index is None or getattr(self.index, "head", None) != self.head:
+            return None
+        return self.index
+
+    def get(self, block_index, item_index, evidence=None, verify=True):
         """Return the record at a specific block and item index,
-        and potentially a bundle of evidence. """
+        and potentially a bundle of evidence.
+
+        With *verify* False and an index of the head holding the block, the
+        block is read directly instead of being reached from the head through
+        the fingers, unless evidence is requested. Its hash is still checked
+        against the one in the index, which is trusted. """
         if self.head is None:
             return None
 
+        index = self._current_index()
+        if not verify and evidence is None and index is not None:
+            if self._head_index is None or self._head_index[0] != self.head:
+                self._head()
+
+            head_index = self._head_index[1]
+            if not (0 <= block_index <= head_index):
+                raise Exception("Block is beyond this chain head: must be 0 <= %s <= %s." % (block_index, head_index))
+
+            try:
+                block_hash = index[block_index]
+            except KeyError:
+                block_hash = None
+
+            if block_hash is not None:
+                block = self.store[block_hash]
+                check_hash(block_hash, block)
+                return block.get_item(self.store, block_index, item_index)
+
         ## Get head block and check its integrity
-        last_block = self.store[self.head]
-        check_hash(self.head, last_block)
+        last_block = self._head()
 
         return last_block.get_item(self.store, block_index, item_index, evidence)
 
+    def rebuild_index(self):
+        """Write the hash of every block of the chain to its index, oldest
+        first, with a scan of the chain that does not use the index."""
+        if self.index is None:
+            raise Exception("Chain has no index.")
+
+        self.index.head = None
+        for block in self._scan(0, None, None, 1000):
+            self.index[block.index] = block.hid
+        self.index.head = self.head
+
+    def get_many(self, targets, evidence=None):
+        """Return the records at many (block index, item index) pairs, and
+        potentially a single bundle of evidence for all of them.
+
+        The fingers are walked back from the head once for all targets: each
+        hop reads all the blocks the targets lead to with one batched read,
+        so blocks on the way to several targets are read and checked once.
+
+        Example:
+            >>> c = Chain()
+            >>> for i in range(100):
+            ...     c.multi_add([b"%d|0" % i, b"%d|1" % i])
+            >>> evidence = {}
+            >>> c.get_many([(7, 1), (42, 0), (7, 0)], evidence)
+            [b'7|1', b'42|0', b'7|0']
+            >>> Chain(evidence, c.root()).get(42, 0)
+            b'42|0'
+
+        """
+        if self.head is None:
+            return [None] * len(targets)
+
+        head = self._head()
+        if evidence is not None:
+            head._prove(evidence)
+
+        blocks = {}
+        frontier = {head.hid: (head, sorted(set(b for b, _ in targets)))}
+        while frontier != {}:
+            wanted = {}
+            for block, block_indexes in frontier.values():
+                for block_index in block_indexes:
+                    if not (0 <= block_index <= block.index):
+                        raise Exception("Block is beyond this chain head: must be 0 <= %s <= %s." % (block_index, block.index))
+
+                    if block_index == block.index:
+                        blocks[block_index] = block
+                    else:
+                        wanted.setdefault(block.finger(block_index), []).append(block_index)
+
+            keys = list(wanted)
+            frontier = {}
+            for key, block in zip(keys, get_many(self.store, keys)):
+                check_hash(key, block)
+                if evidence is not None:
+                    block._prove(evidence)
+                frontier[key] = (block, wanted[key])
+
+        result = []
+        for block_index, item_index in targets:
+            block = blocks[block_index]
+            if not (0 <= item_index < block._count()):
+                raise Exception("Item is beyond this Block: must be 0 <= %s <= %s." % (item_index, block._count()))
+            if evidence is not None:
+                block._prove(evidence, item_index)
+            result.append(block._item(item_index))
+        return result
+
+    def scan(self, from_block=0, to_block=None, batch_size=100):
+        """Iterate over the blocks with an index in [*from_block*, *to_block*),
+        oldest first, up to the head if *to_block* is None.
+
+        Blocks are read in batches of *batch_size*, going back from the last
+        block of each batch, which is reached through the fingers from the
+        head, so that every block is checked against the head. The blocks a
+        batch reaches through the fingers are read together, in batched
+        reads. Only the blocks of one batch and the path to them are kept in
+        memory. With an index, the blocks of each batch are read with a
+        single batched read.
+
+        Example:
+            >>> c = Chain()
+            >>> for i in range(10):
+            ...     c.multi_add([b"Block %d" % i])
+            >>> [b.items[0] for b in c.scan(7)]
+            [b'Block 7', b'Block 8', b'Block 9']
+
+        """
+        return self._scan(from_block, to_block, self._current_index(), batch_size)
+
+    def scan_items(self, from_block=0, to_block=None, batch_size=100):
+        """Iterate over the (block index, item index, item) of all the items
+        in the blocks with an index in [*from_block*, *to_block*), in order.
+        Of the headers of blocks in evidence, only the items they prove are
+        listed, once checked."""
+        for block in self.scan(from_block, to_block, batch_size):
+            for item_index, item in block._indexed_items():
+                yield (block.index, item_index, item)
+
+    def _scan(self, from_block, to_block, index, batch_size):
+        if self.head is None:
+            return
+
+        head = self._head()
+        end = head.index + 1 if to_block is None else min(to_block, head.index + 1)
+
+        # The blocks on the way from the head to the last block reached, by
+        # decreasing index, as (index, hash, fingers).
+        path = [(head.index, head.hid, head.fingers)]
+
+        for start in range(max(from_block, 0), end, batch_size):
+            stop = min(start + batch_size, end)
+            last = self._locate(path, stop - 1)
+
+            blocks = None
+            if index is not None:
+                blocks = self._read_indexed(index, start, last)
+
+            if blocks is None:
+                blocks = self._read_back(path, start, last)
+
+            for block in blocks:
+                yield block
+
+    def _locate(self, path, block_index):
+        """Return the block at *block_index*, reached through the fingers from
+        the nearest block after it on the *path*, which is extended with the
+        blocks read on the way."""
+        while path[-1][0] < block_index:
+            path.pop()
+
+        block = None
+        while path[-1][0] > block_index:
+            block_hash = [h for (f, h) in path[-1][2] if f >= block_index][-1]
+            block = self.store[block_hash]
+            check_hash(block_hash, block)
+            path.append((block.index, block_hash, block.fingers))
+
+        if block is None:
+            block_hash = path[-1][1]
+            block = self.store[block_hash]
+            check_hash(block_hash, block)
+        return block
+
+    def _read_back(self, path, start, last):
+        """Return the blocks from *start* up to the block *last*, reached back
+        from it through the fingers. Each round reads, with one batched read,
+        all the blocks of the batch named by the fingers of the blocks read so
+        far and of those on the *path*, so that a batch of n blocks takes
+        about log n rounds rather than n reads."""
+        blocks = {last.index: last}
+        named = {}
+
+        def learn(fingers):
+            for f, block_hash in fingers:
+                if start <= f < last.index and f not in blocks:
+                    named[f] = block_hash
+
+        for _, _, fingers in path:
+            learn(fingers)
+        learn(last.fingers)
+
+        while named:
+            wanted = sorted(named.items())
+            named = {}
+            for (block_index, block_hash), block in zip(wanted, get_many(self.store, [k for _, k in wanted])):
+                check_hash(block_hash, block)
+                if block.index != block_index:
+                    raise Exception("Block is not at the index its fingers give.")
+                blocks[block_index] = block
+
+            for block_index, _ in wanted:
+                learn(blocks[block_index].fingers)
+
+        return [blocks[i] for i in range(start, last.index + 1)]
+
+    def _read_indexed(self, index, start, last):
+        """Return the blocks from *start* up to the block *last*, read with the
+        hashes in the index, or None if any of them is missing. """
+        try:
+            keys = [index[i] for i in range(start, last.index)]
+        except KeyError:
+            return None
+
+        blocks = get_many(self.store, keys) + [last]
+        for key, block in zip(keys, blocks):
+            check_hash(key, block)
+
+        # Check that the blocks are those the last one leads back to
+        for prev, block in zip(blocks, blocks[1:]):
+            if block.finger(block.index - 1) != prev.hid:
+                raise Exception("Index does not match the chain.")
+
+        return blocks
+
 
 class DocChain(Chain):
     """A chain that stores hashes of documents. Construct like a *Chain*."""
@@ -160,18 +723,17 @@ class DocChain(Chain):
     def multi_add(self, items):
         """Add multiple items to seal a new block."""
 
-        docs = list(map(Document, items))
-        for d in docs:
-            self.store[d.hid] = d
+        docs = [Document(i, self.alg) for i in items]
+        put_many(self.store, ((d.hid, d) for d in docs))
 
         docs_id = list(map(lambda d: d.hid, docs))
         Chain.multi_add(self, docs_id)
 
-    def get(self, block_index, item_index, evidence=None):
+    def get(self, block_index, item_index, evidence=None, verify=True):
         """Get a sealed item, and optionally a bundle of evidence."""
 
         ## Get Doc and check its hash
-        item = Chain.get(self, block_index, item_index, evidence)
+        item = Chain.get(self, block_index, item_index, evidence, verify)
         d = self.store[item]
         check_hash(item, d)
 
@@ -180,6 +742,34 @@ class DocChain(Chain):
 
         return self.store[item].item
 
+    def get_many(self, targets, evidence=None):
+        """Get many sealed items, and optionally a single bundle of evidence,
+        reading all their documents with one batched read."""
+
+        doc_ids = Chain.get_many(self, targets, evidence)
+        if self.head is None:
+            return doc_ids
+
+        keys = list(set(doc_ids))
+        docs = dict(zip(keys, get_many(self.store, keys)))
+        for key, d in docs.items():
+            check_hash(key, d)
+            if evidence != None:
+                evidence[d.hid] = d
+
+        return [docs[i].item for i in doc_ids]
+
+    def scan_items(self, from_block=0, to_block=None, batch_size=100):
+        """Iterate over the (block index, item index, item) of all the items
+        in the blocks with an index in [*from_block*, *to_block*), in order,
+        reading the documents of each block with one batched read."""
+        for block in self.scan(from_block, to_block, batch_size):
+            items = block._indexed_items()
+            docs = get_many(self.store, [key for _, key in items])
+            for (item_index, key), d in zip(items, docs):
+                check_hash(key, d)
+                yield (block.index, item_index, d.item)
+
     def check(self, root, block_index, item_index, item):
         """Check that an item is within the structure at a specific point."""
         ret = True
@@ -0,0 +1,105 @@
+""" The msgpack encoding of nodes shared by the persistent stores.
+
+Each node is packed as a msgpack extension type holding the packed fields
+needed to rebuild it, so that its hash can be recomputed after decoding. Nodes
+not hashed with SHA256 have the name of their hash function as a last field:
+
+    ======== ==================================
+    Code     Node and fields
+    ======== ==================================
+    42       Leaf: item, key
+    43       Branch: pivot, left, right
+    44       Block: index, fingers, items, aux
+    45       Document: item
+    46       SparseBranch: left, right
+    47       Block with a Merkle root over items: index, fingers, items, aux
+    48       BlockHeader: index, fingers, count, item root, aux, proofs
+    ======== ==================================
+"""
+
+from msgpack import packb, unpackb, ExtType
+
+from .Nodes import Leaf, Branch
+from .Chain import Block, BlockHeader, Document
+from .Sparse import SparseBranch
+
+LEAF, BRANCH, BLOCK, DOCUMENT, SPARSE = 42, 43, 44, 45, 46
+MERKLE_BLOCK, BLOCK_HEADER = 47, 48
+
+
+def default(obj):
+    """ Serialize objects using msgpack. """
+    alg = () if obj.alg == "sha256" else (obj.alg,)
+    if isinstance(obj, Leaf):
+        return ExtType(LEAF, packb((obj.item, obj.key) + alg))
+    if isinstance(obj, Branch):
+        return ExtType(BRANCH, packb((obj.pivot, obj.left_branch, obj.right_branch) + alg))
+    if isinstance(obj, BlockHeader):
+        return ExtType(BLOCK_HEADER, obj.encoding())
+    if isinstance(obj, Block):
+        return ExtType(MERKLE_BLOCK if obj.merkle else BLOCK, obj.encoding())
+    if isinstance(obj, Document):
+        return ExtType(DOCUMENT, packb((obj.item,) + alg))
+    if isinstance(obj, SparseBranch):
+        return ExtType(SPARSE, packb((obj.left_branch, obj.right_branch) + alg))
+
+    raise TypeError("Unknown Type: %r" % (obj,))
+
+
+def ext_hook(code, data):
+    """ Deserialize objects using msgpack. """
+    if code == LEAF:
+        return Leaf(*unpackb(data))
+    if code == BRANCH:
+        return Branch(*unpackb(data))
+    if code == BLOCK or code == MERKLE_BLOCK:
+        fields = unpackb(data)
+        index, fingers, items, aux = fields[:4]
+        alg = fields[4] if len(fields) > 4 else "sha256"
+        block = Block(items, index, [tuple(f) for f in fingers], aux, alg,
+                      merkle=(code == MERKLE_BLOCK))
+        block.seal()
+        return block
+    if code == BLOCK_HEADER:
+        fields = unpackb(data)
+        index, fingers, count, item_root, aux, proofs = fields[:6]
+        proofs = dict((i, (item, path)) for i, item, path in proofs)
+        return BlockHeader(index, [tuple(f) for f in fingers], count, item_root, aux,
+                           *fields[6:], proofs=proofs)
+    if code == DOCUMENT:
+        return Document(*unpackb(data))
+    if code == SPARSE:
+        return SparseBranch(*unpackb(data))
+
+    return ExtType(code, data)
+
+
+def kind(node):
+    """ Returns the extension type code of a node. """
+    if isinstance(node, BlockHeader):
+        return BLOCK_HEADER
+    if isinstance(node, Block):
+        return MERKLE_BLOCK if node.merkle else BLOCK
+    for code, cls in ((LEAF, Leaf), (BRANCH, Branch), (DOCUMENT, Document),
+                      (SPARSE, SparseBranch)):
+        if isinstance(node, cls):
+            return code
+
+    raise TypeError("Unknown Type: %r" % (node,))
+
+
+def encode(node):
+    """ Returns the bytes encoding a node.
+
+    Example:
+        >>> decode(encode(Leaf(b"item", b"key"))).key
+        b'key'
+
+    """
+    # Calling default directly is much faster than passing it to packb
+    return packb(default(node))
+
+
+def decode(data):
+    """ Returns the node encoded in bytes, or any buffer. """
+    return unpackb(data, ext_hook=ext_hook)
@@ -0,0 +1,179 @@
+from itertools import islice
+
+from .Store import get_many, put_many, delete_many, children
+
+
+class GarbageCollector():
+    def __init__(self, store, roots, batch_size=1000):
+        """ Initialize a mark-and-sweep collector, that deletes from a *store*
+        all the nodes that cannot be reached from a set of *roots* to retain.
+        It follows the sub-trees of Branches, and the fingers and documents
+        of Blocks.
+
+        The collection runs in increments of *batch_size* nodes, so it can
+        run in the background alongside writers. Only the nodes present when
+        it starts are candidates for deletion, so nodes written during the
+        collection are kept. Since nodes are addressed by their hash, a writer
+        may write again a node that is a candidate, for instance by adding
+        back a removed item: writers running alongside a collection must write
+        through the view of the store returned by *writer*, which shades the
+        nodes written through it.
+
+        Example:
+            >>> from hippiehug import Tree
+            >>> t = Tree()
+            >>> for i in range(10):
+            ...     t.add(b"%d" % i)
+            >>> gc = GarbageCollector(t.store, [ t.root() ])
+            >>> gc.collect() > 0
+            True
+            >>> len(t.store)
+            19
+            >>> b"5" in t
+            True
+
+        """
+        self.store = store
+        self.roots = list(roots)
+        self.batch_size = batch_size
+
+        self.candidates = None
+        self.marked = set()
+        self.work_list = []
+
+        self.snapshot = None
+        "The nodes shaded while the candidates are listed, marked once listed."
+
+        self.deleted = 0
+        "The number of nodes deleted so far."
+
+    def writer(self):
+        """ Returns a view of the store that shades every node written through
+        it, for the writers running alongside the collection.
+
+        Example:
+            >>> from hippiehug import Tree
+            >>> t = Tree()
+            >>> t.multi_add([b"A", b"B"])
+            >>> t.remove(b"B")
+            >>> gc = GarbageCollector(t.store, [ t.root() ])
+            >>> t.store = gc.writer()
+            >>> steps = gc.steps()
+            >>> _ = next(steps)
+            >>> t.add(b"B")
+            >>> for _ in steps:
+            ...     pass
+            >>> b"B" in t
+            True
+
+        """
+        return _ShadingStore(self.store, self)
+
+    def shade(self, *keys):
+        """ Marks nodes as live, along with all nodes they refer to. """
+        if self.snapshot is not None:
+            self.snapshot.extend(keys)
+            return
+
+        for key in keys:
+            self._mark(key)
+
+    def _mark(self, key):
+        if self.candidates is not None and key in self.candidates and \
+                key not in self.marked:
+            self.marked.add(key)
+            self.work_list.append(key)
+
+    def _trace(self):
+        """ Follows the references of up to *batch_size* marked nodes. """
+        batch = self.work_list[-self.batch_size:]
+        del self.work_list[-self.batch_size:]
+
+        for node in get_many(self.store, batch):
+            for key in children(node):
+                self._mark(key)
+
+    def steps(self):
+        """ Runs the collection, yielding after each batch of work. """
+
+        # Snapshot the nodes that are candidates for deletion, a batch at a
+        # time. The keys of a dictionary are copied first, since it cannot be
+        # iterated over while it is written to.
+        self.candidates = set()
+        self.snapshot = []
+        keys = iter(list(self.store)) if isinstance(self.store, dict) else iter(self.store)
+        while True:
+            batch = list(islice(keys, self.batch_size))
+            self.candidates.update(batch)
+            yield
+
+            if len(batch) < self.batch_size:
+                break
+
+        shaded, self.snapshot = self.snapshot, None
+        self.shade(*shaded)
+
+        # Mark the nodes reachable from the roots
+        for root in self.roots:
+            self._mark(root)
+
+        while self.work_list != []:
+            self._trace()
+            yield
+
+        # Sweep the unmarked nodes, tracing any nodes shaded meanwhile first
+        garbage = list(self.candidates - self.marked)
+        while garbage != []:
+            while self.work_list != []:
+                self._trace()
+
+            batch = [k for k in garbage[-self.batch_size:] if k not in self.marked]
+            del garbage[-self.batch_size:]
+
+            delete_many(self.store, batch)
+            self.deleted += len(batch)
+            yield
+
+        self.candidates = None
+
+    def collect(self):
+        """ Runs the whole collection, and returns the number of nodes deleted. """
+        for _ in self.steps():
+            pass
+        return self.deleted
+
+
+class _ShadingStore():
+    """ A view of a store that shades the nodes written through it in a
+    collector. """
+
+    def __init__(self, store, collector):
+        self.store = store
+        self.collector = collector
+
+    def __getitem__(self, key):
+        return self.store[key]
+
+    def __setitem__(self, key, value):
+        self.collector.shade(key)
+        self.store[key] = value
+
+    def __contains__(self, key):
+        return key in self.store
+
+    def __delitem__(self, key):
+        del self.store[key]
+
+    def __iter__(self):
+        return iter(self.store)
+
+    def __len__(self):
+        return len(self.store)
+
+    def get_many(self, keys):
+        return get_many(self.store, keys)
+
+    def put_many(self, items):
+        items = list(items)
+        self.collector.shade(*[k for k, _ in items])
+        put_many(self.store, items)
@@ -0,0 +1,111 @@
+""" Structural differences between two trees sharing a store.
+
+The leaves of both trees are merged in key order, walking each tree with a stack
+of sub-trees still to visit. Sub-trees are content-addressed, so whenever both
+stacks have the same hash on top, those sub-trees hold identical leaves and are
+skipped together without being read. To keep the two walks aligned, each
+sub-tree carries the upper bound on its keys given by the pivots above it, and
+the one reaching further to the right is expanded first.
+"""
+
+from .Nodes import Leaf, _fetch_checked
+
+
+def _expand(stack, node):
+    """ Replaces a Branch on top of a stack with its two sub-trees. """
+    (_, upper) = stack.pop()
+    stack.append((node.right_branch, upper))
+    stack.append((node.left_branch, node.pivot))
+
+
+def _reaches_further(upper_a, upper_b):
+    """ Checks whether upper bound *a* is higher than *b*, where None is
+    the highest. """
+    if upper_a is None:
+        return upper_b is not None
+    return upper_b is not None and upper_a > upper_b
+
+
+def _drain(store, nodes, stack, batch_size):
+    """ Yields all the leaves left in a stack, reading them in batches. """
+    while stack != []:
+        _fetch_checked(store, nodes, [hid for hid, _ in stack[-batch_size:]])
+
+        hid, _ = stack[-1]
+        node = nodes.pop(hid)
+        if isinstance(node, Leaf):
+            stack.pop()
+            yield node
+        else:
+            _expand(stack, node)
+
+
+def _prefetch(store, nodes, stack_a, stack_b, batch_size):
+    """ Reads the sub-trees on top of both stacks, up to *batch_size* of each,
+    in one batch, leaving out those in both stacks, which are likely to be
+    skipped without being read. """
+    top_a = [hid for hid, _ in stack_a[-batch_size:]]
+    top_b = [hid for hid, _ in stack_b[-batch_size:]]
+    shared = set(top_a) & set(top_b)
+    _fetch_checked(store, nodes, [hid for hid in top_a + top_b if hid not in shared])
+
+
+def diff(store, root_a, root_b, batch_size=100):
+    """ Yields the differences between the trees with roots *root_a* and
+    *root_b*, in key order, as tuples (change, key, item_a, item_b): the change
+    is "added", "removed" or "changed", and items are the hashes of the items
+    stored under the key in each tree, or None. """
+
+    stack_a = [(root_a, None)] if root_a is not None else []
+    stack_b = [(root_b, None)] if root_b is not None else []
+    nodes = {}
+
+    while stack_a != [] and stack_b != []:
+        (hid_a, upper_a), (hid_b, upper_b) = stack_a[-1], stack_b[-1]
+
+        if hid_a == hid_b:
+            stack_a.pop()
+            stack_b.pop()
+            nodes.pop(hid_a, None)
+            continue
+
+        if hid_a not in nodes or hid_b not in nodes:
+            _prefetch(store, nodes, stack_a, stack_b, batch_size)
+            _fetch_checked(store, nodes, [hid_a, hid_b])
+        node_a, node_b = nodes[hid_a], nodes[hid_b]
+
+        if isinstance(node_a, Leaf) and isinstance(node_b, Leaf):
+            if node_a.key == node_b.key:
+                stack_a.pop()
+                stack_b.pop()
+                yield ("changed", node_a.key, node_a.item, node_b.item)
+
+            elif node_a.key < node_b.key:
+                stack_a.pop()
+                yield ("removed", node_a.key, node_a.item, None)
+
+            else:
+                stack_b.pop()
+                yield ("added", node_b.key, None, node_b.item)
+
+        elif isinstance(node_b, Leaf):
+            _expand(stack_a, node_a)
+
+        elif isinstance(node_a, Leaf):
+            _expand(stack_b, node_b)
+
+        elif _reaches_further(upper_a, upper_b):
+            _expand(stack_a, node_a)
+
+        elif _reaches_further(upper_b, upper_a):
+            _expand(stack_b, node_b)
+
+        else:
+            _expand(stack_a, node_a)
+            _expand(stack_b, node_b)
+
+    for leaf in _drain(store, nodes, stack_a, batch_size):
+        yield ("removed", leaf.key, leaf.item, None)
+
+    for leaf in _drain(store, nodes, stack_b, batch_size):
+        yield ("added", leaf.key, None, leaf.item)
@@ -0,0 +1,278 @@
+""" An append-only store of nodes in local files.
+
+Nodes are appended to numbered segment files, as records made of a header and
+the encoding of the node from *Codec*:
+
+    record := hash(32) length(4) crc32(4) node
+
+A record of length 0 is a tombstone, marking the deletion of the node with that
+hash. The segments are scanned on open to rebuild the index from hashes to the
+position of their records, and a record torn by a crash at the end of the last
+segment is truncated. Records are read back through a memory map of their
+segment.
+"""
+
+import os
+import mmap
+from struct import Struct
+from zlib import crc32
+
+from .Codec import encode, decode
+
+HEADER = Struct(">32sII")
+SEGMENT_NAME = "%08d.seg"
+
+
+def _release(view):
+    """ Releases a memoryview of a segment, so that its map may be closed. """
+    # memoryview.release needs Python 3.2 or later
+    if hasattr(view, "release"):
+        view.release()
+
+
+class FileStore():
+    def __init__(self, path, segment_size=64 * 1024 * 1024, sync_every=1000):
+        """ Initialize a store in the directory *path*, opening the segments
+        already there.
+
+        :param path: The directory of the segment files, created if needed.
+        :param segment_size: The size in bytes after which a new segment is
+                started.
+        :param sync_every: The number of records written between calls to
+                fsync, or None to only sync on *sync* and *close*. Records
+                written since the last sync may be lost on a crash, but the
+                store stays consistent.
+
+        Example:
+            >>> from tempfile import mkdtemp
+            >>> from hippiehug import Tree
+            >>> path = mkdtemp()
+            >>> t = Tree(FileStore(path))
+            >>> t.multi_add([b"Hello", b"World"])
+            >>> t.store.close()
+            >>> b"World" in Tree(FileStore(path), t.root())
+            True
+
+        """
+        self.path = path
+        self.segment_size = segment_size
+        self.sync_every = sync_every
+
+        self.index = {}
+        "The segment, offset and length of the record for each hash."
+
+        self.dead = {}
+        "The number of bytes of deleted records in each segment."
+
+        self.maps = {}
+        self.unsynced = 0
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        segments = sorted(int(name[:-4]) for name in os.listdir(path)
+                          if name.endswith(".seg"))
+        for seg in segments:
+            self._scan(seg, last=(seg == segments[-1]))
+
+        self._open_active(segments[-1] if segments != [] else 0)
+
+    def _segment_path(self, seg):
+        return os.path.join(self.path, SEGMENT_NAME % seg)
+
+    def _scan(self, seg, last):
+        """ Adds the records of a segment to the index. """
+        self.dead[seg] = 0
+        size = os.path.getsize(self._segment_path(seg))
+        data = self._map(seg, size) if size > 0 else b""
+
+        pos = 0
+        view = memoryview(data)
+        try:
+            while pos + HEADER.size <= size:
+                key, length, crc = HEADER.unpack_from(view, pos)
+                start = pos + HEADER.size
+                if start + length > size or (crc32(view[start:start + length]) & 0xffffffff) != crc:
+                    break
+
+                self._forget(key)
+                if length > 0:
+                    self.index[key] = (seg, start, length)
+                else:
+                    self.dead[seg] += HEADER.size
+                pos = start + length
+        finally:
+            _release(view)
+
+        if pos < size:
+            if not last:
+                raise Exception("Segment %s is corrupted." % seg)
+
+            # Drop a record torn by a crash while appending
+            self.maps.pop(seg).close()
+            with open(self._segment_path(seg), "r+b") as f:
+                f.truncate(pos)
+
+    def _open_active(self, seg):
+        """ Opens a segment for appending new records. """
+        self.active_seg = seg
+        self.dead.setdefault(seg, 0)
+        self.active = open(self._segment_path(seg), "ab")
+
+    def _forget(self, key):
+        """ Removes a key from the index, counting its record as dead. """
+        old = self.index.pop(key, None)
+        if old is not None:
+            self.dead[old[0]] += HEADER.size + old[2]
+
+    def _append(self, records):
+        """ Appends a list of (key, data) records to the active segment, and
+        returns the offset of each. """
+        offsets = []
+        chunk = []
+        pos = self.active.tell()
+        for key, data in records:
+            chunk.append(HEADER.pack(key, len(data), crc32(data) & 0xffffffff))
+            chunk.append(data)
+            offsets.append(pos + HEADER.size)
+            pos += HEADER.size + len(data)
+
+        self.active.write(b"".join(chunk))
+        self.active.flush()
+
+        self.unsynced += len(records)
+        if self.sync_every is not None and self.unsynced >= self.sync_every:
+            self.sync()
+
+        return offsets
+
+    def _roll(self):
+        """ Starts a new segment if the active one is full. """
+        if self.active.tell() >= self.segment_size:
+            self.sync()
+            self.active.close()
+            self._open_active(self.active_seg + 1)
+
+    def _map(self, seg, end):
+        """ Returns a memory map of a segment, covering at least up to the
+        offset *end*. """
+        m = self.maps.get(seg)
+        if m is None or end > len(m):
+            if m is not None:
+                m.close()
+            with open(self._segment_path(seg), "rb") as f:
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.maps[seg] = m
+        return m
+
+    def _read(self, key):
+        seg, start, length = self.index[key]
+        view = memoryview(self._map(seg, start + length))
+        try:
+            return decode(view[start:start + length])
+        finally:
+            _release(view)
+
+    def __getitem__(self, key):
+        return self._read(key)
+
+    def __setitem__(self, key, value):
+        self.put_many([(key, value)])
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return iter(list(self.index))
+
+    def __delitem__(self, key):
+        self.delete_many([ key ])
+
+    def get_many(self, keys):
+        """ Returns the nodes for a list of keys, and raises a KeyError if any
+        of them is missing. """
+        return [self._read(key) for key in keys]
+
+    def put_many(self, items):
+        """ Appends an iterable of (key, node) pairs not already in the store
+        with a single write. """
+        records = {}
+        for key, value in items:
+            if key not in self.index and key not in records:
+                records[key] = encode(value)
+
+        if records == {}:
+            return
+
+        offsets = self._append(list(records.items()))
+        for (key, data), start in zip(records.items(), offsets):
+            self.index[key] = (self.active_seg, start, len(data))
+
+        self._roll()
+
+    def delete_many(self, keys):
+        """ Appends tombstones for a list of keys with a single write. """
+        keys = [k for k in keys if k in self.index]
+        if keys == []:
+            return
+
+        self._append([(key, b"") for key in keys])
+        for key in keys:
+            self._forget(key)
+            self.dead[self.active_seg] += HEADER.size
+
+        self._roll()
+
+    def sync(self):
+        """ Makes all the records written so far durable. """
+        self.active.flush()
+        os.fsync(self.active.fileno())
+        self.unsynced = 0
+
+    def garbage(self):
+        """ Returns the fraction of the bytes in the segments that belong to
+        deleted records or tombstones. """
+        total = sum(os.path.getsize(self._segment_path(seg)) for seg in self.dead)
+        return sum(self.dead.values()) / float(total) if total > 0 else 0.0
+
+    def compact(self):
+        """ Copies all live records to new segments, and removes the old ones
+        along with the space of deleted records. """
+        old_segments = sorted(self.dead)
+        self.sync()
+        self.active.close()
+        self._open_active(self.active_seg + 1)
+
+        # Copy the records in batches, in the order of the old segments
+        live = sorted(self.index.items(), key=lambda item: item[1])
+        for i in range(0, len(live), 1000):
+            records = []
+            for key, (seg, start, length) in live[i:i + 1000]:
+                records.append((key, self._map(seg, start + length)[start:start + length]))
+
+            offsets = self._append(records)
+            for (key, data), start in zip(records, offsets):
+                self.index[key] = (self.active_seg, start, len(data))
+            self._roll()
+
+        self.sync()
+
+        # Remove the old segments oldest first, so that a crash never leaves
+        # a record without a later tombstone that deleted it.
+        for seg in old_segments:
+            m = self.maps.pop(seg, None)
+            if m is not None:
+                m.close()
+            del self.dead[seg]
+            os.remove(self._segment_path(seg))
+
+    def close(self):
+        """ Syncs the records written and closes all files. """
+        self.sync()
+        self.active.close()
+        for m in self.maps.values():
+            m.close()
+        self.maps = {}
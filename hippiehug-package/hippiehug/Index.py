@@ -0,0 +1,120 @@
+""" An index of the hashes of the blocks of a chain, by block index.
+
+The index holds a record of 32 bytes per block, in memory or in a file. The
+first record is the hash of the head of the chain the index was written for,
+and the record of each block follows at the offset given by its index plus
+one. A record of zeros is a block, or a head, not in the index.
+"""
+
+import os
+
+HASH_LEN = 32
+EMPTY = b"\x00" * HASH_LEN
+
+
+class BlockIndex:
+    def __init__(self, path=None):
+        """ Initialize an index kept in memory, or in the file at *path*,
+        opening the records already there.
+
+        A chain only reads blocks through the index while its *head* is the
+        head of the chain, so that an index left behind by the chain, or
+        written by another chain sharing it, is not trusted.
+
+        Example:
+            >>> from hippiehug import Chain
+            >>> c = Chain(index=BlockIndex())
+            >>> for i in range(100):
+            ...     c.multi_add([b"Block %d" % i])
+            >>> c.index.head == c.head
+            True
+            >>> c.store[c.index[42]].index
+            42
+            >>> c.get(42, 0, verify=False)
+            b'Block 42'
+
+        """
+        self.path = path
+        self.data = None
+        self.file = None
+
+        if path is None:
+            self.data = bytearray()
+        else:
+            self.file = open(path, "r+b" if os.path.exists(path) else "w+b")
+
+    def _read(self, position):
+        start = position * HASH_LEN
+        if self.file is None:
+            record = bytes(self.data[start:start + HASH_LEN])
+        else:
+            self.file.seek(start)
+            record = self.file.read(HASH_LEN)
+
+        if len(record) < HASH_LEN or record == EMPTY:
+            return None
+        return record
+
+    def _write(self, position, record):
+        if len(record) != HASH_LEN:
+            raise Exception("Block hashes must be %s bytes." % HASH_LEN)
+
+        start = position * HASH_LEN
+        if self.file is None:
+            if len(self.data) < start:
+                self.data.extend(b"\x00" * (start - len(self.data)))
+            self.data[start:start + HASH_LEN] = record
+        else:
+            self.file.seek(start)
+            self.file.write(record)
+
+    @property
+    def head(self):
+        """ The hash of the head of the chain the index was written for, or
+        None. """
+        return self._read(0)
+
+    @head.setter
+    def head(self, head_hash):
+        self._write(0, head_hash if head_hash is not None else EMPTY)
+
+    def __getitem__(self, block_index):
+        record = self._read(block_index + 1) if block_index >= 0 else None
+        if record is None:
+            raise KeyError(block_index)
+        return record
+
+    def __setitem__(self, block_index, block_hash):
+        if block_index < 0:
+            raise KeyError(block_index)
+        self._write(block_index + 1, block_hash)
+
+    def __contains__(self, block_index):
+        try:
+            self[block_index]
+            return True
+        except KeyError:
+            return False
+
+    def __len__(self):
+        """ Returns the number of block records, including any left empty. """
+        if self.file is None:
+            size = len(self.data)
+        else:
+            self.file.seek(0, os.SEEK_END)
+            size = self.file.tell()
+        return max(0, size // HASH_LEN - 1)
+
+    def sync(self):
+        """ Makes all the records written so far durable. """
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        """ Syncs the records written and closes the file. """
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+            self.data = None
@@ -0,0 +1,198 @@
+""" Opt-in counters of the work done by the Tree and Chain operations.
+
+An *Instrument* counts, while it is active:
+
+    ``hashes``
+        The hashes computed, by ``h``, ``binary_hash`` or any node.
+
+    ``gets``, ``sets`` and ``requests``
+        The nodes read from and written to the stores it wraps, and the calls
+        made to them, where a batched read or write is a single call.
+
+    ``cache_hits`` and ``cache_misses``
+        The lookups in the *NodeCache* of the stores it wraps, if they have one.
+
+    ``visited`` and ``depth``
+        The distinct nodes read, and the largest depth of a node read below the
+        first nodes read, such as the root of a tree or the head of a chain.
+
+The algorithms read every node they visit from their store, so the counters of
+nodes are kept by a view of the store returned by *wrap*, and the hashes by
+the functions of *Utils.HASHES*. An instrument is only active in the context
+that started it, a thread or an asyncio task, so that it does not count the
+work of others, and several instruments may be active at once. While none is active in any
+context, hashing does not look the instruments up at all.
+"""
+
+from .Store import children
+from .Utils import _instruments, _start_instrument, _stop_instrument
+
+
+class Instrument():
+    def __init__(self):
+        """ Initialize an inactive instrument, with all counters at zero.
+
+        Example:
+            >>> from hippiehug import Tree
+            >>> inst = Instrument()
+            >>> t = Tree.bulk_build([b"%d" % i for i in range(100)], store=inst.wrap({}))
+            >>> with inst:
+            ...     t.is_in(b"42")
+            True
+            >>> counts = inst.snapshot()
+            >>> counts["gets"] == counts["depth"] + 1
+            True
+
+        """
+        self.caches = []
+        self.reset()
+
+    def wrap(self, store):
+        """ Returns a view of a *store* that counts the nodes read and written
+        through it while the instrument is active. """
+        cache = getattr(store, "cache", None)
+        if cache is not None and hasattr(cache, "hits"):
+            self.caches.append(cache)
+        return _CountingStore(store, self)
+
+    @property
+    def active(self):
+        """ Whether the instrument counts in the current context. """
+        return self in _instruments.get()
+
+    def start(self):
+        """ Starts counting in the current context. """
+        if self.active:
+            return
+
+        _start_instrument(self)
+        self._cache_base = self._cache_counts()
+
+    def stop(self):
+        """ Stops counting in the current context. """
+        if not self.active:
+            return
+
+        _stop_instrument(self)
+        self._add_cache_counts()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _cache_counts(self):
+        return (sum(c.hits for c in self.caches), sum(c.misses for c in self.caches))
+
+    def _add_cache_counts(self):
+        hits, misses = self._cache_counts()
+        self.cache_hits += hits - self._cache_base[0]
+        self.cache_misses += misses - self._cache_base[1]
+        self._cache_base = (hits, misses)
+
+    def _read(self, key, node):
+        """ Counts a node read, giving its children a depth one larger. """
+        self.gets += 1
+        if key in self.seen:
+            return
+
+        self.seen.add(key)
+        d = self.depths.pop(key, 0)
+        if d > self.depth:
+            self.depth = d
+        for child in children(node):
+            if child not in self.seen:
+                self.depths.setdefault(child, d + 1)
+
+    def reset(self):
+        """ Sets all counters back to zero. """
+        self.hashes = 0
+        self.gets = 0
+        self.sets = 0
+        self.requests = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.depth = 0
+
+        self.seen = set()
+        "The keys of the nodes read since the last reset."
+
+        self.depths = {}
+        "The depth of the nodes that the nodes read refer to."
+
+        self._cache_base = self._cache_counts()
+
+    def snapshot(self):
+        """ Returns the current value of all counters. """
+        if self.active:
+            self._add_cache_counts()
+        return {"hashes": self.hashes, "gets": self.gets, "sets": self.sets,
+                "requests": self.requests, "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses, "visited": len(self.seen),
+                "depth": self.depth}
+
+
+class _CountingStore():
+    """ A view of a store that counts the nodes read and written through it,
+    while its instrument is active. """
+
+    def __init__(self, store, instrument):
+        self.store = store
+        self.instrument = instrument
+
+    def __getitem__(self, key):
+        node = self.store[key]
+        inst = self.instrument
+        if inst.active:
+            inst.requests += 1
+            inst._read(key, node)
+        return node
+
+    def __setitem__(self, key, value):
+        inst = self.instrument
+        if inst.active:
+            inst.requests += 1
+            inst.sets += 1
+        self.store[key] = value
+
+    def __contains__(self, key):
+        if self.instrument.active:
+            self.instrument.requests += 1
+        return key in self.store
+
+    def __delitem__(self, key):
+        if self.instrument.active:
+            self.instrument.requests += 1
+        del self.store[key]
+
+    def __iter__(self):
+        return iter(self.store)
+
+    def __len__(self):
+        return len(self.store)
+
+    def get_many(self, keys):
+        if not hasattr(self.store, "get_many"):
+            return [self[k] for k in keys]
+
+        nodes = self.store.get_many(keys)
+        inst = self.instrument
+        if inst.active:
+            inst.requests += 1
+            for key, node in zip(keys, nodes):
+                inst._read(key, node)
+        return nodes
+
+    def put_many(self, items):
+        if not hasattr(self.store, "put_many"):
+            for k, v in items:
+                self[k] = v
+            return
+
+        items = list(items)
+        if self.instrument.active:
+            self.instrument.requests += 1
+            self.instrument.sets += len(items)
+        self.store.put_many(items)
@@ -1,15 +1,26 @@
 
 
-from hashlib import sha256 as xhash
-def h(item):
-    ''' Returns the hash of an item. '''
-    return xhash(item).digest()
+from .Store import get_many, put_many
+from .Utils import HASHES, binary_hash
+
+# The nodes call the function of HASHES named by their alg directly, to save
+# the dispatch of binary_hash for every node hashed; an unknown name raises a
+# KeyError
+
+def h(item, alg="sha256"):
+    ''' Returns the hash of an item, with the hash function named *alg*. '''
+    return binary_hash(item, alg)
+
+def _priority(pivot, alg="sha256"):
+    ''' Returns the treap priority of a branch pivot, derived from its hash so
+    that a balanced tree has a unique shape for a given set of keys. '''
+    return HASHES[alg](b"P|" + pivot)
 
 class Leaf:
 
-    __slots__ = ["key", "item", "hid"]
+    __slots__ = ["key", "item", "hid", "alg"]
 
-    def __init__(self, item, key):
+    def __init__(self, item, key, alg="sha256"):
         assert isinstance(item, bytes)
         self.item = item
         """ The item stored in the Leaf. """
@@ -24,18 +35,21 @@ class Leaf:
         #else:
         #    self.key = item
 
-        self.hid = h(b"L|" + self.key +b"|" + self.item)
+        self.alg = alg
+        """ The name of the hash function of the Leaf. """
+
+        self.hid = HASHES[alg](b"L|" + self.key +b"|" + self.item)
 
     def identity(self):
         """ Returns the hash ID of the Leaf. """
         return self.hid
 
-    def add(self, store, item, key):
+    def add(self, store, item, key, balanced=False):
 
         assert key is not None
 
         # Make a new leaf & store in DB
-        l = Leaf(item, key)
+        l = Leaf(item, key, self.alg)
         leaf_id = l.hid # l.identity()
         store[leaf_id] = l
 
@@ -45,39 +59,52 @@ class Leaf:
 
         # Add the new branch
         if self.key <= l.key:
-            b = Branch(self.key, self.hid, leaf_id)
+            b = Branch(self.key, self.hid, leaf_id, self.alg)
         else:
-            b = Branch(l.key, leaf_id, self.hid)
+            b = Branch(l.key, leaf_id, self.hid, self.alg)
 
         store[b.hid] = b
         return b
 
-    def multi_add(self, store, items, keys):
+    def multi_add(self, store, items, keys, balanced=False):
         assert keys is not None
 
         if items == []:
             return self
 
-        # Add the first element to the store
-        i = items[0]
-        k = keys[0]
-        b = self.add(store, i, key=k)
+        # Build a new sub-tree over the sorted leaves, keeping the first
+        # leaf for each key.
+        unique = {self.key: self}
+        for i, k in zip(items, keys):
+            if k not in unique:
+                unique[k] = Leaf(i, k, self.alg)
+
+        if len(unique) == 1:
+            return self
 
-        # Skip if there is nothing left
-        rest = items[1:]
-        if rest == []:
-            return b
+        leaves = [unique[k] for k in sorted(unique)]
+        return bulk_build(store, leaves, balanced)
 
-        # Add the rest
-        return b.multi_add(store, rest, keys=keys[1:])
 
+    def remove(self, store, key, balanced=False):
+        # An empty tree is represented by None
+        if key == self.key:
+            return None
+        return self
 
     def is_in(self, store, item, key):
         assert key is not None
 
-        l = Leaf(item, key)
+        l = Leaf(item, key, self.alg)
         return l.hid == self.hid
 
+    def multi_is_in_fast(self, store, evidence, items, keys, solution={}):
+        if evidence is not None and items != []:
+            evidence.append( self )
+
+        for i, k in zip(items, keys):
+            solution[(i, k)] = self.is_in(store, i, k)
+
     def lookup(self, store, key):
         if key == self.key:
             return (self.key, self.item)
@@ -91,11 +118,41 @@ def _check_hash(key, val):
     if key != val.hid: # val.identity():
         raise Exception("Value has the wrong hash.")
 
+def _fetch_checked(store, nodes, keys):
+    """ Reads the nodes for the keys not already in *nodes* with one batched
+    read, checks their hashes and adds them to *nodes*. """
+    missing = []
+    for k in keys:
+        if k not in nodes and k not in missing:
+            missing.append(k)
+
+    if missing != []:
+        for k, node in zip(missing, get_many(store, missing)):
+            _check_hash(k, node)
+            nodes[k] = node
+
+def _partition(pivot, items, keys):
+    """ Splits items and keys into those left and right of a pivot. """
+    left_list = []
+    left_keys = []
+    right_list = []
+    right_keys = []
+
+    for i, k in zip(items, keys):
+        if k <= pivot:
+            left_list.append(i)
+            left_keys.append(k)
+        else:
+            right_list.append(i)
+            right_keys.append(k)
+
+    return left_list, left_keys, right_list, right_keys
+
 class Branch:
 
-    __slots__ = ["pivot", "left_branch", "right_branch", "hid", "key"]
+    __slots__ = ["pivot", "left_branch", "right_branch", "hid", "key", "alg"]
 
-    def __init__(self, pivot, left_branch_id, right_branch_id):
+    def __init__(self, pivot, left_branch_id, right_branch_id, alg="sha256"):
         self.pivot = pivot
         "The pivot element which determines the left and right leafs."
 
@@ -105,70 +162,159 @@ class Branch:
         self.right_branch = right_branch_id
         "The hash ID of the right leaf."
 
-        self.hid = h(b"B" + self.pivot + self.left_branch + self.right_branch)
+        self.alg = alg
+        "The name of the hash function of the Branch."
+
+        self.hid = HASHES[alg](b"B" + self.pivot + self.left_branch + self.right_branch)
         self.key = self.hid
 
     def identity(self):
         """ Returns the hash ID of the Branch. """
         return self.hid
 
-    def add(self, store, item, key):
+    def add(self, store, item, key, balanced=False):
         assert key is not None
 
         if key <= self.pivot:
             b_left = store[self.left_branch]
             _check_hash(self.left_branch, b_left)
 
-            new_b_left = b_left.add(store, item, key)
-            b = Branch(self.pivot, new_b_left.hid, self.right_branch)
+            new_b_left = b_left.add(store, item, key, balanced)
+
+            if balanced and _bubbled_up(b_left, new_b_left, self.pivot):
+                # Rotate right to restore the heap order on priorities
+                x = Branch(self.pivot, new_b_left.right_branch, self.right_branch, self.alg)
+                store[x.hid] = x
+                b = Branch(new_b_left.pivot, new_b_left.left_branch, x.hid, self.alg)
+            else:
+                b = Branch(self.pivot, new_b_left.hid, self.right_branch, self.alg)
 
         else:
             b_right = store[self.right_branch]
             _check_hash(self.right_branch, b_right)
 
-            new_b_right = b_right.add(store, item, key)
-            b = Branch(self.pivot, self.left_branch, new_b_right.hid)
+            new_b_right = b_right.add(store, item, key, balanced)
+
+            if balanced and _bubbled_up(b_right, new_b_right, self.pivot):
+                # Rotate left to restore the heap order on priorities
+                x = Branch(self.pivot, self.left_branch, new_b_right.left_branch, self.alg)
+                store[x.hid] = x
+                b = Branch(new_b_right.pivot, x.hid, new_b_right.right_branch, self.alg)
+            else:
+                b = Branch(self.pivot, self.left_branch, new_b_right.hid, self.alg)
 
         # store[b.identity()] = b
         store[b.hid] = b
         return b
 
-    def multi_add(self, store, items, keys):
+    def multi_add(self, store, items, keys, balanced=False):
         if items == []:
             return self
 
         assert keys is not None
 
-        left_list = []
-        right_list = []
-        left_keys = []
-        right_keys = []
+        # Walk down level by level, fetching all the children needed by a level
+        # with a single batched read. Each entry is a node, the items and keys
+        # to add to it, and the entries for its left and right children.
+        top = [self, items, keys, None, None]
+        order = [ top ]
+        work_list = [ top ]
+
+        while work_list != []:
+            fetch = []
+            for entry in work_list:
+                (work_node, work_items, work_keys) = entry[:3]
+                if isinstance(work_node, Leaf) or work_items == []:
+                    continue
+
+                left_list, left_keys, right_list, right_keys = _partition(
+                    work_node.pivot, work_items, work_keys)
+
+                # Balanced trees need both children to join them back together
+                if left_list != [] or balanced:
+                    fetch.append((entry, 3, work_node.left_branch, left_list, left_keys))
+                if right_list != [] or balanced:
+                    fetch.append((entry, 4, work_node.right_branch, right_list, right_keys))
+
+            children = get_many(store, [f[2] for f in fetch])
+
+            work_list = []
+            for (entry, side, child_id, child_items, child_keys), child in zip(fetch, children):
+                _check_hash(child_id, child)
+                child_entry = [child, child_items, child_keys, None, None]
+                entry[side] = child_entry
+                order.append(child_entry)
+                work_list.append(child_entry)
+
+        # Build the new nodes bottom-up: every child entry comes after its
+        # parent, and is replaced by its new node before the parent is built.
+        for entry in reversed(order):
+            (work_node, work_items, work_keys, left, right) = entry
+            if work_items == []:
+                continue
+
+            if isinstance(work_node, Leaf):
+                entry[0] = work_node.multi_add(store, work_items, work_keys, balanced)
+
+            elif balanced:
+                entry[0] = _join(store, left[0], right[0], work_node.pivot)
 
-        for i, k in zip(items, keys):
-            if k <= self.pivot:
-                left_list += [ i ]
-                left_keys += [ k ]
             else:
-                right_list += [ i ]
-                right_keys += [ k ]
+                left_id = left[0].hid if left is not None else work_node.left_branch
+                right_id = right[0].hid if right is not None else work_node.right_branch
+
+                b = Branch(work_node.pivot, left_id, right_id, self.alg)
+                store[b.hid] = b
+                entry[0] = b
 
-        b_left = store[self.left_branch]
-        if left_list != []:
+        return top[0]
+
+    def remove(self, store, key, balanced=False):
+        assert key is not None
+
+        if key < self.pivot:
+            b_left = store[self.left_branch]
             _check_hash(self.left_branch, b_left)
-            new_b_left = b_left.multi_add(store, left_list, left_keys)
-        else:
-            new_b_left = b_left
 
-        b_right = store[self.right_branch]
-        if right_list != []:
+            new_b_left = b_left.remove(store, key, balanced)
+            if new_b_left is b_left:
+                return self
+
+            # The left sub-tree keeps its largest key, the pivot
+            b = Branch(self.pivot, new_b_left.hid, self.right_branch, self.alg)
+
+        elif key > self.pivot:
+            b_right = store[self.right_branch]
             _check_hash(self.right_branch, b_right)
-            new_b_right = b_right.multi_add(store, right_list, right_keys)
+
+            new_b_right = b_right.remove(store, key, balanced)
+            if new_b_right is b_right:
+                return self
+
+            # Collapse the branch if its right leaf was removed
+            if new_b_right is None:
+                b_left = store[self.left_branch]
+                _check_hash(self.left_branch, b_left)
+                return b_left
+
+            b = Branch(self.pivot, self.left_branch, new_b_right.hid, self.alg)
+
         else:
-            new_b_right = b_right
+            # The key is the largest of the left sub-tree: remove it from there,
+            # and join both sub-trees around the next largest key.
+            b_left, b_right = get_many(store, [self.left_branch, self.right_branch])
+            _check_hash(self.left_branch, b_left)
+            _check_hash(self.right_branch, b_right)
+
+            new_b_left, new_pivot = _remove_max(store, b_left)
+            if new_b_left is None:
+                return b_right
+
+            if balanced:
+                return _join(store, new_b_left, b_right, new_pivot)
+
+            b = Branch(new_pivot, new_b_left.hid, b_right.hid, self.alg)
 
-        # b = Branch(self.pivot, new_b_left.identity(), new_b_right.identity())
-        b = Branch(self.pivot, new_b_left.hid, new_b_right.hid)
-        # store[b.identity()] = b
         store[b.hid] = b
         return b
 
@@ -197,46 +343,36 @@ class Branch:
         assert len(items) == len(keys)
         work_list = [(self, items, keys)]
 
+        # Walk down level by level, fetching all the children needed by a level
+        # with a single batched read.
         while work_list != []:
 
-            (work_node, work_items, work_keys) = work_list.pop()
+            fetch = []
+            for (work_node, work_items, work_keys) in work_list:
 
-            if evidence is not None:
-                evidence.append( work_node )
+                if evidence is not None:
+                    evidence.append( work_node )
 
-            if isinstance(work_node, Leaf):
-                for i, k in zip(work_items, work_keys):
-                    l = Leaf(i, k)
-                    solution[(i, k)] = (l.hid == work_node.hid)
-            else:
-                left_list = []
-                left_keys = []
-                right_list = []
-                right_keys = []
-
-                assert len(work_items) == len(work_keys)
-                for i, k in zip(work_items, work_keys):
-                    if k <= work_node.pivot:
-                        left_list += [ i ]
-                        left_keys += [ k ]
-                        assert len(left_list) == len(left_keys)
-                    else:
-                        right_list += [ i ]
-                        right_keys += [ k ]
-                        assert len(right_list) == len(right_keys)
-
-                assert len(work_items) > 0
-                assert len(left_list) + len(right_list) == len(work_items)
-
-                b_left = store[work_node.left_branch]
-                if left_list != []:
-                    _check_hash(work_node.left_branch, b_left)
-                    work_list.append( (b_left, left_list, left_keys) )
-
-                b_right = store[work_node.right_branch]
-                if right_list != []:
-                    _check_hash(work_node.right_branch, b_right)
-                    work_list.append( (b_right, right_list, right_keys) )
+                if isinstance(work_node, Leaf):
+                    for i, k in zip(work_items, work_keys):
+                        l = Leaf(i, k, work_node.alg)
+                        solution[(i, k)] = (l.hid == work_node.hid)
+                else:
+                    left_list, left_keys, right_list, right_keys = _partition(
+                        work_node.pivot, work_items, work_keys)
+
+                    if left_list != []:
+                        fetch.append((work_node.left_branch, left_list, left_keys))
+
+                    if right_list != []:
+                        fetch.append((work_node.right_branch, right_list, right_keys))
+
+            children = get_many(store, [f[0] for f in fetch])
+
+            work_list = []
+            for (child_id, child_items, child_keys), child in zip(fetch, children):
+                _check_hash(child_id, child)
+                work_list.append( (child, child_items, child_keys) )
 
 
     def evidence(self, store, evidence, key):
@@ -265,3 +401,182 @@ class Branch:
 
 
 
+
+
+def _bubbled_up(old_child, new_child, pivot):
+    """ Checks whether an insertion below a branch with this *pivot* brought up
+    a new branch that outranks it, and so needs a rotation. """
+    if not isinstance(new_child, Branch):
+        return False
+
+    if isinstance(old_child, Branch) and old_child.pivot == new_child.pivot:
+        return False
+
+    return _priority(new_child.pivot, new_child.alg) > _priority(pivot, new_child.alg)
+
+
+def _remove_max(store, node):
+    """ Removes the leaf with the largest key from a sub-tree, and returns the
+    new sub-tree, or None if it is empty, and its largest key. The branch above
+    that leaf collapses into its left sub-tree, which keeps a balanced tree
+    balanced. """
+    if isinstance(node, Leaf):
+        return None, None
+
+    b_right = store[node.right_branch]
+    _check_hash(node.right_branch, b_right)
+
+    if isinstance(b_right, Leaf):
+        b_left = store[node.left_branch]
+        _check_hash(node.left_branch, b_left)
+        return b_left, node.pivot
+
+    new_b_right, new_max = _remove_max(store, b_right)
+    b = Branch(node.pivot, node.left_branch, new_b_right.hid, node.alg)
+    store[b.hid] = b
+    return b, new_max
+
+
+def _join(store, left, right, pivot):
+    """ Joins two balanced sub-trees, where all keys of *left* are smaller or
+    equal to *pivot* and all keys of *right* are larger, into a single balanced
+    tree. Only the nodes along the spines that need rotating are read. """
+
+    alg = left.alg
+    p = _priority(pivot, alg)
+    p_left = _priority(left.pivot, alg) if isinstance(left, Branch) else None
+    p_right = _priority(right.pivot, alg) if isinstance(right, Branch) else None
+
+    if p_left is not None and p_left > p and (p_right is None or p_left > p_right):
+        sub_right = store[left.right_branch]
+        _check_hash(left.right_branch, sub_right)
+
+        new_right = _join(store, sub_right, right, pivot)
+        b = Branch(left.pivot, left.left_branch, new_right.hid, alg)
+
+    elif p_right is not None and p_right > p:
+        sub_left = store[right.left_branch]
+        _check_hash(right.left_branch, sub_left)
+
+        new_left = _join(store, left, sub_left, pivot)
+        b = Branch(right.pivot, new_left.hid, right.right_branch, alg)
+
+    else:
+        b = Branch(pivot, left.hid, right.hid, alg)
+
+    store[b.hid] = b
+    return b
+
+
+def _build_balanced(store, leaves):
+    """ Builds the balanced tree over a list of leaves sorted by key without
+    duplicates, and writes all its nodes to the store. """
+
+    put_many(store, ((l.hid, l) for l in leaves))
+
+    if len(leaves) == 1:
+        return leaves[0]
+
+    # Build the Cartesian tree over the gaps between consecutive leaves: gap i
+    # separates leaves i and i+1, and has the key of leaf i as its pivot.
+    n = len(leaves) - 1
+    alg = leaves[0].alg
+    prio = [_priority(l.key, alg) for l in leaves[:-1]]
+    left = [None] * n
+    right = [None] * n
+    stack = []
+    for i in range(n):
+        last = None
+        while stack != [] and prio[stack[-1]] < prio[i]:
+            last = stack.pop()
+        if stack != []:
+            right[stack[-1]] = i
+        left[i] = last
+        stack.append(i)
+
+    # Children always have lower priority than their parents, so building the
+    # branches in order of increasing priority builds all children first.
+    branches = [None] * n
+    for i in sorted(range(n), key=prio.__getitem__):
+        left_id = leaves[i].hid if left[i] is None else branches[left[i]].hid
+        right_id = leaves[i+1].hid if right[i] is None else branches[right[i]].hid
+        branches[i] = Branch(leaves[i].key, left_id, right_id, alg)
+
+    put_many(store, ((b.hid, b) for b in branches))
+    return branches[stack[0]]
+
+
+def _build_plain(store, leaves):
+    """ Builds a tree bottom-up, level by level, over a list of leaves sorted by
+    key without duplicates, and writes all its nodes to the store. """
+
+    put_many(store, ((l.hid, l) for l in leaves))
+    level = [(l, l.key) for l in leaves]
+
+    while len(level) > 1:
+        next_level = []
+        for i in range(0, len(level) - 1, 2):
+            (left, left_max), (right, right_max) = level[i], level[i+1]
+            b = Branch(left_max, left.hid, right.hid, left.alg)
+            next_level.append((b, right_max))
+
+        put_many(store, ((b.hid, b) for b, _ in next_level))
+
+        if len(level) % 2 == 1:
+            next_level.append(level[-1])
+        level = next_level
+
+    return level[0][0]
+
+
+def bulk_build(store, leaves, balanced=False):
+    """ Builds a new tree from a non-empty list of leaves, sorted by key and
+    without duplicate keys, and returns its root. """
+    if balanced:
+        return _build_balanced(store, leaves)
+    else:
+        return _build_plain(store, leaves)
+
+
+def scan(store, root_hash, lo=None, hi=None, visited=None, batch_size=100):
+    """ Yields the leaves of the tree with *root_hash* whose keys are in the
+    interval [*lo*, *hi*), in key order, where a bound of None is open. Only
+    the sub-trees that may hold such keys are read, nearest first, with up to
+    *batch_size* of them in each batched read. If *visited* is a list, all the
+    nodes read are appended to it. """
+
+    if root_hash is None:
+        return
+
+    # The stack holds the sub-trees left to visit, with the nearest on top.
+    stack = [ root_hash ]
+    nodes = {}
+    while stack != []:
+        window = stack[-batch_size:]
+        _fetch_checked(store, nodes, window)
+
+        # Replace every branch in the window by its sub-trees in the interval
+        del stack[-len(window):]
+        for hid in window:
+            node = nodes[hid]
+            if isinstance(node, Leaf):
+                stack.append(hid)
+                continue
+
+            del nodes[hid]
+            if visited is not None:
+                visited.append(node)
+
+            if hi is None or node.pivot < hi:
+                stack.append(node.right_branch)
+            if lo is None or lo <= node.pivot:
+                stack.append(node.left_branch)
+
+        # Emit the leaves now on top
+        while stack != [] and isinstance(nodes.get(stack[-1]), Leaf):
+            leaf = nodes.pop(stack.pop())
+            if visited is not None:
+                visited.append(leaf)
+
+            if (lo is None or lo <= leaf.key) and (hi is None or leaf.key < hi):
+                yield leaf
@@ -0,0 +1,181 @@
+""" A compact binary format for multi-key proofs on a Tree.
+
+A proof is the part of the tree needed to look up a set of keys, serialized in
+pre-order. Branches on the paths are included once, however many keys go through
+them, and sub-trees that no key goes into are replaced by their hash:
+
+    proof  := VERSION hash_id node
+    node   := BRANCH len(pivot) pivot node node
+            | LEAF len(key) key len(item) item
+            | HASH hash
+
+The hash identifier is a byte naming the hash function of the tree, from
+*Utils.HASH_IDS*. Lengths are 2 byte big-endian integers, and hashes are 32
+bytes. Proofs of version 1 have no hash identifier, and use SHA256.
+"""
+
+from struct import pack, unpack_from, error as StructError
+
+from .Nodes import h, Leaf, Branch, _check_hash
+from .Store import get_many
+from .Utils import HASH_IDS
+
+VERSION = 2
+HASH, LEAF, BRANCH = 0, 1, 2
+HASH_LEN = 32
+
+
+def multi_proof(store, root_hash, keys, alg="sha256"):
+    """ Returns the proof for the lookup of *keys* in the tree with *root_hash*,
+    which uses the hash function named *alg*. """
+
+    out = [pack(">BB", VERSION, HASH_IDS[alg])]
+    if root_hash is None:
+        return b"".join(out)
+
+    # Fetch the nodes on the paths level by level, with batched reads
+    nodes = {}
+    work_list = [(root_hash, list(keys))]
+    while work_list != []:
+        fetched = get_many(store, [hid for hid, _ in work_list])
+
+        next_list = []
+        for (hid, work_keys), node in zip(work_list, fetched):
+            _check_hash(hid, node)
+            if node.alg != alg:
+                raise Exception("Tree uses %s, but a node uses %s." % (alg, node.alg))
+            nodes[hid] = node
+
+            if isinstance(node, Branch):
+                left_keys = [k for k in work_keys if k <= node.pivot]
+                right_keys = [k for k in work_keys if k > node.pivot]
+                if left_keys != []:
+                    next_list.append((node.left_branch, left_keys))
+                if right_keys != []:
+                    next_list.append((node.right_branch, right_keys))
+
+        work_list = next_list
+
+    # Serialize them in pre-order
+    work_list = [ root_hash ]
+    while work_list != []:
+        hid = work_list.pop()
+
+        if hid not in nodes:
+            out.append(pack(">B", HASH) + hid)
+            continue
+
+        node = nodes[hid]
+        if isinstance(node, Leaf):
+            out.append(pack(">BH", LEAF, len(node.key)) + node.key)
+            out.append(pack(">H", len(node.item)) + node.item)
+
+        else:
+            out.append(pack(">BH", BRANCH, len(node.pivot)) + node.pivot)
+
+            # Push right first, so that the left sub-tree is serialized first
+            work_list.append(node.right_branch)
+            work_list.append(node.left_branch)
+
+    return b"".join(out)
+
+
+def verify_proof(root, proof, keys, items, alg="sha256"):
+    """ Checks a proof against a trusted *root* hash, and returns for each key
+    whether it maps to the corresponding item. Raises an exception if the proof
+    is malformed, does not cover all the keys, does not match the root, or
+    uses another hash function than the one named *alg*.
+
+    Example:
+        >>> from hippiehug import Tree
+        >>> t = Tree()
+        >>> t.multi_add([b"Hello", b"World"])
+        >>> root, proof = t.multi_proof([b"Hello", b"!"])
+        >>> verify_proof(root, proof, [b"Hello", b"!"], [b"Hello", b"!"])
+        [True, False]
+
+    """
+
+    if len(keys) != len(items):
+        raise Exception("Keys and items must have the same length.")
+
+    head = bytearray(proof[:2])
+    if len(head) >= 2 and head[0] == VERSION:
+        proof_alg_id, pos = head[1], 2
+    elif len(head) >= 1 and head[0] == 1:
+        proof_alg_id, pos = HASH_IDS["sha256"], 1
+    else:
+        raise Exception("Unknown proof version.")
+
+    if proof_alg_id != HASH_IDS[alg]:
+        raise Exception("Proof does not use %s." % alg)
+
+    result = [False] * len(keys)
+    if root is None:
+        if len(proof) != pos:
+            raise Exception("Proof for an empty tree must be empty.")
+        return result
+
+    item_hashes = [h(i, alg) for i in items]
+
+    # Each frame on the stack is a branch whose left sub-tree is being checked:
+    # its pivot, the keys that go right, and once known the left hash.
+    stack = []
+    work = list(range(len(keys)))
+    try:
+        while True:
+            (tag,) = unpack_from(">B", proof, pos)
+
+            if tag == BRANCH:
+                (l,) = unpack_from(">H", proof, pos + 1)
+                pivot = proof[pos + 3:pos + 3 + l]
+                pos += 3 + l
+
+                left = [i for i in work if keys[i] <= pivot]
+                right = [i for i in work if keys[i] > pivot]
+                stack.append([pivot, right, None])
+                work = left
+                continue
+
+            elif tag == LEAF:
+                (l,) = unpack_from(">H", proof, pos + 1)
+                key = proof[pos + 3:pos + 3 + l]
+                pos += 3 + l
+                (l,) = unpack_from(">H", proof, pos)
+                item = proof[pos + 2:pos + 2 + l]
+                pos += 2 + l
+
+                for i in work:
+                    result[i] = (keys[i] == key and item_hashes[i] == item)
+                value = h(b"L|" + key + b"|" + item, alg)
+
+            elif tag == HASH:
+                if work != []:
+                    raise Exception("Proof does not cover all keys.")
+                value = proof[pos + 1:pos + 1 + HASH_LEN]
+                pos += 1 + HASH_LEN
+
+            else:
+                raise Exception("Unknown node type in proof.")
+
+            # Complete the branches whose right sub-tree is now known
+            while stack != [] and stack[-1][2] is not None:
+                pivot, _, left_hash = stack.pop()
+                value = h(b"B" + pivot + left_hash + value, alg)
+
+            if stack == []:
+                break
+
+            stack[-1][2] = value
+            work = stack[-1][1]
+
+    except (IndexError, StructError):
+        raise Exception("Proof is truncated.")
+
+    if pos != len(proof):
+        raise Exception("Proof has trailing data.")
+
+    if value != root:
+        raise Exception("Proof does not match the root.")
+
+    return result
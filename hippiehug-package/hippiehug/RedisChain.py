@@ -1,28 +1,28 @@
 import future
 
 from .Chain import DocChain, Document, Block
+from .Cache import NodeCache
+from .Store import WriteBuffer
+from .Codec import encode, decode
 import redis
 
-# from json import dumps, loads
-
-from msgpack import packb, unpackb
-
 from queue import Queue
 from threading import Thread
 
 class RedisChain():
-    def __init__(self, chain_name, host='localhost', port=6379, db=0):
+    def __init__(self, chain_name, host='localhost', port=6379, db=0, cache=None):
         """ Initialize the Redis chain with an redis database. """
         self.r = redis.StrictRedis(host, port, db)
 
         self.name = chain_name
-        self.cache = {}
+        self.cache = cache if cache is not None else NodeCache()
 
         # Recover the latest head, if there is one
         new_head = self.r.get('%s.head' % self.name)
 
-        # Initialize the chain
-        self.chain = DocChain(store=self, root_hash=new_head)
+        # Initialize the chain, buffering the writes of each new block
+        self.buffer = WriteBuffer(self)
+        self.chain = DocChain(store=self.buffer, root_hash=new_head)
 
 
     def root(self):
@@ -31,53 +31,58 @@ class RedisChain():
 
 
     def __getitem__(self, key):
-        if key in self.cache:
-            return self.cache[key]
-
-        if len(self.cache) > 10000:
-            self.cache = {}
-
-        o = unpackb(self.r.get(key))
-
-        if o[b"type"] == b"Document":
-            obj = Document(o[b"body"])
-
-        if o[b"type"] == b"Block":
-            obj = Block(items=o[b"items"], index=o[b"index"], fingers=o[b"fingers"], aux=o[b"aux"])
+        obj = self.cache.get(key)
+        if obj is not None:
+            return obj
 
-        self.cache[key] = obj
+        data = self.r.get(key)
+        obj = decode(data)
+        self.cache.put(key, obj, len(data))
         return obj
 
 
     def __setitem__(self, key, value):
         if key in self.cache:
             return
-        else:
-            self.cache[key] = value
 
-        if isinstance(value, Document):
-            o = packb({b"type":b"Document", b"body":value.item, b"hid":value.hid})
-            self.r.set(key, o)
+        data = encode(value)
+        self.cache.put(key, value, len(data))
+        self.r.set(key, data)
 
-        if isinstance(value, Block):
-            o = packb({b"type":b"Block", b"fingers":value.fingers, b"items":value.items, "index": value.index, "hid":value.hid, "aux": value.aux})
-            self.r.set(key, o)
 
+    def put_many(self, items):
+        """ Writes (key, object) pairs in a single MULTI/EXEC transaction. """
+        pipe = self.r.pipeline(transaction=True)
+        written = []
+        for key, value in items:
+            if key in self.cache:
+                continue
+            data = encode(value)
+            pipe.set(key, data)
+            written.append((key, value, len(data)))
+
+        pipe.execute()
+        for key, value, size in written:
+            self.cache.put(key, value, size)
 
-    def add(self, items):
-        # Pipelining for adding blocks
-        pipe = self.r.pipeline()
 
+    def add(self, items):
         """ Add a new block with the given items. """
-        self.chain.multi_add(items)
+        old_head = self.chain.head
+        try:
+            self.chain.multi_add(items)
+
+            # Write the block and its documents in one transaction
+            new_root = self.chain.root()
+            self.buffer.flush(new_root)
+        except:
+            self.buffer.pending = {}
+            self.chain.head = old_head
+            raise
 
         # Only commit the new head after everything else.
-        new_root = self.chain.root()
         self.r.set('%s.head' % self.name, new_root)
 
-        # Execute the full pipeline
-        pipe.execute()
-
     def get(self, bid, sid, evidence = None):
         """ Get the item at the block bid, position sid. Optionally, gather
         evidence for the proof."""
@@ -99,14 +104,14 @@ def test_get_set():
 
     d = Document(b"Hello")
     rc[d.hid] = d
-    rc.cache = {}
+    rc.cache.clear()
 
     d2 = rc[d.hid]
     assert d == d2
 
     b = Block([b"Hello", b"World"])
     rc[b.hid] = b
-    rc.cache = {}
+    rc.cache.clear()
 
     b2 = rc[b.hid]
     assert b == b2
@@ -1,59 +1,115 @@
-from .Nodes import h, Leaf, Branch
-
-try:
-    import redis
-    import msgpack
-except:
-    print("Cannot load redis or msgpack")
-
-def default(obj):
-    """ Serialize objects using msgpack. """
-    if isinstance(obj, Leaf):
-        datab = msgpack.packb((obj.item, obj.key))
-        return msgpack.ExtType(42, datab)
-    if isinstance(obj, Branch):
-        datab = msgpack.packb((obj.pivot, obj.left_branch, obj.right_branch))
-        return msgpack.ExtType(43,  datab)
-
-    raise TypeError("Unknown Type: %r" % (obj,))
-
-
-def ext_hook(code, data):
-    """ Deserialize objects using msgpack. """
-    if code == 42:
-        l_item, l_key = msgpack.unpackb(data)
-        return Leaf(l_item, l_key)
-    if code == 43:
-        piv, r_leaf, l_leaf = msgpack.unpackb(data)
-        return Branch(piv, r_leaf, l_leaf)
-
-    return ExtType(code, data)
+from .Nodes import Branch
+from .Cache import NodeCache
+from .Codec import encode, decode
 
 
 class RedisStore():
-    def __init__(self, redisdb):
-        """ Initialize a Redis backed store for the Merkle Tree. """
+    def __init__(self, redisdb, cache=None):
+        """ Initialize a Redis backed store for the Merkle Tree.
+
+        :param redisdb: A Redis connection
+        :param cache: The *NodeCache* for nodes read or written, by default
+                one holding up to 10,000 nodes.
+        """
         self.r = redisdb
-        self.cache = {}
+        self.cache = cache if cache is not None else NodeCache()
 
     def __getitem__(self, key):
-        if key in self.cache:
-            return self.cache[key]
-
-        if len(self.cache) > 10000:
-            self.cache = {}
+        branch = self.cache.get(key)
+        if branch is not None:
+            return branch
 
         bdata = self.r.get(key)
-        branch = msgpack.unpackb(bdata, ext_hook=ext_hook)
+        branch = decode(bdata)
         # assert key == branch.identity()
-        self.cache[key] = branch
+        self.cache.put(key, branch, len(bdata))
         return branch
 
     def __setitem__(self, key, value):
         if key in self.cache:
             return
 
-        bdata = msgpack.packb(value, default=default)
+        bdata = encode(value)
         # assert key == value.identity()
         self.r.set(key, bdata)
+        self.cache.put(key, value, len(bdata))
+
+    def get_many(self, keys):
+        """ Returns the nodes for a list of keys, fetching all those not in
+        the cache with a single MGET. """
+        result = [self.cache.get(key) for key in keys]
+        missing = [key for key, node in zip(keys, result) if node is None]
+        if missing == []:
+            return result
+
+        fetched = {}
+        for key, bdata in zip(missing, self.r.mget(missing)):
+            if bdata is None:
+                raise KeyError(key)
+            node = decode(bdata)
+            self.cache.put(key, node, len(bdata))
+            fetched[key] = node
+
+        return [node if node is not None else fetched[key]
+                for key, node in zip(keys, result)]
+
+    def put_many(self, items, batch_size=1000):
+        """ Writes an iterable of (key, node) pairs not already in the cache,
+        as a single MULTI/EXEC transaction with one MSET for each *batch_size*
+        nodes. Either all nodes are written, or none is. """
+        pipe = self.r.pipeline(transaction=True)
+        batch = {}
+        nodes = []
+        for key, value in items:
+            if key in self.cache or key in batch:
+                continue
+
+            bdata = encode(value)
+            batch[key] = bdata
+            nodes.append((key, value, len(bdata)))
+
+            if len(batch) >= batch_size:
+                pipe.mset(batch)
+                batch = {}
+
+        if batch != {}:
+            pipe.mset(batch)
+
+        if nodes != []:
+            pipe.execute()
+
+        for key, value, size in nodes:
+            self.cache.put(key, value, size)
+
+    def __iter__(self):
+        # Only keys of the length of a hash are nodes: skip any other keys
+        # kept in the same database, such as chain heads.
+        for key in self.r.scan_iter(count=1000):
+            if len(key) == 32:
+                yield key
+
+    def __delitem__(self, key):
+        self.delete_many([ key ])
+
+    def delete_many(self, keys):
+        """ Deletes a list of keys with a single DEL. """
+        if keys == []:
+            return
+
+        self.r.delete(*keys)
+        for key in keys:
+            self.cache.discard(key)
+
+    def pin_levels(self, root_hash, levels):
+        """ Pins the top *levels* of the tree with *root_hash* in the cache,
+        replacing any previously pinned nodes. """
+        self.cache.unpin_all()
 
+        work_list = [ root_hash ]
+        for _ in range(levels):
+            next_list = []
+            for key, node in zip(work_list, self.get_many(work_list)):
+                self.cache.pin(key, node)
+                if isinstance(node, Branch):
+                    next_list += [ node.left_branch, node.right_branch ]
+            work_list = next_list
@@ -1,7 +1,9 @@
 # We implement a chain that lives on Amazon S3
 # For tests it necessary to have a configured AWS account.
 
-from .Chain import DocChain, Document, Block
+from .Chain import DocChain
+from .Cache import NodeCache
+from .Codec import encode, decode
 from .Utils import ascii_hash
 
 try:
@@ -12,7 +14,6 @@ except:
 from binascii import hexlify
 from os import urandom
 
-from json import dumps, loads
 try:
     from Queue import Queue as Queue
 except:
@@ -22,29 +23,23 @@ from threading import Thread
 
 def worker(q, bucket):
     while True:
-        (key, value) = q.get()
+        (key, data) = q.get()
 
         try:
-            if isinstance(value, Document):
-                bucket.put_object(Key="/Objects/%s" % key, ContentType="text/plain",
-                    Body=value.item, Metadata={"type":"Document"})
-
-            if isinstance(value, Block):
-                encoded = dumps({"fingers":value.fingers, "items":value.items, "sequence": value.sequence})
-                bucket.put_object(Key="/Objects/%s" % key, ContentType="text/plain",
-                    Body=encoded, Metadata={"type":"Block"})
+            bucket.put_object(Key="/Objects/%s" % key, ContentType="application/octet-stream",
+                Body=data, Metadata={"type":"Node"})
         except Exception as e:
-            q.put((key, value))
+            q.put((key, data))
 
         finally:
             q.task_done()
 
 
 class S3Chain():
-    def __init__(self, chain_name):
+    def __init__(self, chain_name, cache=None):
         """ Initialize the S3 chain with an S3 bucket name. """
         self.name = chain_name
-        self.cache = {}
+        self.cache = cache if cache is not None else NodeCache()
 
         # Make a connection to AWS S3
         self.s3 = boto3.resource('s3')
@@ -82,34 +77,26 @@ class S3Chain():
         return self.chain.root()
 
     def __getitem__(self, key):
-        if key in self.cache:
-            return self.cache[key]
-
-        if len(self.cache) > 10000:
-            self.cache = {}
+        obj = self.cache.get(key)
+        if obj is not None:
+            return obj
 
         self.q.join()
 
         o = self.s3.Object(self.name, "/Objects/%s" % key)
+        data = o.get()["Body"].read()
+        obj = decode(data)
 
-        if o.metadata["type"] == "Document":
-            obj = Document(o.get()["Body"].read())
-
-        if o.metadata["type"] == "Block":
-            obj = loads(o.get()["Body"].read())
-            obj = Block(items=obj["items"], sequence=obj["sequence"], fingers=obj["fingers"])
-
-
-        self.cache[key] = obj
+        self.cache.put(key, obj, len(data))
         return obj
 
     def __setitem__(self, key, value):
         if key in self.cache:
             return
-        else:
-            self.cache[key] = value
 
-        self.q.put((key, value))
+        data = encode(value)
+        self.cache.put(key, value, len(data))
+        self.q.put((key, data))
 
 
 
@@ -0,0 +1,92 @@
+""" A store of nodes in an SQLite database.
+
+Nodes are kept in a single table, holding their hash, the extension type code of
+their kind from *Codec*, and their encoding. The database runs in WAL mode, so
+that readers do not block the writer.
+"""
+
+import sqlite3
+
+from .Codec import kind, encode, decode
+
+SCHEMA = "CREATE TABLE IF NOT EXISTS nodes (hid BLOB PRIMARY KEY, kind INTEGER, body BLOB)"
+
+
+class SQLiteStore():
+    def __init__(self, path=":memory:", chunk_size=500):
+        """ Initialize a store in the SQLite database at *path*.
+
+        :param path: The database file, created if needed, or ":memory:".
+        :param chunk_size: The number of keys looked up or deleted by each
+                ``IN (...)`` query.
+
+        Example:
+            >>> from hippiehug import Tree
+            >>> t = Tree(SQLiteStore())
+            >>> t.multi_add([b"Hello", b"World"])
+            >>> b"World" in t
+            True
+
+        """
+        self.chunk_size = chunk_size
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(SCHEMA)
+        self.db.commit()
+
+    def __getitem__(self, key):
+        row = self.db.execute("SELECT body FROM nodes WHERE hid = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return decode(row[0])
+
+    def __setitem__(self, key, value):
+        self.put_many([(key, value)])
+
+    def __contains__(self, key):
+        return self.db.execute("SELECT 1 FROM nodes WHERE hid = ?", (key,)).fetchone() is not None
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+
+    def __iter__(self):
+        return iter([row[0] for row in self.db.execute("SELECT hid FROM nodes")])
+
+    def __delitem__(self, key):
+        self.delete_many([ key ])
+
+    def get_many(self, keys):
+        """ Returns the nodes for a list of keys, with one query for each
+        *chunk_size* keys, and raises a KeyError if any of them is missing. """
+        found = {}
+        unique = list(set(keys))
+        for i in range(0, len(unique), self.chunk_size):
+            chunk = unique[i:i + self.chunk_size]
+            query = "SELECT hid, body FROM nodes WHERE hid IN (%s)" % ",".join("?" * len(chunk))
+            for hid, body in self.db.execute(query, chunk):
+                found[hid] = body
+
+        result = []
+        for key in keys:
+            if key not in found:
+                raise KeyError(key)
+            result.append(decode(found[key]))
+        return result
+
+    def put_many(self, items):
+        """ Writes an iterable of (key, node) pairs in a single transaction. """
+        with self.db:
+            self.db.executemany("INSERT OR IGNORE INTO nodes VALUES (?, ?, ?)",
+                                ((key, kind(value), encode(value)) for key, value in items))
+
+    def delete_many(self, keys):
+        """ Deletes a list of keys in a single transaction. """
+        with self.db:
+            for i in range(0, len(keys), self.chunk_size):
+                chunk = keys[i:i + self.chunk_size]
+                self.db.execute("DELETE FROM nodes WHERE hid IN (%s)" % ",".join("?" * len(chunk)), chunk)
+
+    def close(self):
+        """ Closes the database. """
+        self.db.close()
@@ -0,0 +1,399 @@
+""" A sparse Merkle tree of fixed depth, over the hashes of keys.
+
+Each key goes down the path given by the 256 bits of its hash, so the shape of
+the tree only depends on the set of keys it holds, and paths to uniformly
+random keys are all about log2(n) branches long. A sub-tree holding no key is
+not stored, and has a default hash that only depends on its depth. A sub-tree
+holding a single key is stored as its Leaf, placed as high as possible, rather
+than as a path of branches leading to it.
+
+Proofs list, for each key, the siblings of the branches on its path, with a
+bitmap marking the siblings that are not default hashes, so that only those
+are included:
+
+    proof  := VERSION hash_id count(2) entry*
+    entry  := depth(2) bitmap siblings (EMPTY | LEAF len(key) key len(item) item)
+
+The bitmap has one bit per branch on the path, from the root down, padded to a
+whole number of bytes. Lengths are 2 byte big-endian integers, and hashes are
+32 bytes.
+"""
+
+from struct import pack, unpack_from, error as StructError
+
+from six import indexbytes
+
+from .Nodes import Leaf, _check_hash
+from .Store import WriteBuffer, get_many
+from .Utils import HASHES, HASH_IDS, hash_function
+
+DEPTH = 256
+VERSION = 1
+EMPTY, LEAF = 0, 1
+HASH_LEN = 32
+
+_defaults = {}
+
+
+def default_hashes(alg="sha256"):
+    """ Returns the list of the hashes of empty sub-trees at each depth, from
+    the root at depth 0 to a single position at depth 256. """
+    if alg not in _defaults:
+        fn = hash_function(alg)
+        hashes = [fn(b"E")]
+        for _ in range(DEPTH):
+            hashes.append(fn(b"S" + hashes[-1] + hashes[-1]))
+        _defaults[alg] = hashes[::-1]
+    return _defaults[alg]
+
+
+def _bit(path, depth):
+    return (indexbytes(path, depth >> 3) >> (7 - (depth & 7))) & 1
+
+
+def _pack_bitmap(bitmap, size):
+    """ Returns a bitmap as *size* bytes, least significant first. """
+    return bytes(bytearray((bitmap >> (8 * i)) & 0xff for i in range(size)))
+
+
+def _unpack_bitmap(data):
+    return sum(b << (8 * i) for i, b in enumerate(bytearray(data)))
+
+
+class SparseBranch:
+
+    __slots__ = ["left_branch", "right_branch", "hid", "alg"]
+
+    def __init__(self, left_branch_id, right_branch_id, alg="sha256"):
+        self.left_branch = left_branch_id
+        "The hash ID of the sub-tree of keys with a 0 bit at this depth."
+
+        self.right_branch = right_branch_id
+        "The hash ID of the sub-tree of keys with a 1 bit at this depth."
+
+        self.alg = alg
+        "The name of the hash function of the SparseBranch."
+
+        self.hid = HASHES[alg](b"S" + self.left_branch + self.right_branch)
+
+    def identity(self):
+        """ Returns the hash ID of the SparseBranch. """
+        return self.hid
+
+
+class SparseTree:
+    def __init__(self, store=None, root_hash=None, alg="sha256"):
+        """Initialize a sparse Merkle tree from a store and a root hash.
+
+        :param store: Backend mapping node hashes to nodes
+        :param root_hash: The root hash of an existing tree, or None for an
+                empty tree
+        :param alg: The name of the hash function of the nodes and items
+
+        Example:
+            >>> t = SparseTree()
+            >>> t.multi_add([b"Hello", b"World"])
+            >>> t.multi_is_in([b"Hello", b"World", b"!"])
+            [True, True, False]
+
+        The root only depends on the keys:
+            >>> t2 = SparseTree()
+            >>> t2.add(b"World")
+            >>> t2.add(b"Hello")
+            >>> t2.root() == t.root()
+            True
+
+        """
+        self.store = store if store is not None else {}
+        self.alg = alg
+        self._hash = hash_function(alg)
+        self.defaults = default_hashes(alg)
+        self.root_hash = root_hash if root_hash is not None else self.defaults[0]
+
+    def root(self):
+        """Return the root of the Tree, which is the same for any two trees
+        holding the same keys and items."""
+        return self.root_hash
+
+    def _is_empty(self, hid, depth):
+        return hid == self.defaults[depth]
+
+    def _descend(self, paths, evidence=None):
+        """ Walks down the paths level by level, reading each level with one
+        batched read, and returns the nodes read and the hash and depth of the
+        sub-tree that each path ends in: an empty one or a Leaf. """
+        nodes = {}
+        ends = [None] * len(paths)
+        work_list = [(self.root_hash, 0, list(range(len(paths))))]
+        while work_list != []:
+            fetch = [hid for hid, depth, _ in work_list
+                     if not self._is_empty(hid, depth) and hid not in nodes]
+            for hid, node in zip(fetch, get_many(self.store, fetch)):
+                _check_hash(hid, node)
+                if node.alg != self.alg:
+                    raise Exception("Tree uses %s, but a node uses %s." % (self.alg, node.alg))
+                nodes[hid] = node
+                if evidence is not None:
+                    evidence.append(node)
+
+            next_list = []
+            for hid, depth, work in work_list:
+                node = nodes.get(hid)
+                if not isinstance(node, SparseBranch):
+                    for i in work:
+                        ends[i] = (hid, depth)
+                    continue
+
+                left = [i for i in work if _bit(paths[i], depth) == 0]
+                right = [i for i in work if _bit(paths[i], depth) == 1]
+                if left != []:
+                    next_list.append((node.left_branch, depth + 1, left))
+                if right != []:
+                    next_list.append((node.right_branch, depth + 1, right))
+            work_list = next_list
+
+        return nodes, ends
+
+    def _build(self, store, nodes, hid, depth, leaves):
+        """ Returns the hash of the sub-tree *hid* at *depth* with new leaves
+        added, as a list of (path, Leaf) sorted by path, and writes its new
+        nodes to the store. """
+        if leaves == []:
+            return hid
+
+        if not self._is_empty(hid, depth):
+            node = nodes[hid]
+            if isinstance(node, Leaf):
+                # Keep the existing leaf, over any new one with the same key
+                leaves = [(p, l) for p, l in leaves if l.key != node.key]
+                if leaves == []:
+                    return hid
+                path = self._hash(node.key)
+                leaves = sorted(leaves + [(path, node)], key=lambda x: x[0])
+                return self._build(store, nodes, self.defaults[depth], depth, leaves)
+
+            left_branch, right_branch = node.left_branch, node.right_branch
+
+        elif len(leaves) == 1:
+            leaf = leaves[0][1]
+            store[leaf.hid] = leaf
+            return leaf.hid
+
+        else:
+            left_branch = right_branch = self.defaults[depth + 1]
+
+        split = 0
+        while split < len(leaves) and _bit(leaves[split][0], depth) == 0:
+            split += 1
+
+        b = SparseBranch(self._build(store, nodes, left_branch, depth + 1, leaves[:split]),
+                         self._build(store, nodes, right_branch, depth + 1, leaves[split:]),
+                         self.alg)
+        store[b.hid] = b
+        return b.hid
+
+    def add(self, item, key=None):
+        """Add an element to the tree."""
+        self.multi_add([item], None if key is None else [key])
+
+    def multi_add(self, items, keys=None):
+        """Add many elements to the tree. For duplicate keys the first item is
+        retained, as for *Tree*.
+
+        :param items: Items to add
+        :param keys: If not None, the keys under which the items are stored
+        """
+        if items == []:
+            return
+        if keys is None:
+            keys = items
+
+        unique = {}
+        for i, k in zip(items, keys):
+            if k not in unique:
+                unique[k] = (self._hash(k), Leaf(self._hash(i), k, self.alg))
+        leaves = sorted(unique.values(), key=lambda x: x[0])
+
+        nodes, _ = self._descend([p for p, _ in leaves])
+
+        buf = WriteBuffer(self.store)
+        new_root = self._build(buf, nodes, self.root_hash, 0, leaves)
+        buf.flush(new_root)
+        self.root_hash = new_root
+
+    def is_in(self, item, key=None):
+        """Checks whether an element is in the tree."""
+        return self.multi_is_in([item], None if key is None else [key])[0]
+
+    def __contains__(self, item):
+        return self.is_in(item)
+
+    def multi_is_in(self, items, keys=None, evidence=False):
+        """Check whether the items are in the tree.
+
+        :param items: Items to check
+        :param keys: If not None, the keys under which the items are looked up
+        :param evidence: Return the root of the tree and a list of the nodes
+                read as evidence, as for *Tree.multi_is_in*.
+        """
+        if keys is None:
+            keys = items
+
+        evid = [] if evidence else None
+        nodes, ends = self._descend([self._hash(k) for k in keys], evid)
+
+        result = []
+        for i, k, (hid, depth) in zip(items, keys, ends):
+            result.append(not self._is_empty(hid, depth) and
+                          nodes[hid].hid == Leaf(self._hash(i), k, self.alg).hid)
+
+        if not evidence:
+            return result
+        else:
+            return result, self.root_hash, evid
+
+    def evidence(self, key):
+        """Gather evidence about the inclusion / exclusion of the *key*: the
+        nodes on its path, from the root down to its Leaf, another Leaf, or an
+        empty sub-tree.
+
+        Example:
+            >>> t = SparseTree()
+            >>> t.multi_add([b"Hello", b"World"])
+            >>> root, E = t.evidence(b"World")
+            >>> evidence_store = dict((e.identity(), e) for e in E)
+            >>> b"World" in SparseTree(evidence_store, root)
+            True
+
+        """
+        evid = []
+        self._descend([self._hash(key)], evid)
+        return self.root_hash, evid
+
+    def multi_proof(self, keys):
+        """Build a binary proof about the inclusion / exclusion of *keys*, with
+        the siblings of the branches on their paths compressed by a bitmap of
+        those that are not empty.
+
+        Example:
+            >>> t = SparseTree()
+            >>> t.multi_add([b"Hello", b"World"])
+            >>> root, proof = t.multi_proof([b"World", b"!"])
+            >>> verify_sparse_proof(root, proof, [b"World", b"!"], [b"World", b"!"])
+            [True, False]
+
+        """
+        paths = [self._hash(k) for k in keys]
+        nodes, ends = self._descend(paths)
+
+        out = [pack(">BBH", VERSION, HASH_IDS[self.alg], len(keys))]
+        for path in paths:
+            bitmap, siblings = 0, []
+            hid, depth = self.root_hash, 0
+            while isinstance(nodes.get(hid), SparseBranch):
+                node = nodes[hid]
+                if _bit(path, depth):
+                    sibling, hid = node.left_branch, node.right_branch
+                else:
+                    sibling, hid = node.right_branch, node.left_branch
+                depth += 1
+
+                if not self._is_empty(sibling, depth):
+                    bitmap |= 1 << (depth - 1)
+                    siblings.append(sibling)
+
+            size = (depth + 7) // 8
+            out.append(pack(">H", depth) +
+                       _pack_bitmap(bitmap, size) + b"".join(siblings))
+
+            if self._is_empty(hid, depth):
+                out.append(pack(">B", EMPTY))
+            else:
+                leaf = nodes[hid]
+                out.append(pack(">BH", LEAF, len(leaf.key)) + leaf.key)
+                out.append(pack(">H", len(leaf.item)) + leaf.item)
+
+        return self.root_hash, b"".join(out)
+
+
+def verify_sparse_proof(root, proof, keys, items, alg="sha256"):
+    """ Checks a proof from *SparseTree.multi_proof* against a trusted *root*
+    hash, and returns for each key whether it maps to the corresponding item.
+    Raises an exception if the proof is malformed, does not match the root, or
+    uses another hash function than the one named *alg*. """
+
+    if len(keys) != len(items):
+        raise Exception("Keys and items must have the same length.")
+
+    defaults = default_hashes(alg)
+    fn = hash_function(alg)
+    result = []
+    try:
+        version, proof_alg_id, count = unpack_from(">BBH", proof, 0)
+        if version != VERSION:
+            raise Exception("Unknown proof version.")
+        if proof_alg_id != HASH_IDS[alg]:
+            raise Exception("Proof does not use %s." % alg)
+        if count != len(keys):
+            raise Exception("Proof does not cover all keys.")
+
+        pos = 4
+        for key, item in zip(keys, items):
+            path = fn(key)
+
+            (depth,) = unpack_from(">H", proof, pos)
+            size = (depth + 7) // 8
+            if depth > DEPTH or len(proof) < pos + 2 + size:
+                raise Exception("Proof is truncated.")
+            bitmap = _unpack_bitmap(proof[pos + 2:pos + 2 + size])
+            pos += 2 + size
+
+            siblings = []
+            for d in range(depth):
+                if bitmap >> d & 1:
+                    siblings.append(proof[pos:pos + HASH_LEN])
+                    pos += HASH_LEN
+                else:
+                    siblings.append(defaults[d + 1])
+
+            (tag,) = unpack_from(">B", proof, pos)
+            if tag == EMPTY:
+                value = defaults[depth]
+                result.append(False)
+                pos += 1
+
+            elif tag == LEAF:
+                (l,) = unpack_from(">H", proof, pos + 1)
+                leaf_key = proof[pos + 3:pos + 3 + l]
+                pos += 3 + l
+                (l,) = unpack_from(">H", proof, pos)
+                leaf_item = proof[pos + 2:pos + 2 + l]
+                pos += 2 + l
+
+                # The leaf must be on the path to the key
+                leaf_path = fn(leaf_key)
+                if any(_bit(leaf_path, d) != _bit(path, d) for d in range(depth)):
+                    raise Exception("Leaf is not on the path to the key.")
+
+                value = fn(b"L|" + leaf_key + b"|" + leaf_item)
+                result.append(leaf_key == key and leaf_item == fn(item))
+
+            else:
+                raise Exception("Unknown node type in proof.")
+
+            for d in reversed(range(depth)):
+                if _bit(path, d):
+                    value = fn(b"S" + siblings[d] + value)
+                else:
+                    value = fn(b"S" + value + siblings[d])
+
+            if value != root:
+                raise Exception("Proof does not match the root.")
+
+    except (IndexError, StructError):
+        raise Exception("Proof is truncated.")
+
+    if pos != len(proof):
+        raise Exception("Proof has trailing data.")
+
+    return result
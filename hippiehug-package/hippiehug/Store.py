@@ -0,0 +1,138 @@
+""" The store protocol used by the Tree and Chain algorithms.
+
+A store is any mapping from hashes to nodes that supports ``store[key]`` and
+``store[key] = node``, such as a plain dictionary. A store may also offer
+batched access, which the algorithms use to fetch or write a whole level of a
+tree at a time:
+
+    ``store.get_many(keys)``
+        Returns the list of nodes for a list of keys, in the same order, and
+        raises a KeyError if any of them is missing.
+
+    ``store.put_many(items)``
+        Writes an iterable of (key, node) pairs.
+
+    ``store.delete_many(keys)``
+        Deletes a list of keys.
+
+The garbage collector also needs to iterate over the keys of a store, while
+it may be written to, and to delete them with ``del store[key]`` unless it
+offers ``delete_many``.
+
+The functions below call the batched methods when a store has them, and fall
+back to one access per node otherwise.
+"""
+
+
+def get_many(store, keys):
+    """ Returns the nodes for a list of *keys*, with a single request to stores
+    that support batched reads.
+
+    Example:
+        >>> get_many({b"A": 1, b"B": 2}, [b"B", b"A"])
+        [2, 1]
+
+    """
+    if hasattr(store, "get_many"):
+        return store.get_many(keys)
+    return [store[k] for k in keys]
+
+
+def put_many(store, items):
+    """ Writes an iterable of (key, node) pairs, with a single request to
+    stores that support batched writes. """
+    if hasattr(store, "put_many"):
+        store.put_many(items)
+    else:
+        for k, v in items:
+            store[k] = v
+
+
+def children(node):
+    """ Returns the keys of the nodes that a node refers to: the two sub-trees
+    of a Branch, or the fingers and items of a Block. Items that are not keys
+    of other nodes are returned too, and should be ignored if missing. """
+    if hasattr(node, "left_branch"):
+        return [node.left_branch, node.right_branch]
+
+    if hasattr(node, "fingers"):
+        refs = [block_hash for (_, block_hash) in node.fingers]
+        refs += [i for i in node.items if isinstance(i, bytes)]
+        return refs
+
+    return []
+
+
+class WriteBuffer():
+    def __init__(self, store):
+        """ Initialize a buffer collecting the node writes of one logical update
+        to a *store*. Nodes written to the buffer can be read back from it, and
+        only reach the store when it is flushed.
+
+        Example:
+            >>> from hippiehug import Tree
+            >>> store = {}
+            >>> buf = WriteBuffer(store)
+            >>> t = Tree(buf)
+            >>> t.multi_add([b"Hello"])
+            >>> t.multi_add([b"World"])
+            >>> len(store)
+            0
+            >>> buf.flush(t.root())
+            3
+            >>> b"World" in Tree(store, t.root())
+            True
+
+        """
+        self.store = store
+        self.pending = {}
+
+    def __getitem__(self, key):
+        if key in self.pending:
+            return self.pending[key]
+        return self.store[key]
+
+    def __setitem__(self, key, value):
+        self.pending[key] = value
+
+    def __contains__(self, key):
+        return key in self.pending or key in self.store
+
+    def get_many(self, keys):
+        missing = [k for k in keys if k not in self.pending]
+        fetched = dict(zip(missing, get_many(self.store, missing))) if missing != [] else {}
+        return [self.pending[k] if k in self.pending else fetched[k] for k in keys]
+
+    def put_many(self, items):
+        self.pending.update(items)
+
+    def flush(self, *roots):
+        """ Writes the buffered nodes to the store in a single batch, and empties
+        the buffer. If *roots* are given, only the nodes reachable from them are
+        written, and nodes superseded during the update are dropped. Returns the
+        number of nodes written. """
+        if roots != ():
+            keep = {}
+            work_list = [r for r in roots if r in self.pending]
+            while work_list != []:
+                key = work_list.pop()
+                if key in keep:
+                    continue
+                keep[key] = self.pending[key]
+                work_list += [k for k in children(keep[key]) if k in self.pending]
+        else:
+            keep = self.pending
+
+        put_many(self.store, keep.items())
+        self.pending = {}
+        return len(keep)
+
+
+def delete_many(store, keys):
+    """ Deletes a list of keys, with a single request to stores that support
+    batched deletes. """
+    if hasattr(store, "delete_many"):
+        store.delete_many(keys)
+    else:
+        for k in keys:
+            del store[k]
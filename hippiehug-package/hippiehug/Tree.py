@@ -1,10 +1,26 @@
-from .Nodes import h, Leaf, Branch
+from contextlib import contextmanager
+
+from .Diff import diff
+from .Nodes import Leaf, Branch, bulk_build, scan
+from .Proof import multi_proof
+from .Store import WriteBuffer
+from .Utils import hash_function
 
 
 class Tree:
-    def __init__(self, store=None, root_hash=None):
+    def __init__(self, store=None, root_hash=None, balanced=False, alg="sha256"):
         """Initialize a Merkle tree from a store and a root hash.
 
+        :param store: Backend mapping node hashes to nodes
+        :param root_hash: The root hash of an existing tree, or None
+        :param balanced: Keep the tree balanced as a treap with priorities
+                derived from the hashes of keys, so that its depth stays
+                logarithmic even for sequential keys, and its shape only
+                depends on the set of keys it contains.
+        :param alg: The name of the hash function of the nodes and items,
+                "sha256" or the faster "blake2b". Nodes record their hash
+                function, and a tree refuses to use a root with another one.
+
         Example:
             >>> from hippiehug import Tree
             >>> t = Tree()
@@ -14,9 +30,83 @@ class Tree:
             >>> b"World" not in t
             True
 
+        Example of a balanced tree:
+            >>> t = Tree(balanced=True)
+            >>> t.multi_add([b"%05d" % i for i in range(1000)])
+            >>> root, E = t.evidence(b"00999")
+            >>> len(E) < 40
+            True
+
         """
         self.store = store if store is not None else {}
         self.root_hash = root_hash
+        self.balanced = balanced
+        self.alg = alg
+        self._hash = hash_function(alg)
+
+        self.staged = None
+        "The item hashes added by key since *stage*, or None if not staging."
+
+    @classmethod
+    def bulk_build(cls, items, keys=None, store=None, balanced=False, alg="sha256"):
+        """Build a new Tree holding many elements at once.
+
+        The elements are sorted and deduplicated once, and the tree is built
+        bottom-up, level by level, writing every node to the store once. For
+        duplicate keys the first item is retained, as for *add*.
+
+        :param items: Items to add
+        :param keys: If not None, the keys under which the items are stored
+        :param store: Backend, a new dictionary by default
+        :param balanced: Build a balanced tree (see *Tree*)
+        :param alg: The name of the hash function (see *Tree*)
+
+        Example:
+            >>> t = Tree.bulk_build([b"World", b"Hello", b"World"])
+            >>> t.multi_is_in([b"Hello", b"World", b"!"])
+            [True, True, False]
+        """
+        if keys is None:
+            keys = items
+
+        fn = hash_function(alg)
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        leaves = []
+        for i in order:
+            if leaves == [] or leaves[-1].key != keys[i]:
+                leaves.append(Leaf(fn(items[i]), keys[i], alg))
+
+        return cls._from_leaves(leaves, store, balanced, alg)
+
+    @classmethod
+    def from_sorted(cls, items, keys=None, store=None, balanced=False, alg="sha256"):
+        """Build a new Tree from elements already sorted by key.
+
+        This is like *bulk_build*, but skips sorting, and the keys must be
+        strictly increasing.
+
+        Example:
+            >>> t = Tree.from_sorted([b"A", b"B", b"C"])
+            >>> b"B" in t
+            True
+        """
+        if keys is None:
+            keys = items
+
+        for k0, k1 in zip(keys, keys[1:]):
+            if not k0 < k1:
+                raise Exception("Keys are not strictly increasing: %r, %r." % (k0, k1))
+
+        fn = hash_function(alg)
+        leaves = [Leaf(fn(i), k, alg) for i, k in zip(items, keys)]
+        return cls._from_leaves(leaves, store, balanced, alg)
+
+    @classmethod
+    def _from_leaves(cls, leaves, store, balanced, alg):
+        t = cls(store, balanced=balanced, alg=alg)
+        if leaves != []:
+            t.root_hash = bulk_build(t.store, leaves, balanced).identity()
+        return t
 
     def root(self):
         """Return the root of the Tree.
@@ -27,19 +117,26 @@ class Tree:
 
     def add(self, item, key=None):
         """Add and element to the Merkle tree."""
-        item_key = h(item)
+        item_key = self._hash(item)
 
         if key is None:
             key = item
 
+        if self.staged is not None:
+            self.staged.setdefault(key, item_key)
+            return
+
+        buf = self._buffer()
         if self.root_hash == None:
-            l = Leaf(item_key, key)
-            self.store[l.identity()] = l
-            self.root_hash = l.identity()
+            new_head_elem = Leaf(item_key, key, self.alg)
+            buf[new_head_elem.identity()] = new_head_elem
         else:
-            head_element = self.store[self.root_hash]
-            new_head_elem = head_element.add(self.store, item_key, key)
-            self.root_hash = new_head_elem.identity()
+            head_element = self._head()
+            new_head_elem = head_element.add(buf, item_key, key, self.balanced)
+
+        # Only the rotations of a balanced tree supersede nodes written by a
+        # single add.
+        self._commit(buf, new_head_elem.identity(), prune=self.balanced)
 
     def multi_add(self, items, keys=None):
         """Add many elements to the Merkle tree.
@@ -55,21 +152,173 @@ class Tree:
             >>> assert b"Hello" in t and b"World" in t
         """
 
-        item_keys = [h(i) for i in items]
+        if items == []:
+            return
+
+        item_keys = [self._hash(i) for i in items]
         if keys is None:
             keys = items
 
+        if self.staged is not None:
+            for i, k in zip(item_keys, keys):
+                self.staged.setdefault(k, i)
+            return
+
+        self._multi_add(item_keys, keys)
+
+    def _multi_add(self, item_keys, keys):
+        buf = self._buffer()
         if self.root_hash == None:
-            l = Leaf(item_keys[0], keys[0])
-            self.store[l.identity()] = l
+            l = Leaf(item_keys[0], keys[0], self.alg)
+            buf[l.identity()] = l
 
-            b = l.multi_add(self.store, item_keys[1:], keys[1:])
-            self.root_hash = b.identity()
+            new_head_elem = l.multi_add(buf, item_keys[1:], keys[1:], self.balanced)
 
         else:
-            head_element = self.store[self.root_hash]
-            new_head_elem = head_element.multi_add(self.store, item_keys, keys)
-            self.root_hash = new_head_elem.identity()
+            head_element = self._head()
+            new_head_elem = head_element.multi_add(buf, item_keys, keys,
+                                                   self.balanced)
+
+        self._commit(buf, new_head_elem.identity())
+
+    def remove(self, key):
+        """Remove the item stored under *key* from the tree, if there is one.
+
+        Example:
+            >>> t = Tree()
+            >>> t.multi_add([b"Hello", b"World"])
+            >>> t.remove(b"Hello")
+            >>> b"Hello" in t, b"World" in t
+            (False, True)
+        """
+        self.multi_remove([key])
+
+    def multi_remove(self, keys):
+        """Remove the items stored under many keys from the tree.
+
+        The branches above removed leaves collapse into their remaining
+        sub-trees, and all new nodes are written to the store in one batch. A
+        balanced tree keeps the same root as one built from the remaining keys.
+        Removal applies to the committed tree at once, and also drops any
+        staged item under the keys.
+
+        :param keys: Keys to remove. Keys not in the tree are ignored.
+        """
+
+        if self.staged:
+            for k in keys:
+                self.staged.pop(k, None)
+
+        if self.root_hash == None:
+            return
+
+        buf = self._buffer()
+        head_element = self._head()
+        for k in keys:
+            head_element = head_element.remove(buf, k, self.balanced)
+            if head_element is None:
+                self.root_hash = None
+                return
+
+        self._commit(buf, head_element.identity())
+
+    def _head(self):
+        """Return the root node, checking that it uses the hash function of the
+        Tree."""
+        head_element = self.store[self.root_hash]
+        if head_element.alg != self.alg:
+            raise Exception("Tree uses %s, but its root uses %s." % (self.alg, head_element.alg))
+        return head_element
+
+    def _buffer(self):
+        """Return a buffer for the node writes of an update, or the store itself
+        if it has no batched writes, as a local store gains nothing from
+        buffering."""
+        if hasattr(self.store, "put_many"):
+            return WriteBuffer(self.store)
+        return self.store
+
+    def _commit(self, buf, new_root, prune=True):
+        """Write the nodes of an update to the store in one batch, keeping only
+        those reachable from its new root if *prune* is set, and only then move
+        the root of the Tree."""
+        if buf is not self.store:
+            if prune:
+                buf.flush(new_root)
+            else:
+                buf.flush()
+        self.root_hash = new_root
+
+    def stage(self):
+        """Start staging additions in memory, until *commit* is called.
+
+        While staging, *add* and *multi_add* only record the items, and all of
+        them are added to the tree in a single batch on *commit*, so that the
+        branches they share are hashed and written once. Lookups with *is_in*
+        and *multi_is_in* see the staged items, but the root and the evidence
+        are those of the last committed tree.
+
+        Example:
+            >>> t = Tree()
+            >>> t.stage()
+            >>> t.add(b"Hello")
+            >>> t.add(b"World")
+            >>> b"Hello" in t, t.root()
+            (True, None)
+            >>> t.commit()
+            >>> t.root() is not None
+            True
+        """
+        if self.staged is None:
+            self.staged = {}
+
+    def commit(self):
+        """Add all the staged items to the tree in one batch, and stop staging."""
+        staged, self.staged = self.staged, None
+        if staged:
+            keys = list(staged)
+            self._multi_add([staged[k] for k in keys], keys)
+
+    def discard(self):
+        """Drop all the staged items, and stop staging."""
+        self.staged = None
+
+    @contextmanager
+    def batch(self):
+        """Stage all additions within a *with* block, and commit them at its
+        end, or discard them if it raises an exception.
+
+        Example:
+            >>> t = Tree()
+            >>> with t.batch():
+            ...     for i in range(100):
+            ...         t.add(b"%d" % i)
+            >>> b"42" in t
+            True
+        """
+        self.stage()
+        try:
+            yield self
+        except:
+            self.discard()
+            raise
+        self.commit()
+
+    def _is_staged(self, item_key, key):
+        """Checks whether an item is staged, and will be added on commit since
+        its key is not yet in the tree."""
+        if not self.staged or self.staged.get(key) != item_key:
+            return False
+
+        if self.root_hash == None:
+            return True
+
+        # Walk down to the leaf the key would be in, letting errors of the
+        # store or of the hashes propagate
+        node = self._head()
+        while isinstance(node, Branch):
+            node = self.store[node.left_branch if key <= node.pivot else node.right_branch]
+        return node.key != key
 
     def is_in(self, item, key=None):
         """Checks whether an element is in the Merkle Tree.
@@ -77,15 +326,16 @@ class Tree:
         :param item: Item to check
         :param key: If not None, hash of the item is used as a lookup key
         """
-        if self.root_hash == None:
-            return False
-
         if key is None:
             key = item
 
-        item_key = h(item)
-        head_element = self.store[self.root_hash]
-        return head_element.is_in(self.store, item_key, key)
+        item_key = self._hash(item)
+        if self.root_hash == None:
+            return self._is_staged(item_key, key)
+
+        head_element = self._head()
+        return head_element.is_in(self.store, item_key, key) or \
+            self._is_staged(item_key, key)
 
     def multi_is_in(self, items, keys=None, evidence=False):
         """Check whether the items are in the Tree.
@@ -126,14 +376,15 @@ class Tree:
         if keys is None:
             keys = items
 
+        item_keys = [self._hash(i) for i in items]
+
         if self.root_hash == None:
             if not evidence:
-                return [ False ] * len(items)
+                return [self._is_staged(i, k) for i, k in zip(item_keys, keys)]
             else:
                 return [ False ] * len(items), None, []
 
-        item_keys = [ h(i) for i in items ]
-        head_element = self.store[self.root_hash]
+        head_element = self._head()
 
         evid = [] if evidence else None
 
@@ -141,7 +392,7 @@ class Tree:
         head_element.multi_is_in_fast( self.store, evid, items=item_keys, keys=keys, solution=solution)
 
         if not evidence:
-            return [solution[(i, k)] for i, k in zip(item_keys, keys)]
+            return [solution[(i, k)] or self._is_staged(i, k) for i, k in zip(item_keys, keys)]
         else:
             return [solution[(i, k)] for i, k in zip(item_keys, keys)], self.root_hash, evid
 
@@ -170,6 +421,83 @@ class Tree:
             return []
 
         # item_key = h(item)
-        head_element = self.store[self.root_hash]
+        head_element = self._head()
         return self.root_hash, head_element.evidence(self.store, [], key)
 
+    def multi_proof(self, keys):
+        """Build a compact binary proof about the inclusion / exclusion of *keys*.
+
+        The proof holds the pivots of the branches on the paths to the keys,
+        the leaves they lead to, and the hashes of the sub-trees off the paths.
+        It can be checked with *verify_proof*, without a store or a *Tree*.
+
+        Example:
+            >>> from hippiehug import verify_proof
+            >>> t = Tree()
+            >>> t.multi_add([b"Hello", b"World"])
+            >>> root, proof = t.multi_proof([b"World", b"!"])
+            >>> verify_proof(root, proof, [b"World", b"!"], [b"World", b"!"])
+            [True, False]
+
+        """
+        return self.root_hash, multi_proof(self.store, self.root_hash, keys, self.alg)
+
+    def range(self, lo=None, hi=None):
+        """Iterate over the (key, item hash) pairs with a key in [*lo*, *hi*), in
+        key order. Either bound may be None to leave the interval open on that side.
+
+        The scan streams through the tree, reading the nearest sub-trees that
+        overlap the interval in batches. Staged items are not included.
+
+        Example:
+            >>> t = Tree()
+            >>> t.multi_add([b"A", b"B", b"C", b"D"])
+            >>> [key for key, _ in t.range(b"B", b"D")]
+            [b'B', b'C']
+
+        """
+        for leaf in scan(self.store, self.root_hash, lo, hi):
+            yield (leaf.key, leaf.item)
+
+    def range_evidence(self, lo=None, hi=None):
+        """Gather evidence about all the keys in [*lo*, *hi*).
+
+        The evidence includes all the Branches and Leafs read by a range scan,
+        including the leaves just outside the interval. A *Tree* over the
+        evidence and the root returns the same keys from *range*, and fails
+        with a KeyError if a node proving that no key was left out is missing.
+
+        Example:
+            >>> t = Tree()
+            >>> t.multi_add([b"A", b"B", b"C", b"D"])
+            >>> root, E = t.range_evidence(b"B", b"D")
+            >>> evidence_store = dict((e.identity(), e) for e in E)
+            >>> [key for key, _ in Tree(evidence_store, root).range(b"B", b"D")]
+            [b'B', b'C']
+
+        """
+        visited = []
+        for _ in scan(self.store, self.root_hash, lo, hi, visited):
+            pass
+        return self.root_hash, visited
+
+    def diff(self, other_root):
+        """Yield the differences from this Tree to the tree with *other_root* in
+        the same store, in key order.
+
+        Each difference is a tuple (change, key, old, new) where change is one
+        of "added", "removed" or "changed", and old and new are the hashes of
+        the items under the key in this tree and in the other one, or None.
+        Sub-trees shared by both trees are skipped without being read, so the
+        cost follows the number of differences rather than the size of the trees.
+
+        Example:
+            >>> t = Tree()
+            >>> t.multi_add([b"Hello", b"World"])
+            >>> old_root = t.root()
+            >>> t.add(b"!")
+            >>> [(change, key) for change, key, _, _ in Tree(t.store, old_root).diff(t.root())]
+            [('added', b'!')]
+
+        """
+        return diff(self.store, self.root_hash, other_root)
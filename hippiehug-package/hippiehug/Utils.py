@@ -1,17 +1,104 @@
 # -*- coding: utf-8 -*-
 
 import six
-from hashlib import sha256 as xhash
+import threading
+from hashlib import sha256
+
+# The blake2b hash function needs Python 3.6 or later
+try:
+    from hashlib import blake2b
+except ImportError:
+    blake2b = None
 
 from binascii import hexlify
 
 
-def binary_hash(item):
+def _sha256(item):
+    if _active_count:
+        _count_hash()
+    return sha256(item).digest()
+
+
+def _blake2b(item):
+    if _active_count:
+        _count_hash()
+    return blake2b(item, digest_size=32).digest()
+
+
+HASHES = {"sha256": _sha256}
+"The hash functions that nodes may use, all with 32 byte digests, by name."
+
+HASH_IDS = {"sha256": 0}
+"The identifiers of the hash functions in binary formats, by name."
+
+if blake2b is not None:
+    HASHES["blake2b"] = _blake2b
+    HASH_IDS["blake2b"] = 1
+
+
+# The active instruments are kept per context: an asyncio task or a thread
+# with Python 3.7 or later, and a thread otherwise
+try:
+    from contextvars import ContextVar
+    _instruments = ContextVar("instruments", default=())
+except ImportError:
+    class _ThreadInstruments(threading.local):
+        value = ()
+
+        def get(self):
+            return self.value
+
+        def set(self, value):
+            self.value = value
+
+    _instruments = _ThreadInstruments()
+
+# The number of instruments active in any context, so that the hash functions
+# only look up the instruments of their context while some are counting
+_active_count = 0
+_active_lock = threading.Lock()
+
+
+def _start_instrument(inst):
+    global _active_count
+    with _active_lock:
+        _active_count += 1
+    _instruments.set(_instruments.get() + (inst,))
+
+
+def _stop_instrument(inst):
+    global _active_count
+    _instruments.set(tuple(i for i in _instruments.get() if i is not inst))
+    with _active_lock:
+        _active_count -= 1
+
+
+def _count_hash():
+    for inst in _instruments.get():
+        inst.hashes += 1
+
+
+def hash_function(alg):
+    """ Returns the hash function with the name *alg*.
+
+    >>> hash_function("sha256")(b'value') == binary_hash(b'value')
+    True
+    """
+    try:
+        return HASHES[alg]
+    except KeyError:
+        raise Exception("Unknown hash algorithm: %s" % alg)
+
+
+def binary_hash(item, alg="sha256"):
     """
     >>> isinstance(binary_hash(b'value')[:4], six.binary_type)
     True
     """
-    return xhash(item).digest()
+    fn = HASHES.get(alg)
+    if fn is None:
+        fn = hash_function(alg)
+    return fn(item)
 
 
 def ascii_hash(item):
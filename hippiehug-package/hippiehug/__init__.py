@@ -1,8 +1,25 @@
 from .Tree import Tree
-from .Chain import Chain, Block, DocChain
+from .Sparse import SparseTree, verify_sparse_proof
+from .Chain import Chain, Block, BlockHeader, DocChain
+from .Index import BlockIndex
 from .RedisStore import RedisStore
+from .FileStore import FileStore
+from .SQLiteStore import SQLiteStore
+from .Arena import ArenaStore
+from .Cache import NodeCache
+from .Instrument import Instrument
 from .Nodes import h, Leaf, Branch
+from .Proof import verify_proof
+
+# The asynchronous API needs Python 3.5 or later
+try:
+    from .Async import AsyncTree, AsyncChain, AsyncStoreAdapter
+except SyntaxError:
+    pass
 
 __version__ = "0.1.3"
 
-__all__ = ["Tree", "Chain", "DocChain", "RedisStore", "h"]
+__all__ = ["Tree", "SparseTree", "Chain", "DocChain", "BlockIndex", "RedisStore", "FileStore", "SQLiteStore", "ArenaStore", "NodeCache", "Instrument", "h", "verify_proof", "verify_sparse_proof"]
+
+if "AsyncTree" in globals():
+    __all__ += ["AsyncTree", "AsyncChain", "AsyncStoreAdapter"]
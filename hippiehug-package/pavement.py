@@ -19,6 +19,17 @@ def test():
     print("Generic Unit tests")
     sh('py.test -vs --doctest-modules tests/test_*.py hippiehug/*.py')
 
+@task
+def bench():
+    """ Run the benchmarks over all available stores, and add them to the history. """
+    sh('python -m benchmarks.run --json benchmarks.json --history benchmarks/history.jsonl')
+
+@task
+@needs('bench')
+def bench_compare():
+    """ Run the benchmarks, and report regressions against the baseline. """
+    sh('python -m benchmarks.compare benchmarks/baseline.json benchmarks.json')
+
 @task
 def build(quiet=True):
     """ Builds the distribution, ready to be uploaded to pypi. """
@@ -11,3 +11,65 @@ def rstore():
     r.flushdb()
     return RedisStore(r)
 
+
+
+class DictRedis():
+    """ The part of the Redis client used by RedisStore, over a dictionary,
+    counting the keys read and the round trips made. """
+    def __init__(self):
+        self.data = {}
+        self.gets = 0
+        self.round_trips = 0
+
+    def get(self, key):
+        self.gets += 1
+        self.round_trips += 1
+        return self.data.get(key)
+
+    def mget(self, keys):
+        self.gets += len(keys)
+        self.round_trips += 1
+        return [self.data.get(k) for k in keys]
+
+    def set(self, key, value):
+        self.round_trips += 1
+        self.data[key] = value
+
+    def mset(self, mapping):
+        self.round_trips += 1
+        self.data.update(mapping)
+
+    def delete(self, *keys):
+        self.round_trips += 1
+        for k in keys:
+            self.data.pop(k, None)
+
+    def scan_iter(self, count=10):
+        for k in list(self.data):
+            yield k
+
+    def pipeline(self, transaction=True):
+        return DictPipeline(self)
+
+
+class DictPipeline():
+    """ Queues commands, and runs them in a single round trip. """
+    def __init__(self, r):
+        self.r = r
+        self.commands = []
+
+    def set(self, key, value):
+        self.commands.append((key, value))
+
+    def mset(self, mapping):
+        self.commands += mapping.items()
+
+    def execute(self):
+        self.r.round_trips += 1
+        self.r.data.update(self.commands)
+        self.commands = []
+
+
+@pytest.fixture
+def dredis():
+    return DictRedis()
@@ -0,0 +1,61 @@
+from os import urandom
+
+import pytest
+
+from hippiehug import Tree, verify_proof
+from hippiehug.Arena import ArenaStore
+from hippiehug.Collector import GarbageCollector
+from hippiehug.Utils import HASHES
+
+
+@pytest.mark.parametrize("alg", ["sha256", pytest.param("blake2b", marks=pytest.mark.skipif(
+    "blake2b" not in HASHES, reason="hashlib has no blake2b"))])
+def test_arena_tree(alg):
+    # A small capacity makes the index grow many times
+    store = ArenaStore(capacity=4)
+    t = Tree(store, balanced=True, alg=alg)
+    X = [urandom(32) for _ in range(500)]
+    t.multi_add(X[:250])
+    for x in X[250:300]:
+        t.add(x)
+    t.multi_add(X[300:])
+
+    t2 = Tree(balanced=True, alg=alg)
+    t2.multi_add(X)
+    assert t.root() == t2.root()
+    assert len(store) == len(set(store)) >= 999
+    assert t.multi_is_in(X + [b"!"]) == [True] * 500 + [False]
+
+    root, proof = t.multi_proof(X[:3])
+    assert verify_proof(root, proof, X[:3], X[:3], alg=alg) == [True] * 3
+
+    with pytest.raises(KeyError):
+        store[urandom(32)]
+
+def test_arena_delete_compact():
+    store = ArenaStore()
+    t = Tree(store)
+    X = [urandom(32) for _ in range(200)]
+    t.multi_add(X[:100])
+    old_root = t.root()
+    t.multi_add(X[100:])
+
+    size = store.nbytes()
+    deleted = GarbageCollector(store, [t.root()]).collect()
+    assert deleted > 0 and store.dead > 0
+    assert old_root not in store
+
+    store.compact()
+    assert store.dead == 0 and store.nbytes() < size
+    assert t.multi_is_in(X) == [True] * 200
+
+    # Deleted slots are reused once the index is rebuilt
+    t.multi_add([urandom(32) for _ in range(2000)])
+    assert t.multi_is_in(X) == [True] * 200
+
+def test_arena_wrong_hash():
+    store = ArenaStore()
+    t = Tree(store)
+    t.add(b"Hello")
+    with pytest.raises(Exception):
+        store[urandom(32)] = store[t.root()]
@@ -0,0 +1,92 @@
+import asyncio
+from os import urandom
+
+import pytest
+
+from hippiehug import Tree, Chain
+from hippiehug.Async import AsyncTree, AsyncChain, AsyncStoreAdapter
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class SlowStore():
+    """ An asynchronous store over a dictionary, without batched reads, that
+    records the largest number of reads in flight at once. """
+    def __init__(self):
+        self.data = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def get(self, key):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.001)
+        self.in_flight -= 1
+        return self.data[key]
+
+    async def put_many(self, items):
+        self.data.update(items)
+
+
+@pytest.mark.parametrize("balanced", [False, True])
+def test_async_tree(balanced):
+    store = {}
+    t = AsyncTree(AsyncStoreAdapter(store), balanced=balanced)
+    X = [urandom(32) for _ in range(200)]
+
+    async def main():
+        await t.multi_add(X[:100])
+        await t.multi_add(X[100:])
+        assert await t.multi_is_in(X + [b"!"]) == [True] * 200 + [False]
+        assert await t.is_in(X[7])
+        return await t.evidence(X[7])
+
+    root, E = run(main())
+
+    t2 = Tree(balanced=balanced)
+    t2.multi_add(X[:100])
+    t2.multi_add(X[100:])
+    assert t.root() == t2.root() == root
+    assert [e.hid for e in E] == [e.hid for e in t2.evidence(X[7])[1]]
+
+def test_async_concurrent_reads():
+    store = SlowStore()
+    t = AsyncTree(store, balanced=True)
+    X = [urandom(32) for _ in range(200)]
+
+    async def main():
+        await t.multi_add(X)
+        store.max_in_flight = 0
+
+        # Many concurrent requests, each reading levels concurrently
+        results = await asyncio.gather(*[t.multi_is_in(X[i:i + 20], evidence=True)
+                                         for i in range(0, 200, 20)])
+        return results
+
+    results = run(main())
+    assert store.max_in_flight > 20
+    for i, (result, root, E) in enumerate(results):
+        assert result == [True] * 20 and root == t.root()
+        evidence_tree = Tree(dict((e.identity(), e) for e in E), root)
+        assert evidence_tree.multi_is_in(X[20 * i:20 * i + 20]) == [True] * 20
+
+def test_async_chain():
+    c = Chain()
+    for i in range(50):
+        c.multi_add([b"Item %d.%d" % (i, j) for j in range(3)])
+
+    ac = AsyncChain(AsyncStoreAdapter(c.store), c.root())
+    evidence = {}
+    assert run(ac.get(17, 1, evidence)) == b"Item 17.1"
+
+    c2 = Chain(evidence, c.root())
+    assert c2.get(17, 1) == b"Item 17.1"
+
+    with pytest.raises(Exception):
+        run(ac.get(50, 0))
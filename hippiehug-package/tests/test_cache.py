@@ -0,0 +1,63 @@
+from hippiehug import Tree, RedisStore
+from hippiehug.Cache import NodeCache
+
+
+def test_lru_order():
+    c = NodeCache(max_entries=3)
+    for k in [b"A", b"B", b"C"]:
+        c.put(k, k)
+
+    assert c.get(b"A") == b"A"
+    c.put(b"D", b"D")
+
+    assert b"A" in c
+    assert b"B" not in c
+    assert c.stats()["evictions"] == 1
+    assert c.stats()["hits"] == 1
+
+    assert c.get(b"B") is None
+    assert c.misses == 1
+
+def test_byte_budget():
+    c = NodeCache(max_entries=None, max_bytes=100)
+    for i in range(10):
+        c.put(i, i, size=30)
+
+    assert c.size <= 100
+    assert len(c) == 3
+    assert c.evictions == 7
+
+def test_pinned():
+    c = NodeCache(max_entries=1)
+    c.pin(b"root", b"R")
+    c.put(b"A", b"A")
+    c.put(b"B", b"B")
+
+    assert c.get(b"root") == b"R"
+    assert b"A" not in c
+
+    c.unpin_all()
+    assert b"root" not in c
+
+def test_redis_store_cache(dredis):
+    r = dredis
+    store = RedisStore(r, cache=NodeCache(max_entries=50))
+
+    t = Tree(store)
+    from os import urandom
+    X = [urandom(32) for _ in range(200)]
+    t.multi_add(X)
+
+    store.cache.clear()
+    store.pin_levels(t.root(), 3)
+    assert len(store.cache.pinned) == 7
+
+    gets, misses = r.gets, store.cache.misses
+    assert t.multi_is_in(X) == [True] * 200
+    assert store.cache.evictions > 0
+    assert store.cache.hits > 0
+    assert len(store.cache.entries) <= 50
+
+    # The pinned levels are never fetched again
+    assert r.gets - gets == store.cache.misses - misses
+    assert len(store.cache.pinned) == 7
@@ -1,4 +1,5 @@
 from hippiehug.Chain import Chain, Block, DocChain
+from hippiehug.Utils import HASHES
 
 
 def test_block_hash():
@@ -157,3 +158,310 @@ def test_chain_empty_store():
     c2 = Chain(store, root_hash=c.head)
     assert c2.get(0, 0) == "test"
 
+
+
+@pytest.mark.skipif("blake2b" not in HASHES, reason="hashlib has no blake2b")
+def test_chain_hash_alg():
+    from hippiehug.Codec import encode, decode
+    c = DocChain(alg="blake2b")
+    for i in range(10):
+        c.multi_add([b"Doc %d" % i])
+    assert c.get(3, 0) == b"Doc 3"
+
+    c2 = DocChain()
+    for i in range(10):
+        c2.multi_add([b"Doc %d" % i])
+    assert c.root() != c2.root()
+
+    head = decode(encode(c.store[c.root()]))
+    assert head.alg == "blake2b" and head.hid == c.root()
+
+    with pytest.raises(Exception):
+        DocChain(c.store, c.root()).get(3, 0)
+
+
+def test_block_sealed():
+    from hippiehug.Codec import encode, decode
+    c = Chain()
+    items = [b"item%d" % i for i in range(100)]
+    c.multi_add(items)
+    c.multi_add([{"a": [1, 2]}])
+
+    b0 = c.store[c.store[c.head].fingers[0][1]]
+    assert b0.sealed and b0.items[0] is items[0]
+    with pytest.raises(Exception):
+        b0.aux = 1
+
+    b1 = decode(encode(c.store[c.head]))
+    assert b1.sealed and b1.hid == c.head
+    assert b1.encoding() is b1.encoding()
+
+    b2 = Block([b"A"])
+    h1 = b2.hid
+    b2.aux = 42
+    assert b2.hid != h1
+
+
+def test_block_sealed_in_place():
+    c = Chain()
+    items = [{"a": 1}, [b"x"]]
+    aux = {"b": [1]}
+
+    def add_aux(block):
+        block.aux = aux
+    c.multi_add(items, pre_commit_fn=add_aux)
+
+    # Changing the items or aux of a sealed block in place does not change it
+    b0 = c.store[c.head]
+    b0.items[0]["a"] = 2
+    b0.items[1].append(b"y")
+    b0.aux["b"].append(2)
+    items[0]["a"] = 3
+    aux["b"].append(3)
+
+    assert c.get(0, 0) == {"a": 1}
+    assert c.get(0, 1) == [b"x"]
+    assert b0.aux == {"b": [1]}
+    assert Block([{"a": 1}, [b"x"]], aux={"b": [1]}).hid == c.head
+
+
+def test_chain_get_many():
+    from random import randrange
+    from hippiehug import Instrument
+
+    inst = Instrument()
+    c = Chain(inst.wrap({}))
+    for i in range(300):
+        c.multi_add([b"%d|%d" % (i, j) for j in range(5)])
+
+    targets = [(randrange(300), randrange(5)) for _ in range(200)]
+    evidence = {}
+    with inst:
+        res = c.get_many(targets, evidence)
+    assert res == [c.get(b, i) for b, i in targets]
+    assert inst.snapshot()["gets"] == len(evidence) == inst.snapshot()["visited"]
+
+    c2 = Chain(evidence, root_hash=c.head)
+    assert c2.get_many(targets) == res
+
+    with pytest.raises(Exception):
+        c.get_many([(1, 0), (300, 0)])
+    with pytest.raises(Exception):
+        c.get_many([(1, 5)])
+    assert Chain().get_many([(0, 0)]) == [None]
+
+
+def test_docchain_get_many():
+    c = DocChain()
+    for i in range(50):
+        c.multi_add([b"%d|%d" % (i, j) for j in range(3)])
+
+    evidence = {}
+    assert c.get_many([(3, 1), (40, 2), (3, 1)], evidence) == [b"3|1", b"40|2", b"3|1"]
+    assert DocChain(evidence, root_hash=c.head).get(40, 2) == b"40|2"
+
+
+def test_chain_index(tmp_path):
+    from hippiehug import BlockIndex, Instrument, FileStore
+
+    inst = Instrument()
+    path = str(tmp_path / "index")
+    c = Chain(inst.wrap({}), index=BlockIndex(path))
+    for i in range(200):
+        c.multi_add([b"%d|0" % i])
+
+    with inst:
+        assert c.get(17, 0, verify=False) == b"17|0"
+    assert inst.snapshot()["gets"] == 1
+
+    evidence = {}
+    assert c.get(17, 0, evidence, verify=False) == b"17|0"
+    assert Chain(evidence, c.head).get(17, 0) == b"17|0"
+    c.index.close()
+
+    # Reopen the index, and rebuild it after the chain moved on without it
+    c2 = Chain(c.store, c.head, index=BlockIndex(path))
+    assert c2.get(199, 0, verify=False) == b"199|0"
+    c.index = None
+    c.multi_add([b"200|0"])
+    c2.head = c.head
+    assert 200 not in c2.index
+
+    c2.rebuild_index()
+    assert len(c2.index) == 201
+    assert all(c2.store[c2.index[i]].index == i for i in range(201))
+
+    with pytest.raises(Exception):
+        Chain().rebuild_index()
+
+
+def test_chain_index_stale():
+    from hippiehug import BlockIndex
+
+    c = Chain(index=BlockIndex())
+    for i in range(20):
+        c.multi_add([b"B%d" % i])
+        if i == 9:
+            head_at_9 = c.head
+
+    # An older head does not read blocks after it through the index
+    old = Chain(c.store, head_at_9, index=c.index)
+    with pytest.raises(Exception):
+        old.get(15, 0, verify=False)
+    assert old.get(5, 0, verify=False) == b"B5"
+
+    # Nor does a chain once another one sharing its index forked from it
+    fork = Chain(c.store, head_at_9, index=c.index)
+    fork.multi_add([b"fork"])
+    assert c.get(10, 0, verify=False) == b"B10"
+    assert list(c.scan_items(10, 11)) == [(10, 0, b"B10")]
+    assert fork.get(10, 0, verify=False) == b"fork"
+
+    # The index is trusted again once rebuilt for the head
+    c.rebuild_index()
+    assert c.index.head == c.head
+    assert c.get(10, 0, verify=False) == b"B10"
+    with pytest.raises(Exception):
+        c.get(20, 0, verify=False)
+
+
+def test_docchain_index():
+    from hippiehug import BlockIndex
+
+    c = DocChain(index=BlockIndex())
+    for i in range(20):
+        c.multi_add([b"Doc %d" % i])
+    assert c.get(7, 0, verify=False) == b"Doc 7"
+    assert len(c.index) == 20
+
+
+def test_chain_scan():
+    from hippiehug import BlockIndex, Instrument, SQLiteStore
+
+    inst = Instrument()
+    c = Chain(inst.wrap(SQLiteStore()))
+    for i in range(1000):
+        c.multi_add([b"%d|0" % i, b"%d|1" % i])
+
+    with inst:
+        blocks = list(c.scan(batch_size=64))
+    assert [b.index for b in blocks] == list(range(1000))
+    assert blocks[-1].hid == c.head
+    assert inst.snapshot()["gets"] < 1100
+    assert inst.snapshot()["requests"] < 200
+
+    assert [b.index for b in c.scan(10, 20, batch_size=3)] == list(range(10, 20))
+    assert [b.index for b in c.scan(995, 2000)] == list(range(995, 1000))
+    assert list(c.scan(20, 10)) == []
+    assert list(Chain().scan()) == []
+
+    items = list(c.scan_items(500, 502))
+    assert items == [(500, 0, b"500|0"), (500, 1, b"500|1"), (501, 0, b"501|0"), (501, 1, b"501|1")]
+
+    # With an index, each batch is a single read
+    c.index = BlockIndex()
+    c.rebuild_index()
+    assert len(c.index) == 1000
+    inst.reset()
+    with inst:
+        assert [b.index for b in c.scan(batch_size=100)] == list(range(1000))
+    assert inst.snapshot()["requests"] < 100
+
+    c.index[500] = c.index[501]
+    with pytest.raises(Exception):
+        list(c.scan())
+
+
+def test_docchain_scan():
+    c = DocChain()
+    for i in range(30):
+        c.multi_add([b"Doc %d|%d" % (i, j) for j in range(3)])
+
+    items = list(c.scan_items(batch_size=7))
+    assert len(items) == 90
+    assert items[40] == (13, 1, b"Doc 13|1")
+
+
+def test_item_paths():
+    from hippiehug.Chain import _ItemTree, verify_item
+
+    for n in range(1, 20):
+        items = [b"%d" % i for i in range(n)]
+        tree = _ItemTree(items, "sha256")
+        for i in range(n):
+            path = tree.path(i)
+            assert verify_item(tree.root(), n, i, items[i], path)
+            assert not verify_item(tree.root(), n, i, b"Other", path)
+            assert not verify_item(tree.root(), n, i, items[i], path + [tree.root()])
+
+
+def test_merkle_chain_evidence():
+    from hippiehug.Codec import encode, decode
+    from hippiehug.Chain import BlockHeader
+
+    c = Chain(merkle=True)
+    for i in range(20):
+        c.multi_add([b"%d|%d" % (i, j) for j in range(1000)])
+
+    evidence = {}
+    assert c.get(5, 777, evidence) == b"5|777"
+    assert all(isinstance(e, BlockHeader) for e in evidence.values())
+    assert sum(len(encode(e)) for e in evidence.values()) < 5000
+
+    # The headers are enough to check the item, also once encoded
+    c2 = Chain(dict((k, decode(encode(e))) for k, e in evidence.items()), root_hash=c.head)
+    assert c2.get(5, 777) == b"5|777"
+    with pytest.raises(Exception):
+        c2.get(5, 778)
+
+    # Proofs of many items share their headers
+    evidence = {}
+    assert c.get_many([(5, 1), (5, 2), (12, 3)], evidence) == [b"5|1", b"5|2", b"12|3"]
+    c3 = Chain(evidence, root_hash=c.head)
+    assert c3.get(5, 2) == b"5|2"
+    assert c3.get(12, 3) == b"12|3"
+
+    # A tampered proof is rejected
+    header = [e for e in evidence.values() if e.index == 5][0]
+    item, path = header.proofs[1]
+    header.proofs[1] = (b"Other", path)
+    with pytest.raises(Exception):
+        c3.get(5, 1)
+
+    # Blocks keep their kind across stores and blocks without a root keep their hash
+    block = c.store[c.head]
+    assert decode(encode(block)).hid == block.hid
+    assert Block([b"A"]).hid != Block([b"A"], merkle=True).hid
+    assert Block([b"A"], merkle=True).header().hid == Block([b"A"], merkle=True).hid
+
+
+def test_merkle_scan_evidence():
+    c = Chain(merkle=True)
+    for i in range(10):
+        c.multi_add([b"%d|%d" % (i, j) for j in range(8)])
+
+    evidence = {}
+    c.get(3, 5, evidence)
+    c.get(3, 1, evidence)
+
+    # Only the items a header proves are listed, at their index
+    assert list(Chain(evidence, c.head).scan_items(3, 4)) == [(3, 1, b"3|1"), (3, 5, b"3|5")]
+
+    header = [e for e in evidence.values() if e.index == 3][0]
+    item, path = header.proofs[5]
+    header.proofs[5] = (b"EVIL", path)
+    with pytest.raises(Exception):
+        list(Chain(evidence, c.head).scan_items(3, 4))
+    with pytest.raises(Exception):
+        header.items
+
+
+def test_merkle_docchain():
+    c = DocChain(merkle=True)
+    for i in range(10):
+        c.multi_add([b"Doc %d|%d" % (i, j) for j in range(5)])
+
+    evidence = {}
+    assert c.get(3, 4, evidence) == b"Doc 3|4"
+    assert DocChain(evidence, root_hash=c.head).get(3, 4) == b"Doc 3|4"
+    assert list(c.scan_items(9))[-1] == (9, 4, b"Doc 9|4")
@@ -0,0 +1,98 @@
+from os import urandom
+
+from hippiehug import Tree, DocChain, RedisStore
+from hippiehug.Collector import GarbageCollector
+
+
+def test_collect_tree():
+    t = Tree()
+    X = [urandom(32) for _ in range(200)]
+    for x in X:
+        t.add(x)
+
+    old_root = t.root()
+    t.multi_add([urandom(32) for _ in range(100)])
+    size = len(t.store)
+
+    gc = GarbageCollector(t.store, [old_root, t.root()], batch_size=10)
+    deleted = gc.collect()
+    assert deleted > 0
+    assert len(t.store) == size - deleted
+
+    assert t.multi_is_in(X) == [True] * 200
+    assert Tree(t.store, old_root).multi_is_in(X) == [True] * 200
+
+    # Only the retained roots are kept
+    GarbageCollector(t.store, [t.root()]).collect()
+    assert len(t.store) == 2 * 300 - 1
+    assert t.multi_is_in(X) == [True] * 200
+
+def test_collect_chain():
+    c = DocChain()
+    for i in range(20):
+        c.multi_add([b"%d|%d" % (i, j) for j in range(5)])
+    c.store[b"X" * 32] = c.store[c.root()]
+
+    GarbageCollector(c.store, [c.root()]).collect()
+    assert b"X" * 32 not in c.store
+    assert len(c.store) == 20 + 100
+    assert c.get(3, 4) == b"3|4"
+
+def test_collect_incremental():
+    t = Tree()
+    X = [urandom(32) for _ in range(100)]
+    for x in X:
+        t.add(x)
+
+    gc = GarbageCollector(t.store, [t.root()], batch_size=5)
+    steps = gc.steps()
+    next(steps)
+
+    # Writes during the collection are kept, and shaded nodes with them
+    old_root = t.root()
+    Y = [urandom(32) for _ in range(10)]
+    t.multi_add(Y)
+    gc.shade(old_root)
+
+    for _ in steps:
+        pass
+
+    assert t.multi_is_in(X + Y) == [True] * 110
+
+def test_collect_rewrite():
+    t = Tree()
+    X = [urandom(32) for _ in range(100)]
+    t.multi_add(X)
+    t.remove(X[0])
+    t.remove(X[1])
+
+    gc = GarbageCollector(t.store, [t.root()], batch_size=5)
+    t.store = gc.writer()
+    steps = gc.steps()
+
+    # The candidates are listed a batch at a time
+    next(steps)
+    assert len(gc.candidates) == 5
+
+    # Once marked, adding back a removed item writes again the unmarked leaf
+    next(steps)
+    while gc.work_list != [] or not gc.marked:
+        next(steps)
+    t.add(X[0])
+
+    for _ in steps:
+        pass
+
+    assert gc.deleted > 0
+    assert t.multi_is_in(X) == [True] + [False] + [True] * 98
+
+def test_collect_redis(dredis):
+    store = RedisStore(dredis)
+    dredis.set(b"chain.head", b"Head")
+    t = Tree(store)
+    for _ in range(50):
+        t.add(urandom(32))
+
+    GarbageCollector(store, [t.root()]).collect()
+    assert len(dredis.data) == 99 + 1
+    assert b"chain.head" in dredis.data
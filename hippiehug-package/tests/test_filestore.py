@@ -0,0 +1,89 @@
+import os
+from os import urandom
+
+import pytest
+
+from hippiehug import Tree, Chain, DocChain
+from hippiehug.FileStore import FileStore
+from hippiehug.Collector import GarbageCollector
+
+
+@pytest.fixture
+def fstore(tmpdir):
+    store = FileStore(str(tmpdir))
+    yield store
+    store.close()
+
+
+def test_tree_reopen(tmpdir):
+    store = FileStore(str(tmpdir), sync_every=None)
+    t = Tree(store, balanced=True)
+    X = [urandom(32) for _ in range(500)]
+    t.multi_add(X)
+    t.add(b"Hello")
+    store.close()
+
+    store = FileStore(str(tmpdir))
+    t2 = Tree(store, t.root(), balanced=True)
+    assert t2.multi_is_in(X + [b"Hello", b"World"]) == [True] * 501 + [False]
+    assert len(store) == len(t.store.index)
+    store.close()
+
+def test_chain(fstore):
+    c = DocChain(fstore)
+    for i in range(20):
+        c.multi_add([b"Doc %d.%d" % (i, j) for j in range(3)])
+    assert c.get(5, 2) == b"Doc 5.2"
+
+    c2 = Chain(fstore)
+    c2.multi_add([{"a": 1, "b": [1, 2]}, b"Raw"])
+    c2.multi_add([b"Next"])
+    assert c2.get(0, 0) == {"a": 1, "b": [1, 2]}
+
+def test_delete_and_compact(tmpdir):
+    store = FileStore(str(tmpdir), segment_size=4096)
+    t = Tree(store)
+    X = [urandom(32) for _ in range(200)]
+    t.multi_add(X[:100])
+    old_root = t.root()
+    t.multi_add(X[100:])
+    assert len(os.listdir(str(tmpdir))) > 1
+
+    deleted = GarbageCollector(store, [t.root()]).collect()
+    assert deleted > 0
+    assert old_root not in store
+    assert store.garbage() > 0
+
+    size = len(store)
+    store.compact()
+    assert store.garbage() == 0
+    assert len(store) == size
+    assert t.multi_is_in(X) == [True] * 200
+    store.close()
+
+    # Deleted nodes stay deleted after reopening
+    store = FileStore(str(tmpdir))
+    assert len(store) == size
+    assert old_root not in store
+    assert Tree(store, t.root()).multi_is_in(X) == [True] * 200
+    store.close()
+
+def test_torn_record(tmpdir):
+    store = FileStore(str(tmpdir))
+    t = Tree(store)
+    t.multi_add([b"Hello", b"World"])
+    store.close()
+
+    # A record cut short by a crash is dropped on open
+    name = os.path.join(str(tmpdir), os.listdir(str(tmpdir))[0])
+    size = os.path.getsize(name)
+    with open(name, "ab") as f:
+        f.write(urandom(50))
+
+    store = FileStore(str(tmpdir))
+    assert os.path.getsize(name) == size
+    assert Tree(store, t.root()).multi_is_in([b"Hello", b"World"]) == [True, True]
+    t2 = Tree(store, t.root())
+    t2.add(b"!")
+    assert b"!" in t2
+    store.close()
@@ -0,0 +1,95 @@
+from hippiehug import Tree, Chain, RedisStore, Instrument
+from hippiehug.Utils import HASHES
+
+
+def test_instrument_tree():
+    inst = Instrument()
+    t = Tree.bulk_build([b"%d" % i for i in range(1000)], store=inst.wrap({}))
+    assert inst.snapshot()["gets"] == 0
+
+    with inst:
+        _, E = t.evidence(b"42")
+    counts = inst.snapshot()
+    assert counts["gets"] == counts["visited"] == len(E)
+    assert counts["depth"] == len(E) - 1
+    assert counts["sets"] == 0
+
+    inst.reset()
+    with inst:
+        t.multi_is_in([b"%d" % i for i in range(10)])
+    counts = inst.snapshot()
+    assert counts["hashes"] == 20
+    assert counts["depth"] >= 9
+
+    inst.reset()
+    with inst:
+        t.add(b"New")
+    counts = inst.snapshot()
+    assert counts["sets"] == counts["depth"] + 2
+    assert counts["requests"] == counts["gets"] + counts["sets"]
+
+
+def test_instrument_disabled():
+    inst = Instrument()
+    t = Tree(inst.wrap({}))
+    t.multi_add([b"%d" % i for i in range(100)])
+    assert all(v == 0 for v in inst.snapshot().values())
+
+    fns = dict(HASHES)
+    with inst:
+        assert HASHES == fns
+        assert inst.active
+    assert not inst.active
+
+
+def test_instrument_overlap():
+    import threading
+
+    t = Tree.bulk_build([b"%d" % i for i in range(100)])
+    first, second = Instrument(), Instrument()
+
+    # Instruments started and stopped out of order count while each is active
+    first.start()
+    t.is_in(b"1")
+    second.start()
+    t.is_in(b"2")
+    first.stop()
+    t.is_in(b"3")
+    second.stop()
+    t.is_in(b"4")
+
+    one = first.snapshot()["hashes"]
+    assert one > 0
+    assert second.snapshot()["hashes"] == one
+
+    # The work of other threads is not counted
+    with first:
+        worker = threading.Thread(target=t.is_in, args=(b"5",))
+        worker.start()
+        worker.join()
+    assert first.snapshot()["hashes"] == one
+
+
+def test_instrument_chain():
+    inst = Instrument()
+    c = Chain(inst.wrap({}))
+    for i in range(100):
+        c.multi_add([b"%d" % i])
+
+    with inst:
+        assert c.get(5, 0) == b"5"
+    counts = inst.snapshot()
+    assert 0 < counts["depth"] < 10
+    assert counts["gets"] == counts["depth"] + 1
+
+
+def test_instrument_cache(dredis):
+    inst = Instrument()
+    store = RedisStore(dredis)
+    t = Tree.bulk_build([b"%d" % i for i in range(100)], store=inst.wrap(store))
+
+    with inst:
+        t.multi_is_in([b"%d" % i for i in range(100)])
+    counts = inst.snapshot()
+    assert counts["cache_hits"] == counts["gets"]
+    assert counts["cache_misses"] == 0
@@ -0,0 +1,95 @@
+from os import urandom
+from random import shuffle
+
+import pytest
+
+from hippiehug import SparseTree, SQLiteStore, verify_sparse_proof
+from hippiehug.Codec import encode, decode
+from hippiehug.Sparse import SparseBranch, default_hashes
+from hippiehug.Utils import HASHES
+
+
+def test_sparse_add():
+    keys = [urandom(32) for _ in range(200)]
+    t = SparseTree()
+    for k in keys[:100]:
+        t.add(k)
+    t.multi_add(keys[100:])
+
+    assert all(t.multi_is_in(keys))
+    assert not any(t.multi_is_in([urandom(32) for _ in range(100)]))
+    assert keys[0] in t
+
+
+def test_sparse_canonical():
+    keys = [urandom(32) for _ in range(100)]
+    t1 = SparseTree()
+    t1.multi_add(keys)
+
+    shuffle(keys)
+    t2 = SparseTree()
+    for k in keys:
+        t2.add(k)
+    t2.add(keys[0])
+
+    assert t1.root() == t2.root()
+    assert SparseTree().root() == default_hashes()[0]
+
+
+def test_sparse_key_values():
+    t = SparseTree()
+    t.multi_add([b"V1", b"V2", b"Other"], keys=[b"K1", b"K2", b"K1"])
+    assert t.multi_is_in([b"V1", b"V2", b"Other"], keys=[b"K1", b"K2", b"K1"]) == [True, True, False]
+
+
+def test_sparse_evidence():
+    keys = [urandom(32) for _ in range(1000)]
+    t = SparseTree()
+    t.multi_add(keys)
+
+    res, root, E = t.multi_is_in(keys[:10] + [b"!"], evidence=True)
+    store = dict((e.identity(), e) for e in E)
+    assert SparseTree(store, root).multi_is_in(keys[:10] + [b"!"]) == res
+
+    _, E = t.evidence(keys[0])
+    assert len(E) < 30
+
+
+@pytest.mark.skipif("blake2b" not in HASHES, reason="hashlib has no blake2b")
+def test_sparse_proof():
+    keys = [urandom(32) for _ in range(1000)]
+    t = SparseTree(alg="blake2b")
+    t.multi_add(keys)
+
+    query = keys[:5] + [urandom(32) for _ in range(5)]
+    root, proof = t.multi_proof(query)
+    assert verify_sparse_proof(root, proof, query, query, "blake2b") == [True] * 5 + [False] * 5
+
+    # Siblings that are default hashes are left out of the proof
+    _, E = t.evidence(keys[0])
+    assert len(t.multi_proof([keys[0]])[1]) < 32 * len(E) + 100
+
+    with pytest.raises(Exception):
+        verify_sparse_proof(root, proof, query, query)
+    with pytest.raises(Exception):
+        verify_sparse_proof(urandom(32), proof, query, query, "blake2b")
+    with pytest.raises(Exception):
+        verify_sparse_proof(root, proof[:-1], query, query, "blake2b")
+
+    b = SparseBranch(urandom(32), urandom(32), "blake2b")
+    assert decode(encode(b)).hid == b.hid
+
+
+def test_sparse_proof_empty():
+    t = SparseTree()
+    root, proof = t.multi_proof([b"A"])
+    assert verify_sparse_proof(root, proof, [b"A"], [b"A"]) == [False]
+
+
+def test_sparse_store():
+    t = SparseTree(SQLiteStore())
+    t.multi_add([b"%d" % i for i in range(100)])
+    assert t.multi_is_in([b"42", b"100"]) == [True, False]
+
+    b = SparseBranch(urandom(32), urandom(32))
+    assert decode(encode(b)).hid == b.hid
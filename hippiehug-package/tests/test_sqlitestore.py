@@ -0,0 +1,46 @@
+from os import urandom
+
+import pytest
+
+from hippiehug import Tree, DocChain
+from hippiehug.SQLiteStore import SQLiteStore
+from hippiehug.Collector import GarbageCollector
+
+
+def test_tree_reopen(tmpdir):
+    path = str(tmpdir.join("nodes.db"))
+    store = SQLiteStore(path, chunk_size=7)
+    t = Tree(store, balanced=True)
+    X = [urandom(32) for _ in range(300)]
+    t.multi_add(X)
+    store.close()
+
+    store = SQLiteStore(path, chunk_size=7)
+    t2 = Tree(store, t.root(), balanced=True)
+    assert t2.multi_is_in(X + [b"Hello"]) == [True] * 300 + [False]
+
+    with pytest.raises(KeyError):
+        store.get_many([t.root(), b"Missing"])
+
+    # Only the kinds of nodes of a tree are stored
+    kinds = set(row[0] for row in store.db.execute("SELECT kind FROM nodes"))
+    assert kinds == set([42, 43])
+    store.close()
+
+def test_chain_and_collect():
+    store = SQLiteStore()
+    c = DocChain(store)
+    for i in range(10):
+        c.multi_add([b"Doc %d" % i])
+    assert c.get(3, 0) == b"Doc 3"
+
+    t = Tree(store)
+    t.multi_add([urandom(32) for _ in range(100)])
+    old_root = t.root()
+    t.add(b"Hello")
+
+    deleted = GarbageCollector(store, [c.root(), t.root()]).collect()
+    assert deleted > 0
+    assert old_root not in store
+    assert c.get(3, 0) == b"Doc 3"
+    assert b"Hello" in t
@@ -1,4 +1,5 @@
 from hippiehug import RedisStore, Tree, Leaf, Branch
+from hippiehug.Utils import HASHES
 import pytest
 
 
@@ -242,3 +243,408 @@ def test_tree_empty_store():
 
     t2 = Tree(store, root_hash=t.root())
     assert t2.is_in(b"test")
+
+def test_balanced_sequential_depth():
+    t = Tree(balanced=True)
+    keys = [b"%08d" % i for i in range(1000)]
+    for k in keys:
+        t.add(k)
+
+    for k in keys[::50]:
+        assert k in t
+        root, E = t.evidence(k)
+        assert len(E) < 40
+
+def test_balanced_canonical():
+    from random import shuffle
+    keys = [b"%08d" % i for i in range(300)]
+
+    t1 = Tree(balanced=True)
+    for k in keys:
+        t1.add(k)
+
+    shuffle(keys)
+    t2 = Tree(balanced=True)
+    t2.multi_add(keys[:100])
+    t2.multi_add(keys[100:200])
+    for k in keys[200:]:
+        t2.add(k)
+
+    t3 = Tree(balanced=True)
+    t3.multi_add(keys + keys[:10])
+
+    assert t1.root() == t2.root() == t3.root()
+
+def test_balanced_multi_is_in():
+    from os import urandom
+    t = Tree(balanced=True)
+    X = [urandom(32) for _ in range(100)]
+    t.multi_add(X)
+    Y = [urandom(32) for _ in range(100)]
+
+    assert t.multi_is_in(X + Y) == [True] * 100 + [False] * 100
+
+    answer, head, evidence = t.multi_is_in(X[:10], evidence=True)
+    e = dict((k.identity(), k) for k in evidence)
+    assert Tree(e, head).multi_is_in(X[:10]) == [True] * 10
+
+def test_bulk_build():
+    from os import urandom
+    X = [urandom(32) for _ in range(1000)]
+    t = Tree.bulk_build(X + X[:10])
+
+    assert t.multi_is_in(X) == [True] * 1000
+    assert not t.is_in(urandom(32))
+
+    t.multi_add([b"Hello"])
+    assert b"Hello" in t
+
+def test_bulk_build_balanced():
+    keys = [b"%08d" % i for i in range(5000)]
+    t1 = Tree.from_sorted(keys, balanced=True)
+
+    t2 = Tree(balanced=True)
+    t2.multi_add(keys[2500:])
+    t2.multi_add(keys[:2500])
+    assert t1.root() == t2.root()
+
+    t3 = Tree.bulk_build(keys[::-1], balanced=True)
+    assert t1.root() == t3.root()
+
+def test_from_sorted_unsorted():
+    with pytest.raises(Exception):
+        Tree.from_sorted([b"B", b"A"])
+
+def test_multi_proof():
+    from os import urandom
+    from hippiehug import verify_proof
+    t = Tree()
+    X = [urandom(32) for _ in range(200)]
+    t.multi_add(X)
+
+    Y = X[:20] + [urandom(32) for _ in range(5)] + X[:2]
+    root, proof = t.multi_proof(Y)
+    assert verify_proof(root, proof, Y, Y) == [True] * 20 + [False] * 5 + [True] * 2
+
+    # Keys map to other items
+    assert verify_proof(root, proof, X[:2], X[2:4]) == [False, False]
+
+    # The proof does not cover other keys
+    with pytest.raises(Exception):
+        verify_proof(root, proof, X[100:120], X[100:120])
+
+    # Tampering with the proof is detected
+    bad = bytearray(proof)
+    bad[-1] ^= 1
+    bad = bytes(bad)
+    with pytest.raises(Exception):
+        verify_proof(root, bad, Y, Y)
+
+    with pytest.raises(Exception):
+        verify_proof(root, proof[:-1], Y, Y)
+
+def test_multi_proof_empty():
+    from hippiehug import verify_proof
+    t = Tree()
+    root, proof = t.multi_proof([b"Hello"])
+    assert verify_proof(root, proof, [b"Hello"], [b"Hello"]) == [False]
+
+    t.add(b"Hello")
+    root, proof = t.multi_proof([b"Hello", b"World"])
+    assert verify_proof(root, proof, [b"Hello", b"World"], [b"Hello", b"World"]) == [True, False]
+
+def test_batched_round_trips(dredis):
+    from os import urandom
+    store = RedisStore(dredis)
+    t = Tree(store)
+    X = [urandom(32) for _ in range(1000)]
+    t.multi_add(X)
+
+    def lookup(Y):
+        store.cache.clear()
+        trips = dredis.round_trips
+        assert t.multi_is_in(Y) == [True] * len(Y)
+        return dredis.round_trips - trips
+
+    # One round trip per level, rather than per node
+    assert lookup(X) <= 2 + max(len(t.evidence(x)[1]) for x in X)
+    assert lookup(X[:1]) == len(t.evidence(X[0])[1])
+
+    store.cache.clear()
+    Y = [urandom(32) for _ in range(1000)]
+    t.multi_add(Y)
+    assert t.multi_is_in(Y) == [True] * 1000
+
+def test_buffered_writes(dredis):
+    from os import urandom
+    store = RedisStore(dredis)
+    t = Tree(store)
+    t.multi_add([urandom(32) for _ in range(100)])
+
+    # A batch of sequential adds under one leaf is written in one transaction,
+    # and only the nodes reachable from the new root are written.
+    trips = dredis.round_trips
+    size = len(dredis.data)
+    X = [b"%08d" % i for i in range(200)]
+    t.multi_add(X)
+
+    assert dredis.round_trips - trips <= 1 + len(t.evidence(X[0])[1])
+    assert t.multi_is_in(X) == [True] * 200
+    assert len(dredis.data) - size < 2 * 200 + 2 * len(t.evidence(X[0])[1])
+
+def test_buffer_drops_superseded():
+    from hippiehug.Store import WriteBuffer
+    store = {}
+    buf = WriteBuffer(store)
+    t = Tree(buf)
+    for i in range(100):
+        t.add(b"%03d" % i)
+
+    assert len(buf.pending) > 199
+    assert buf.flush(t.root()) == 199
+    assert len(store) == 199
+    assert buf.pending == {}
+
+    store2 = {}
+    t2 = Tree(store2)
+    for i in range(100):
+        t2.add(b"%03d" % i)
+    assert t2.root() == t.root()
+    assert len(store2) > 199
+
+def test_stage_commit():
+    t = Tree()
+    t.add(b"A")
+    old_root = t.root()
+
+    t.stage()
+    t.multi_add([b"B", b"C"])
+    t.add(b"D")
+    t.add(key=b"A", item=b"Other")
+
+    assert t.root() == old_root
+    assert t.multi_is_in([b"A", b"B", b"C", b"D", b"E"]) == [True] * 4 + [False]
+    assert not t.is_in(key=b"A", item=b"Other")
+    assert t.multi_is_in([b"B"], evidence=True)[0] == [False]
+
+    t.commit()
+    assert t.staged is None
+    assert t.multi_is_in([b"A", b"B", b"C", b"D", b"E"]) == [True] * 4 + [False]
+    assert not t.is_in(key=b"A", item=b"Other")
+
+    t2 = Tree()
+    t2.multi_add([b"A"])
+    t2.multi_add([b"B", b"C", b"D"])
+    assert t.root() == t2.root()
+
+def test_stage_store_errors():
+    from hippiehug.Nodes import h
+
+    t = Tree()
+    t.add(b"A")
+    t.stage()
+    t.add(b"B")
+
+    # A tree that cannot be read does not report staged items as in it
+    t.store = {}
+    with pytest.raises(KeyError):
+        t._is_staged(h(b"B"), b"B")
+
+def test_batch_discard():
+    t = Tree()
+    with pytest.raises(ValueError):
+        with t.batch():
+            t.add(b"Hello")
+            raise ValueError()
+
+    assert t.root() is None
+    assert b"Hello" not in t
+
+    with t.batch():
+        t.add(b"Hello")
+    assert b"Hello" in t
+
+@pytest.mark.parametrize("balanced", [False, True])
+def test_diff(balanced):
+    from hippiehug import h
+    t = Tree(balanced=balanced)
+    K = [b"%04d" % i for i in range(200)]
+    t.multi_add(K, keys=K)
+    old_root = t.root()
+
+    # Keys are never overwritten, so the changed item is in a separate tree
+    t = Tree(t.store, balanced=balanced)
+    t.multi_add([b"Extra", b"Other"] + K, keys=[b"Extra", b"0050"] + K)
+    changes = list(Tree(t.store, old_root).diff(t.root()))
+    assert changes == [("changed", b"0050", h(b"0050"), h(b"Other")),
+                       ("added", b"Extra", None, h(b"Extra"))]
+
+    back = list(t.diff(old_root))
+    assert back == [("changed", b"0050", h(b"Other"), h(b"0050")),
+                    ("removed", b"Extra", h(b"Extra"), None)]
+
+    assert list(t.diff(t.root())) == []
+    assert len(list(Tree(t.store).diff(old_root))) == 200
+    assert [c for c, _, _, _ in t.diff(None)] == ["removed"] * 201
+
+def test_diff_shapes():
+    # Trees holding the same items in different shapes have no differences
+    K = [b"%04d" % i for i in range(100)]
+    store = {}
+    t1 = Tree(store)
+    for k in K:
+        t1.add(k)
+    t2 = Tree.bulk_build(K[::-1], store=store)
+    assert t1.root() != t2.root()
+    assert list(t1.diff(t2.root())) == []
+
+    t2.add(b"Hello")
+    assert [k for _, k, _, _ in t1.diff(t2.root())] == [b"Hello"]
+
+def test_diff_prunes():
+    from os import urandom
+
+    class CountingStore(dict):
+        reads = 0
+        def get_many(self, keys):
+            self.reads += len(keys)
+            return [self[k] for k in keys]
+
+    store = CountingStore()
+    t = Tree(store, balanced=True)
+    t.multi_add([urandom(32) for _ in range(1000)])
+    old_root = t.root()
+    t.add(b"Hello")
+
+    assert [k for _, k, _, _ in t.diff(old_root)] == [b"Hello"]
+    assert store.reads <= 4 * len(t.evidence(b"Hello")[1])
+
+@pytest.mark.parametrize("balanced", [False, True])
+def test_range(balanced):
+    from random import randint
+    from hippiehug import h
+    K = [b"%04d" % (2 * i) for i in range(500)]
+    t = Tree.bulk_build(K, balanced=balanced)
+
+    assert list(t.range()) == [(k, h(k)) for k in K]
+    assert list(Tree().range()) == []
+
+    for _ in range(20):
+        lo, hi = b"%04d" % randint(0, 1000), b"%04d" % randint(0, 1000)
+        expected = [k for k in K if lo <= k < hi]
+        assert [k for k, _ in t.range(lo, hi)] == expected
+        assert [k for k, _ in t.range(None, hi)] == [k for k in K if k < hi]
+        assert [k for k, _ in t.range(lo)] == [k for k in K if lo <= k]
+
+        # The evidence proves the same answer
+        root, E = t.range_evidence(lo, hi)
+        t2 = Tree(dict((e.identity(), e) for e in E), root)
+        assert [k for k, _ in t2.range(lo, hi)] == expected
+
+def test_range_evidence_complete():
+    K = [b"%04d" % i for i in range(100)]
+    t = Tree.bulk_build(K, balanced=True)
+    root, E = t.range_evidence(b"0010", b"0020")
+    assert len(E) < 100
+
+    # Dropping any leaf of the evidence, even one in the interval, is detected
+    for e in E:
+        if isinstance(e, Leaf):
+            store = dict((x.identity(), x) for x in E if x is not e)
+            with pytest.raises(KeyError):
+                list(Tree(store, root).range(b"0010", b"0020"))
+
+def test_range_round_trips(dredis):
+    store = RedisStore(dredis)
+    K = [b"%05d" % i for i in range(2000)]
+    t = Tree.bulk_build(K, store=store, balanced=True)
+
+    store.cache.clear()
+    trips = dredis.round_trips
+    assert len(list(t.range(b"00100", b"01100"))) == 1000
+    assert dredis.round_trips - trips < 100
+
+@pytest.mark.parametrize("balanced", [False, True])
+def test_remove(balanced):
+    from random import shuffle
+    K = [b"%04d" % i for i in range(300)]
+    t = Tree(balanced=balanced)
+    t.multi_add(K)
+
+    removed = K[::3] + [K[-1], K[-2], b"Missing"]
+    shuffle(removed)
+    for k in removed[:10]:
+        t.remove(k)
+    t.multi_remove(removed[10:])
+
+    rest = [k for k in K if k not in removed]
+    assert [k for k, _ in t.range()] == rest
+    assert t.multi_is_in(K) == [k in rest for k in K]
+    for k in rest[::10]:
+        root, E = t.evidence(k)
+        assert Tree(dict((e.identity(), e) for e in E), root).is_in(k)
+
+    # Balanced trees have the same root as one built from the remaining keys
+    if balanced:
+        assert t.root() == Tree.bulk_build(rest, balanced=True).root()
+
+    t.multi_remove(rest)
+    assert t.root() is None
+    assert b"0001" not in t
+
+    t.add(b"Hello")
+    assert b"Hello" in t
+
+def test_remove_writes():
+    store = {}
+    t = Tree(store, balanced=True)
+    t.multi_add([b"%04d" % i for i in range(1000)])
+    size = len(store)
+
+    # Only the new nodes on the path to the removed leaf are written
+    t.remove(b"0500")
+    assert len(store) - size <= 2 * len(t.evidence(b"0500")[1])
+    assert b"0500" not in t
+    assert b"0499" in t and b"0501" in t
+
+@pytest.mark.skipif("blake2b" not in HASHES, reason="hashlib has no blake2b")
+@pytest.mark.parametrize("balanced", [False, True])
+def test_hash_alg(balanced):
+    from hippiehug import verify_proof
+    from hippiehug.Codec import encode, decode
+    X = [b"%04d" % i for i in range(100)]
+    t = Tree(balanced=balanced, alg="blake2b")
+    t.multi_add(X[:50])
+    for x in X[50:]:
+        t.add(x)
+    t.remove(X[0])
+
+    t2 = Tree(balanced=balanced)
+    t2.multi_add(X[1:])
+    assert t.root() != t2.root()
+    assert t.multi_is_in(X) == [False] + [True] * 99
+    if balanced:
+        assert t.root() == Tree.bulk_build(X[1:], balanced=True, alg="blake2b").root()
+
+    # Nodes keep their hash function through encoding
+    root = decode(encode(t.store[t.root()]))
+    assert root.alg == "blake2b" and root.hid == t.root()
+
+    root, proof = t.multi_proof([X[1], b"!"])
+    assert verify_proof(root, proof, [X[1], b"!"], [X[1], b"!"], alg="blake2b") == [True, False]
+    with pytest.raises(Exception):
+        verify_proof(root, proof, [X[1]], [X[1]])
+
+    # A tree refuses to use a root with another hash function
+    with pytest.raises(Exception):
+        Tree(t.store, t.root(), balanced=balanced).add(b"Hello")
+    with pytest.raises(Exception):
+        Tree(t.store, t.root(), balanced=balanced).is_in(X[1])
+
+def test_old_proof_version():
+    from hippiehug import verify_proof
+    t = Tree()
+    t.multi_add([b"Hello", b"World"])
+    root, proof = t.multi_proof([b"Hello"])
+    assert proof[:2] == b"\x02\x00"
+    assert verify_proof(root, b"\x01" + proof[2:], [b"Hello"], [b"Hello"]) == [True]